@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Car, CarImage, Booking
+from .models import ArchivedCar, Car, CarImage, Booking, OutboxMessage, OwnerStats
 
 class CarImageInline(admin.TabularInline):
     model = CarImage
@@ -11,7 +11,21 @@ class CarAdmin(admin.ModelAdmin):
     search_fields = ("brand","model","location")
     inlines = [CarImageInline]
 
+@admin.register(ArchivedCar)
+class ArchivedCarAdmin(admin.ModelAdmin):
+    list_display = ("id","brand","model","year","price","sold_at","archived_at","owner")
+    search_fields = ("brand","model","location")
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ("id","car","full_name","phone","preferred_date","preferred_time","status","created_at")
-    list_filter = ("status","preferred_date")
\ No newline at end of file
+    list_filter = ("status","preferred_date")
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("id","channel","subject","status","attempts","next_attempt_at","sent_at")
+    list_filter = ("status","channel")
+
+@admin.register(OwnerStats)
+class OwnerStatsAdmin(admin.ModelAdmin):
+    list_display = ("owner","total_cars","available_count","sold_count","sold_revenue","updated_at")
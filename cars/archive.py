@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_inventory_version
+from .models import ArchivedBooking, ArchivedCar, ArchivedCarImage, Booking, Car, CarImage
+
+CAR_FIELDS = (
+    "id", "owner_id", "brand", "model", "body_type", "seating_capacity", "year", "price", "mileage",
+    "transmission", "fuel", "location", "description", "is_available", "sold_at", "created_at", "updated_at",
+)
+BOOKING_FIELDS = (
+    "id", "car_id", "full_name", "phone", "email", "preferred_date", "preferred_time", "note", "status", "created_at",
+)
+
+# True while archive_cars deletes rows it has just copied. The stats and file
+# receivers skip those deletes: OwnerStats keeps counting archived sales, and
+# the photo files stay referenced (their MediaBlob counts move over to
+# ArchivedCarImage unchanged). See cars.signals.
+_archiving = ContextVar("archiving", default=False)
+
+
+def is_archiving():
+    return _archiving.get()
+
+@contextmanager
+def archiving():
+    token = _archiving.set(True)
+    try:
+        yield
+    finally:
+        _archiving.reset(token)
+
+def archivable(days):
+    return Car.objects.filter(is_available=False, sold_at__lt=timezone.now() - timedelta(days=days))
+
+# Moves one batch of sold cars, with their photos and bookings, into the
+# archive tables inside the caller's transaction. Returns the ids moved.
+def archive_cars(queryset):
+    # Re-read under the lock: a car relisted since it was picked stays live.
+    ids = list(queryset.select_for_update().filter(is_available=False).values_list("pk", flat=True))
+    if not ids:
+        return []
+    images = list(CarImage.objects.filter(car_id__in=ids).values("id", "car_id", "image", "variants", "uploaded_at"))
+    main_names = {
+        car_id: name for car_id, name in
+        Car.objects.filter(pk__in=ids, main_image__isnull=False).values_list("pk", "main_image__image")
+    }
+    ArchivedCar.objects.bulk_create(
+        ArchivedCar(**row, main_image=main_names.get(row["id"], ""))
+        for row in Car.objects.filter(pk__in=ids).values(*CAR_FIELDS)
+    )
+    ArchivedCarImage.objects.bulk_create(
+        ArchivedCarImage(car_id=row["car_id"], image=row["image"], variants=row["variants"], uploaded_at=row["uploaded_at"])
+        for row in images
+    )
+    bookings = list(Booking.objects.filter(car_id__in=ids).values(*BOOKING_FIELDS))
+    ArchivedBooking.objects.bulk_create(ArchivedBooking(**row) for row in bookings)
+
+    # The delete cascades to photos and bookings, detaches their outbox
+    # messages and drops the search rows.
+    with archiving():
+        Car.objects.filter(pk__in=ids).delete()
+    return ids
+
+# Archives every car sold more than `days` ago, batch_size cars per
+# transaction. Returns how many were moved (or would be, with dry_run).
+def archive_sold_cars(days=365, batch_size=500, dry_run=False, log=None):
+    log = log or (lambda message: None)
+    if dry_run:
+        return archivable(days).count()
+    total, last_pk = 0, 0
+    while True:
+        # Walks forward by pk, so a batch emptied by a concurrent relist
+        # neither ends the run nor gets picked again.
+        batch = list(archivable(days).filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1]
+        with transaction.atomic():
+            ids = archive_cars(Car.objects.filter(pk__in=batch))
+        if ids:
+            total += len(ids)
+            log(f"Archived {total} cars.")
+    if total:
+        bump_inventory_version()
+    return total
@@ -0,0 +1,80 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from .cache import aget_inventory_facets
+from .forms import BookingForm
+from .models import Car
+from .notifications import enqueue_booking_notifications
+from .page_cache import acondition, cache_anonymous_page, car_last_modified
+from .views import _detail_context, _inventory_context, _inventory_state
+
+# Async versions of the public pages, routed instead of the sync ones when
+# ASYNC_VIEWS is on (the ASGI / uvicorn deployment). Queries go through the
+# async ORM; templates render through sync_to_async because base.html reads
+# request.user and the flash messages, both of which load the session lazily.
+
+
+async def _render(request, template, context):
+    return await sync_to_async(render)(request, template, context)
+
+
+# ---------- CUSTOMER ----------
+async def home(request):
+    latest = [
+        car async for car in
+        Car.objects.filter(is_available=True).select_related("main_image").order_by("-created_at")[:6]
+    ]
+    return await _render(request, "cars/home.html", {"latest": latest})
+
+async def _inventory_page(state):
+    paginator = state["paginator"]
+    if not isinstance(paginator, Paginator):
+        # Keyset pages need a few dependent queries; run them in one hop.
+        return await sync_to_async(paginator.get_page)(state["page"])
+    paginator.count = await paginator.object_list.acount()
+    page_obj = paginator.get_page(state["page"])
+    page_obj.object_list = [car async for car in page_obj.object_list]
+    return page_obj
+
+@cache_anonymous_page
+async def inventory(request):
+    # Building the filters may probe for the search index once per process.
+    state = await sync_to_async(_inventory_state)(request)
+    page_obj, facets = await asyncio.gather(_inventory_page(state), aget_inventory_facets())
+    return await _render(request, "cars/inventory.html", _inventory_context(state, page_obj, facets))
+
+@acondition(last_modified_func=car_last_modified)
+@cache_anonymous_page
+async def car_detail(request, pk):
+    car = await aget_object_or_404(
+        Car.objects.select_related("main_image").prefetch_related("images"),
+        pk=pk, is_available=True,
+    )
+    return await _render(request, "cars/detail.html", _detail_context(car, BookingForm()))
+
+def _save_booking(booking):
+    # The booking and its outbox rows commit together; process_outbox sends them.
+    with transaction.atomic():
+        booking.save()
+        enqueue_booking_notifications(booking)
+
+async def book_test_drive(request, pk):
+    car = await aget_object_or_404(Car.objects.select_related("owner"), pk=pk, is_available=True)
+    if request.method != "POST":
+        return redirect("car_detail", pk=pk)
+
+    form = BookingForm(request.POST)
+    if form.is_valid():
+        booking = form.save(commit=False)
+        booking.car = car
+        await sync_to_async(_save_booking)(booking)
+        messages.success(request, "Booking submitted successfully. We will contact you soon.")
+        return redirect("car_detail", pk=pk)
+
+    context = await sync_to_async(_detail_context)(car, form)
+    return await _render(request, "cars/detail.html", context)
@@ -0,0 +1,543 @@
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .cache import bump_inventory_version
+from .forms import CarForm
+from .images import render_derivatives, store_derivatives
+from .models import Booking, Car, CarImage
+from .search import rebuild_index
+from .stats import rebuild_owner
+from .storage import acquire_many
+
+BENCH_USER_PREFIX = "bench-owner-"
+SCALES = {"1k": 1000, "10k": 10000, "100k": 100000}
+
+# Rough Philippine market mix and new-car prices (PHP) per brand in the form's map.
+BRAND_WEIGHTS = {
+    "Toyota": 38, "Mitsubishi": 16, "Suzuki": 10, "Nissan": 8, "Honda": 8, "Ford": 6,
+    "Isuzu": 4, "Hyundai": 3, "Mazda": 3, "Kia": 2, "Tesla": 1,
+}
+BASE_PRICES = {
+    "Toyota": 1_300_000, "Mitsubishi": 1_350_000, "Suzuki": 800_000, "Nissan": 1_300_000,
+    "Honda": 1_350_000, "Ford": 1_800_000, "Isuzu": 1_700_000, "Hyundai": 1_200_000,
+    "Mazda": 1_500_000, "Kia": 1_000_000, "Tesla": 3_000_000,
+}
+BODY_SEATS = {"Sedan": [5], "SUV": [5, 7, 8], "Van": [10, 12, 15]}
+LOCATIONS = ["Lucena City, Quezon", "Tayabas, Quezon", "Sariaya, Quezon", "Candelaria, Quezon", "Pagbilao, Quezon"]
+DESCRIPTIONS = [
+    "Casa maintained, complete service records.",
+    "First owner, fresh unit, no flood history.",
+    "Complete papers, registered until next year.",
+    "Well kept, new tires and battery.",
+    "",
+]
+BOOKING_STATUS_WEIGHTS = {"Pending": 40, "Approved": 30, "Done": 20, "Rejected": 10}
+
+
+# ---------- SEEDING ----------
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+def _image_pool(rng, size):
+    storage = CarImage._meta.get_field("image").storage
+    pool = []
+    for i in range(size):
+        start = tuple(rng.randrange(40, 220) for _ in range(3))
+        img = Image.linear_gradient("L").resize((800, 600)).convert("RGB")
+        img = Image.blend(img, Image.new("RGB", img.size, start), 0.6)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=80)
+        name = storage.save(f"cars/bench-{i}.jpg", ContentFile(buf.getvalue()))
+        with storage.open(name, "rb") as fh:
+            variants = store_derivatives(storage, name, render_derivatives(fh), overwrite=False)
+        pool.append((name, variants))
+    return pool
+
+def _make_car(rng, owner, today):
+    brand = _weighted(rng, BRAND_WEIGHTS)
+    age = min(int(rng.expovariate(1 / 5)), 20)
+    body_type = rng.choices(list(BODY_SEATS), weights=[45, 45, 10])[0]
+    price = BASE_PRICES[brand] * 0.87 ** age * rng.uniform(0.85, 1.15)
+    car = Car(
+        owner=owner,
+        brand=brand,
+        model=rng.choice(CarForm.BRAND_MODEL_MAP[brand]),
+        body_type=body_type,
+        seating_capacity=rng.choice(BODY_SEATS[body_type]),
+        year=today.year - age,
+        price=Decimal(max(100_000, round(price / 5000) * 5000)),
+        mileage=int(max(age, 0.3) * rng.uniform(8000, 18000)),
+        transmission="Automatic" if brand == "Tesla" or rng.random() < 0.6 else "Manual",
+        fuel="Electric" if brand == "Tesla" else _weighted(rng, {"Gasoline": 60, "Diesel": 35, "Hybrid": 5}),
+        location=rng.choice(LOCATIONS),
+        description=rng.choice(DESCRIPTIONS),
+    )
+    if rng.random() < 0.2:
+        car.is_available = False
+        car.sold_at = timezone.now() - timedelta(days=rng.randrange(365), minutes=rng.randrange(1440))
+    return car
+
+def _make_bookings(rng, car, mean, today):
+    count = min(int(rng.expovariate(1 / mean)), mean * 4) if mean else 0
+    return [
+        Booking(
+            car=car,
+            full_name=f"Customer {rng.randrange(100000)}",
+            phone=f"0917{rng.randrange(10**7):07d}",
+            email=f"customer{rng.randrange(100000)}@example.com" if rng.random() < 0.7 else "",
+            preferred_date=today + timedelta(days=rng.randrange(-60, 60)),
+            preferred_time=rng.choice(["09:00", "10:30", "13:00", "15:30"]),
+            status=_weighted(rng, BOOKING_STATUS_WEIGHTS),
+        )
+        for _ in range(count)
+    ]
+
+# Inserts `cars` synthetic listings spread over `owners` bench users, with
+# images drawn from a small pool of distinct files (content-addressed, so the
+# disk cost is the pool) and on average `bookings` bookings per car. Bulk
+# inserts skip signals, so index, refcounts and owner stats are rebuilt here.
+def seed(cars, owners=1, bookings=3, images=3, image_pool=24, batch_size=2000, random_seed=0, log=None):
+    log = log or (lambda message: None)
+    rng = random.Random(random_seed)
+    today = date.today()
+    users = []
+    for i in range(1, owners + 1):
+        user, created = User.objects.get_or_create(username=f"{BENCH_USER_PREFIX}{i}")
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=["password"])
+        users.append(user)
+    pool = _image_pool(rng, image_pool) if images else []
+    storage = CarImage._meta.get_field("image").storage
+
+    created = Counter()
+    for start in range(0, cars, batch_size):
+        with transaction.atomic():
+            batch = Car.objects.bulk_create(
+                [_make_car(rng, users[i % owners], today) for i in range(start, min(cars, start + batch_size))]
+            )
+            car_images, refs = [], Counter()
+            for car in batch:
+                for name, variants in rng.sample(pool, k=min(len(pool), rng.randint(1, images))) if pool else []:
+                    car_images.append(CarImage(car=car, image=name, variants=variants))
+                    refs[name] += 1
+            car_images = CarImage.objects.bulk_create(car_images, batch_size=batch_size)
+            first = {}
+            for image in car_images:
+                first.setdefault(image.car_id, image)
+            for car in batch:
+                car.main_image = first.get(car.pk)
+            Car.objects.bulk_update([car for car in batch if car.main_image], ["main_image"], batch_size=batch_size)
+            acquire_many(storage, refs)
+            booking_rows = [b for car in batch for b in _make_bookings(rng, car, bookings, today)]
+            Booking.objects.bulk_create(booking_rows, batch_size=batch_size)
+            rebuild_index(Car.objects.filter(pk__in=[car.pk for car in batch]), batch_size=batch_size)
+        created.update(cars=len(batch), images=len(car_images), bookings=len(booking_rows))
+        log(f"seeded {created['cars']}/{cars} cars")
+
+    for user in users:
+        rebuild_owner(user.pk)
+    bump_inventory_version()
+    return dict(created)
+
+def clear():
+    # Cascades through cars, images and bookings; signals keep stats and
+    # image refcounts right, so this is slow on large seeds but exact.
+    deleted, _ = User.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+    bump_inventory_version()
+    return deleted
+
+
+# ---------- SCENARIOS ----------
+class Scenario:
+    def __init__(self, name, path, method="get", data=None, owner=None, rollback=False):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data or {}
+        self.owner = owner
+        self.rollback = rollback
+
+    def request(self, client):
+        if not self.rollback:
+            return getattr(client, self.method)(self.path, self.data)
+        # Writes are rolled back so repeated runs see the same data; the
+        # surrounding atomic turns the view's own transaction into a savepoint.
+        with transaction.atomic():
+            response = getattr(client, self.method)(self.path, self.data)
+            transaction.set_rollback(True)
+        return response
+
+def scenarios():
+    owner = User.objects.filter(username__startswith=BENCH_USER_PREFIX).order_by("pk").first()
+    if owner is None:
+        raise LookupError("No benchmark data; run `manage.py seed_benchmark` first.")
+    car = Car.objects.filter(owner=owner, is_available=True).order_by("pk").first()
+    booking = {
+        "full_name": "Bench Customer", "phone": "09171234567", "email": "bench@example.com",
+        "preferred_date": (date.today() + timedelta(days=7)).isoformat(), "preferred_time": "10:00",
+    }
+    return [
+        Scenario("home", "/"),
+        Scenario("inventory", "/inventory/"),
+        Scenario("inventory_price_asc", "/inventory/?sort=price_asc"),
+        Scenario("inventory_price_desc", "/inventory/?sort=price_desc"),
+        Scenario("inventory_year_desc", "/inventory/?sort=year_desc"),
+        Scenario("inventory_brand", "/inventory/?brand=Toyota"),
+        Scenario(
+            "inventory_filters",
+            "/inventory/?brand=Toyota&trans=Automatic&fuel=Gasoline&min_price=300,000&max_price=1,500,000&min_year=2015",
+        ),
+        Scenario("inventory_search", "/inventory/?q=vios"),
+        Scenario("inventory_page_5", "/inventory/?page=5"),
+        Scenario("car_detail", f"/cars/{car.pk}/"),
+        Scenario("book_test_drive", f"/cars/{car.pk}/book/", method="post", data=booking, rollback=True),
+        Scenario("owner_dashboard", "/owner/", owner=owner),
+    ]
+
+
+# ---------- RUNNER ----------
+def _percentiles(samples):
+    if len(samples) < 2:
+        return samples[0], samples[0], samples[0]
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+def _consume(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+# Each request runs cold (cache cleared first) unless warm=True, so query
+# and template changes are not hidden behind the anonymous page cache.
+def measure(scenario, iterations=50, warmup=5, warm=False):
+    client = Client()
+    if scenario.owner is not None:
+        client.force_login(scenario.owner)
+    for _ in range(warmup):
+        _consume(scenario.request(client))
+
+    timings, queries, status = [], [], None
+    for _ in range(iterations):
+        if not warm:
+            cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = scenario.request(client)
+            _consume(response)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(ctx.captured_queries))
+        status = response.status_code
+
+    # One extra traced request: tracemalloc is too slow to leave on for timings.
+    if not warm:
+        cache.clear()
+    tracemalloc.start()
+    _consume(scenario.request(client))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p95, p99 = _percentiles(sorted(timings))
+    return {
+        "status": status,
+        "iterations": iterations,
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "queries": max(queries),
+        "alloc_peak_kb": round(peak / 1024, 1),
+    }
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run(iterations=50, warmup=5, warm=False, only=None, log=None):
+    log = log or (lambda message: None)
+    results = {}
+    for scenario in scenarios():
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = measure(scenario, iterations, warmup, warm)
+        log(f"{scenario.name}: {results[scenario.name]}")
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "cars": Car.objects.count(),
+            "bookings": Booking.objects.count(),
+            "images": CarImage.objects.count(),
+            "iterations": iterations,
+            "cache": "warm" if warm else "cold",
+        },
+        "scenarios": results,
+    }
+
+
+# ---------- CONCURRENCY ----------
+# Starts gunicorn from config/gunicorn.conf.py in the given SERVER_MODE (one
+# worker unless told otherwise) and fires anonymous GETs at it from an asyncio
+# client, so WSGI and ASGI, or pooled and unpooled connections, can be compared.
+# Cold runs point the server at the dummy cache so every request reaches the
+# database.
+@contextmanager
+def serve(mode, port, workers=1, warm=False, env=None, startup_timeout=30):
+    env = {**os.environ, **(env or {}), "SERVER_MODE": mode, "PORT": str(port), "WEB_CONCURRENCY": str(workers)}
+    if not warm:
+        env["CACHE_BACKEND"] = "django.core.cache.backends.dummy.DummyCache"
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "config/gunicorn.conf.py", "--access-logfile", "/dev/null"],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=errors,
+        )
+        try:
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    errors.seek(0)
+                    tail = errors.read().decode(errors="replace")[-2000:]
+                    raise RuntimeError(f"gunicorn ({mode}) did not start:\n{tail}")
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                    break
+                except OSError:
+                    time.sleep(0.2)
+            yield process
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+async def _get(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: localhost\r\nX-Forwarded-Proto: https\r\n"
+            "Connection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        while await reader.read(65536):
+            pass
+        return status
+    finally:
+        writer.close()
+
+async def _hammer(port, paths, concurrency, total):
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(paths[i % len(paths)])
+    timings, errors = [], Counter()
+
+    async def client():
+        while not queue.empty():
+            path = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                status = await _get(port, path)
+            except (OSError, IndexError, ValueError) as exc:
+                errors[type(exc).__name__] += 1
+                continue
+            timings.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors[str(status)] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return timings, errors, time.perf_counter() - start
+
+def concurrency_paths():
+    car = Car.objects.filter(is_available=True).order_by("pk").values_list("pk", flat=True).first()
+    if car is None:
+        raise LookupError("No benchmark data; run `manage.py seed_benchmark` first.")
+    return ["/", "/inventory/", "/inventory/?sort=price_asc", "/inventory/?q=vios", f"/cars/{car}/"]
+
+# Backends the server holds open on the benchmark database, ours excluded.
+# Only Postgres can say; None elsewhere.
+def server_connections():
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()"
+        )
+        return cursor.fetchone()[0]
+
+def load_test(mode, port, levels=(1, 8, 32), requests=200, workers=1, env=None, warm=False, log=None):
+    log = log or (lambda message: None)
+    paths = concurrency_paths()
+    results = {}
+    with serve(mode, port, workers=workers, warm=warm, env=env):
+        asyncio.run(_hammer(port, paths, 1, len(paths)))
+        for level in levels:
+            timings, errors, elapsed = asyncio.run(_hammer(port, paths, level, requests))
+            p50, p95, p99 = _percentiles(sorted(timings)) if timings else (0, 0, 0)
+            results[str(level)] = {
+                "requests": requests,
+                "rps": round(len(timings) / elapsed, 1),
+                "p50_ms": round(p50, 2),
+                "p95_ms": round(p95, 2),
+                "p99_ms": round(p99, 2),
+                "errors": dict(errors),
+                "db_connections": server_connections(),
+            }
+            log(f"{mode} w{workers} x{level}: {results[str(level)]}")
+    return results
+
+
+# ---------- SQLITE CONTENTION ----------
+# Reader processes fetch inventory and detail pages while writer processes book
+# test drives, all through the test client against one SQLite file, the way
+# gunicorn workers share it. Each process is `bench_sqlite --worker`, so its
+# settings (SQLITE_PERFORMANCE included) come from the environment.
+def contention_worker(role, start, until):
+    client = Client()
+    cars = list(Car.objects.filter(is_available=True).order_by("pk").values_list("pk", flat=True)[:200])
+    if not cars:
+        raise LookupError("No benchmark data; run `manage.py seed_benchmark` first.")
+    booking = {
+        "full_name": "Bench Customer", "phone": "09171234567", "email": "bench@example.com",
+        "preferred_date": (date.today() + timedelta(days=7)).isoformat(), "preferred_time": "10:00",
+    }
+    rng = random.Random()
+    timings, errors = [], Counter()
+    time.sleep(max(0, start - time.time()))
+    while time.time() < until:
+        car = rng.choice(cars)
+        begin = time.perf_counter()
+        try:
+            if role == "write":
+                response = client.post(f"/cars/{car}/book/", booking)
+            elif rng.random() < 0.5:
+                response = client.get("/inventory/", {"page": rng.randint(1, 20)})
+            else:
+                response = client.get(f"/cars/{car}/")
+        except Exception as exc:
+            errors[str(exc)[:80]] += 1
+            continue
+        _consume(response)
+        if response.status_code >= 400:
+            errors[str(response.status_code)] += 1
+            continue
+        timings.append((time.perf_counter() - begin) * 1000)
+    return {"ops": len(timings), "timings": timings, "errors": dict(errors)}
+
+def _snapshot(source, target):
+    # The backup API gives a consistent copy; the journal mode is reset so the
+    # untuned run really uses a rollback journal.
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        src.close()
+        dst.close()
+
+def sqlite_contention(source, readers=4, writers=2, seconds=10, tuned=False):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        _snapshot(source, path)
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{path}",
+            "DATABASE_REPLICA_URL": "",
+            "SQLITE_PERFORMANCE": str(tuned),
+            "CACHE_BACKEND": "django.core.cache.backends.dummy.DummyCache",
+            "ALLOWED_HOSTS": "testserver",
+        }
+        # Leave time for every process to start Django before the clock runs.
+        start = time.time() + 3
+        until = start + seconds
+        processes = [
+            (role, subprocess.Popen(
+                [sys.executable, "manage.py", "bench_sqlite", "--worker", role,
+                 "--start", str(start), "--until", str(until)],
+                cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, text=True,
+            ))
+            for role in ["read"] * readers + ["write"] * writers
+        ]
+        results = {}
+        for role, process in processes:
+            output, _ = process.communicate()
+            if process.returncode:
+                raise RuntimeError(f"{role} worker exited with {process.returncode}")
+            worker = json.loads(output)
+            total = results.setdefault(role, {"processes": 0, "ops": 0, "timings": [], "errors": Counter()})
+            total["processes"] += 1
+            total["ops"] += worker["ops"]
+            total["timings"] += worker["timings"]
+            total["errors"].update(worker["errors"])
+        check = sqlite3.connect(path)
+        journal = check.execute("PRAGMA journal_mode").fetchone()[0]
+        check.close()
+
+    report = {"tuned": tuned, "journal_mode": journal, "seconds": seconds}
+    for role, total in results.items():
+        p50, p95, p99 = _percentiles(sorted(total["timings"])) if total["timings"] else (0, 0, 0)
+        report[role] = {
+            "processes": total["processes"],
+            "ops": total["ops"],
+            "ops_per_s": round(total["ops"] / seconds, 1),
+            "p50_ms": round(p50, 2),
+            "p99_ms": round(p99, 2),
+            "errors": dict(total["errors"]),
+        }
+    return report
+
+
+# ---------- COMPARING ----------
+COMPARED_METRICS = ("p50_ms", "p95_ms", "p99_ms", "queries", "alloc_peak_kb")
+
+# Yields (scenario, metric, before, after, change %) for scenarios in both runs.
+def compare(baseline, current):
+    for name, after in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) * 100 / old if old else (0.0 if new == old else float("inf"))
+            yield name, metric, old, new, change
+
+def load(path):
+    with open(path) as fh:
+        return json.load(fh)
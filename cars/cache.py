@@ -0,0 +1,122 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Min
+
+from .models import Car
+from .timing import record_cache
+
+INVENTORY_VERSION_KEY = "cars:inventory:version"
+INVENTORY_CHANGED_KEY = "cars:inventory:changed"
+
+
+# ---------- INVENTORY VERSION ----------
+# False when the cache is not shared between the processes serving the site
+# (see VERSIONED_CACHE in settings); everything keyed by the version is then
+# computed per request instead.
+def versioned_cache_enabled():
+    return getattr(settings, "VERSIONED_CACHE", True)
+
+def get_inventory_version():
+    version = cache.get(INVENTORY_VERSION_KEY)
+    record_cache(version is not None)
+    if version is None:
+        # Seed from the clock so a flushed cache never reuses an old version number.
+        cache.add(INVENTORY_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(INVENTORY_VERSION_KEY)
+    return version
+
+async def aget_inventory_version():
+    version = await cache.aget(INVENTORY_VERSION_KEY)
+    record_cache(version is not None)
+    if version is None:
+        await cache.aadd(INVENTORY_VERSION_KEY, int(time.time() * 1000), None)
+        version = await cache.aget(INVENTORY_VERSION_KEY)
+    return version
+
+def bump_inventory_version():
+    if getattr(settings, "REPLICA_DATABASES", None):
+        # Keeps public reads on the primary until replicas have caught up.
+        cache.set(INVENTORY_CHANGED_KEY, 1, getattr(settings, "REPLICA_LAG_SECONDS", 5))
+    try:
+        return cache.incr(INVENTORY_VERSION_KEY)
+    except ValueError:
+        get_inventory_version()
+        return cache.incr(INVENTORY_VERSION_KEY)
+
+
+# ---------- FACETS ----------
+def _facet_key(version):
+    return f"cars:facets:v{version}"
+
+def _sorted_counts(counts):
+    return [{"value": value, "count": count} for value, count in sorted(counts.items())]
+
+def _build_inventory_facets():
+    # One GROUP BY over the facet columns; every facet is folded from these rows.
+    rows = (
+        Car.objects.filter(is_available=True)
+        .values("brand", "fuel", "transmission", "body_type")
+        .annotate(
+            count=Count("id"),
+            min_price=Min("price"), max_price=Max("price"),
+            min_year=Min("year"), max_year=Max("year"),
+        )
+        .order_by()
+    )
+    brands, fuels, transmissions, body_types = {}, {}, {}, {}
+    stats = {"min_price": None, "max_price": None, "min_year": None, "max_year": None}
+    for row in rows:
+        brands[row["brand"]] = brands.get(row["brand"], 0) + row["count"]
+        fuels[row["fuel"]] = fuels.get(row["fuel"], 0) + row["count"]
+        transmissions[row["transmission"]] = transmissions.get(row["transmission"], 0) + row["count"]
+        body_types[row["body_type"]] = body_types.get(row["body_type"], 0) + row["count"]
+        for key, pick in (("min_price", min), ("max_price", max), ("min_year", min), ("max_year", max)):
+            stats[key] = row[key] if stats[key] is None else pick(stats[key], row[key])
+
+    return {
+        "brand_options": [{"brand": brand, "count": count} for brand, count in sorted(brands.items())],
+        "fuel_options": _sorted_counts(fuels),
+        "transmission_options": _sorted_counts(transmissions),
+        "body_type_options": _sorted_counts(body_types),
+        "stats": stats,
+        "total": sum(brands.values()),
+    }
+
+def get_inventory_facets():
+    if not versioned_cache_enabled():
+        return _build_inventory_facets()
+    key = _facet_key(get_inventory_version())
+    facets = cache.get(key)
+    record_cache(facets is not None)
+    if facets is None:
+        facets = _build_inventory_facets()
+        cache.set(key, facets, getattr(settings, "INVENTORY_FACETS_TIMEOUT", 300))
+    return facets
+
+async def aget_inventory_facets():
+    if not versioned_cache_enabled():
+        return await sync_to_async(_build_inventory_facets)()
+    key = _facet_key(await aget_inventory_version())
+    facets = await cache.aget(key)
+    record_cache(facets is not None)
+    if facets is None:
+        facets = await sync_to_async(_build_inventory_facets)()
+        await cache.aset(key, facets, getattr(settings, "INVENTORY_FACETS_TIMEOUT", 300))
+    return facets
+
+
+# ---------- COUNTS ----------
+def get_cached_count(queryset, key):
+    if not versioned_cache_enabled():
+        return queryset.count()
+    cache_key = f"cars:count:v{get_inventory_version()}:{hashlib.md5(key.encode()).hexdigest()}"
+    count = cache.get(cache_key)
+    record_cache(count is not None)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, getattr(settings, "INVENTORY_FACETS_TIMEOUT", 300))
+    return count
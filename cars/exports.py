@@ -0,0 +1,196 @@
+import csv
+import re
+import zipfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_CHUNK_SIZE = 2000
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# "+"/"-" values that are only a phone number or a number stay as typed.
+SIGNED_NUMBER_RE = re.compile(r"[+-][\d ()-]+")
+
+BOOKING_COLUMNS = [
+    ("id", "Booking #"),
+    ("created_at", "Received"),
+    ("status", "Status"),
+    ("car_id", "Car #"),
+    ("car__brand", "Brand"),
+    ("car__model", "Model"),
+    ("car__year", "Year"),
+    ("full_name", "Name"),
+    ("phone", "Phone"),
+    ("email", "Email"),
+    ("preferred_date", "Preferred date"),
+    ("preferred_time", "Preferred time"),
+    ("note", "Note"),
+]
+INVENTORY_COLUMNS = [
+    ("id", "Car #"),
+    ("brand", "Brand"),
+    ("model", "Model"),
+    ("year", "Year"),
+    ("body_type", "Body type"),
+    ("seating_capacity", "Seats"),
+    ("transmission", "Transmission"),
+    ("fuel", "Fuel"),
+    ("mileage", "Mileage"),
+    ("price", "Price"),
+    ("location", "Location"),
+    ("is_available", "Available"),
+    ("sold_at", "Sold at"),
+    ("created_at", "Listed at"),
+]
+
+
+# ---------- ROWS ----------
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, time):
+        return value.strftime("%H:%M")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not SIGNED_NUMBER_RE.fullmatch(value):
+        # Customer-typed text must not turn into a spreadsheet formula.
+        return "'" + value
+    return value
+
+# values_list + iterator: rows stream from a server-side cursor as tuples, so
+# memory stays flat however long the owner's history is. Live and archived
+# rows come from separate querysets, exported one after the other.
+def export_rows(querysets, columns):
+    yield [label for _, label in columns]
+    fields = [field for field, _ in columns]
+    for queryset in querysets:
+        for row in queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield [_cell(value) for value in row]
+
+
+# ---------- CSV ----------
+class _Echo:
+    def write(self, value):
+        return value
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens the UTF-8 names correctly.
+    lines = ["﻿"]
+    for row in rows:
+        lines.append(writer.writerow(row))
+        # One write per few hundred rows rather than a syscall per row.
+        if len(lines) >= 500:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
+
+
+# ---------- XLSX ----------
+# A minimal single-sheet workbook written through zipfile onto a non-seekable
+# buffer, so it streams like the CSV instead of being built in memory first.
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = "</sheetData></worksheet>"
+
+
+class _Buffer:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def _xlsx_row(row):
+    cells = []
+    for value in row:
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+def stream_xlsx(rows, sheet_name="Export"):
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, xml in XLSX_PARTS.items():
+            archive.writestr(name, xml)
+        archive.writestr("xl/workbook.xml", XLSX_WORKBOOK.format(name=escape(sheet_name[:31])))
+        yield buffer.drain()
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(XLSX_SHEET_START.encode())
+            for count, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row).encode())
+                if count % 500 == 0:
+                    yield buffer.drain()
+            sheet.write(XLSX_SHEET_END.encode())
+    yield buffer.drain()
+
+
+# ---------- RESPONSE ----------
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", stream_csv),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", stream_xlsx),
+}
+
+def export_response(querysets, columns, filename, fmt="csv"):
+    if fmt not in EXPORT_FORMATS:
+        fmt = "csv"
+    content_type, stream = EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(stream(export_rows(querysets, columns)), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}-{timezone.localdate():%Y-%m-%d}.{fmt}"'
+    response["Cache-Control"] = "private, no-store"
+    return response
@@ -78,10 +78,12 @@ class CarForm(forms.ModelForm):
         self.fields["transmission"] = forms.ChoiceField(choices=trans_choices, required=True)
         self.fields["fuel"] = forms.ChoiceField(choices=fuel_choices, required=True)
 
-        self.fields["price"].widget = forms.TextInput(attrs={
+        # A plain text field, so "1,250,000" reaches clean_price instead of
+        # being rejected by DecimalField before the commas are stripped.
+        self.fields["price"] = forms.CharField(widget=forms.TextInput(attrs={
             "placeholder": "e.g. 1,250,000",
             "inputmode": "numeric",
-        })
+        }))
 
         for name, field in self.fields.items():
             if name == "is_available":
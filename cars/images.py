@@ -0,0 +1,124 @@
+import io
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+# Target widths; originals are never upscaled, so small uploads may share a width.
+VARIANT_WIDTHS = {
+    "thumb": 200,
+    "card": 640,
+    "detail": 1280,
+    "hero": 1920,
+}
+FORMAT_OPTIONS = {
+    "avif": ("AVIF", "avif", {"quality": 60}),
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+DERIVATIVE_RE = re.compile(
+    r"\.(?:%s)\.(?:%s)$" % (
+        "|".join(VARIANT_WIDTHS),
+        "|".join(ext for _, ext, _ in FORMAT_OPTIONS.values()),
+    )
+)
+
+
+def derivative_formats():
+    formats = getattr(settings, "IMAGE_DERIVATIVE_FORMATS", ["webp", "jpeg"])
+    if "avif" in formats and not features.check("avif"):
+        formats = [fmt for fmt in formats if fmt != "avif"]
+    if "jpeg" not in formats:
+        formats = [*formats, "jpeg"]
+    return formats
+
+# Derivatives sit next to the original and keep its full name as a prefix
+# (cars/photo.jpg -> cars/photo.jpg.card.webp), so the source is recoverable.
+def derivative_name(name, variant, fmt):
+    return f"{name}.{variant}.{FORMAT_OPTIONS[fmt][1]}"
+
+def is_derivative(name):
+    return bool(DERIVATIVE_RE.search(name))
+
+def derivative_source(name):
+    return DERIVATIVE_RE.sub("", name)
+
+def _prepare(img):
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    return img
+
+def _encode(img, fmt):
+    pil_format, _, options = FORMAT_OPTIONS[fmt]
+    if fmt == "jpeg" and img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, pil_format, **options)
+    return buf.getvalue()
+
+# Returns {variant: {"width": .., "height": .., fmt: bytes, ...}} without
+# touching storage, so callers (views, importers, process pools) can decide
+# where the bytes go.
+def render_derivatives(fileobj, formats=None):
+    formats = formats or derivative_formats()
+    with Image.open(fileobj) as original:
+        original = _prepare(original)
+        rendered, by_width = {}, {}
+        for variant, target in VARIANT_WIDTHS.items():
+            width = min(target, original.width)
+            if width in by_width:
+                # Small originals: larger variants alias the first one of this width.
+                rendered[variant] = {"width": width, "alias": by_width[width]}
+                continue
+            height = max(1, round(original.height * width / original.width))
+            resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+            rendered[variant] = {"width": width, "height": height}
+            for fmt in formats:
+                rendered[variant][fmt] = _encode(resized, fmt)
+            by_width[width] = variant
+    return rendered
+
+# overwrite=False keeps derivatives that already exist, e.g. when a
+# content-addressed original is imported a second time.
+def store_derivatives(storage, name, rendered, overwrite=True):
+    variants = {}
+    for variant, data in rendered.items():
+        if "alias" in data:
+            variants[variant] = variants[data["alias"]]
+            continue
+        entry = {"width": data["width"], "height": data["height"]}
+        for fmt in FORMAT_OPTIONS:
+            if fmt not in data:
+                continue
+            target = derivative_name(name, variant, fmt)
+            if storage.exists(target):
+                if not overwrite:
+                    entry[fmt] = target
+                    continue
+                storage.delete(target)
+            entry[fmt] = storage.save(target, ContentFile(data[fmt]))
+        variants[variant] = entry
+    return variants
+
+# With reuse=True an image whose file is already shared by another CarImage
+# (a content-addressed duplicate) copies that row's variants instead of
+# rendering them again.
+def generate_derivatives(car_image, reuse=True):
+    from .models import CarImage
+
+    field = car_image.image
+    variants = None
+    if reuse:
+        variants = (
+            CarImage.objects.filter(image=field.name).exclude(pk=car_image.pk).exclude(variants={})
+            .values_list("variants", flat=True).first()
+        )
+    if not variants:
+        with field.storage.open(field.name, "rb") as fh:
+            rendered = render_derivatives(fh)
+        variants = store_derivatives(field.storage, field.name, rendered)
+    CarImage.objects.filter(pk=car_image.pk).update(variants=variants)
+    car_image.variants = variants
+    return variants
@@ -0,0 +1,172 @@
+import csv
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.core.files import File
+from django.db import connections, transaction
+from PIL import Image
+
+from .cache import bump_inventory_version
+from .forms import CarForm
+from .images import derivative_formats, render_derivatives, store_derivatives
+from .models import Car, CarImage
+from .search import rebuild_index
+from .stats import rebuild_owner
+from .storage import acquire_many
+
+DEFAULT_LOCATION = "Lucena City, Quezon"
+TRUE_VALUES = {"1", "true", "yes", "y", "on"}
+
+
+class ImportRow:
+    def __init__(self, car, images):
+        self.car = car
+        self.images = images
+
+
+# ---------- READING ----------
+def read_rows(path):
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        if ext == ".csv":
+            yield from enumerate(csv.DictReader(fh), start=2)
+        elif ext == ".jsonl":
+            for line, raw in enumerate(fh, start=1):
+                if raw.strip():
+                    yield line, json.loads(raw)
+        elif ext == ".json":
+            yield from enumerate(json.load(fh), start=1)
+        else:
+            raise ValueError(f"Unsupported inventory file type: {ext or path}")
+
+def _image_names(value):
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value or "").replace("|", ";").split(";") if v.strip()]
+
+# Validates one feed row with the same rules as the owner's "Add Car" form
+# (brand/model map, year range, "1,250,000" prices) and returns an unsaved Car
+# or the form errors.
+def validate_row(data, owner, image_dir=None):
+    data = {k.strip(): v for k, v in data.items() if k}
+    available = data.get("is_available", True)
+    if isinstance(available, str):
+        available = available.strip().lower() in TRUE_VALUES
+    form_data = {k: "" if v is None else str(v).strip() for k, v in data.items()}
+    form_data["is_available"] = "on" if available else ""
+    form = CarForm(form_data)
+    if not form.is_valid():
+        return None, None, {k: [str(e) for e in v] for k, v in form.errors.items()}
+    car = form.save(commit=False)
+    car.owner = owner
+    car.location = form_data.get("location") or DEFAULT_LOCATION
+    images = [os.path.join(image_dir, name) if image_dir else name for name in _image_names(data.get("images"))]
+    return car, images, None
+
+
+# ---------- IMAGES (process pool) ----------
+def _init_worker():
+    django.setup()
+
+# Runs in a pool worker: verifies the file, stores it content-addressed and
+# renders its derivatives. Only names and sizes travel back to the parent.
+def process_image(path, formats):
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        storage = CarImage._meta.get_field("image").storage
+        with open(path, "rb") as fh:
+            name = storage.save(f"cars/{os.path.basename(path)}", File(fh))
+        with storage.open(name, "rb") as fh:
+            rendered = render_derivatives(fh, formats)
+        variants = store_derivatives(storage, name, rendered, overwrite=False)
+        return path, name, variants, None
+    except Exception as exc:
+        return path, None, None, f"{type(exc).__name__}: {exc}"
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# ---------- IMPORT ----------
+# bulk_create skips the Car/CarImage signals, so everything they would have
+# done (search index, MediaBlob counts, owner stats, page cache version) is
+# applied here once per batch or once per run.
+def _insert_batch(rows, processed):
+    with transaction.atomic():
+        cars = Car.objects.bulk_create([row.car for row in rows])
+        images, refs = [], Counter()
+        for row, car in zip(rows, cars):
+            for path in row.images:
+                name, variants = processed.get(path, (None, None))
+                if name:
+                    images.append(CarImage(car=car, image=name, variants=variants))
+                    refs[name] += 1
+        images = CarImage.objects.bulk_create(images)
+        first = {}
+        for image in images:
+            first.setdefault(image.car_id, image)
+        for car in cars:
+            car.main_image = first.get(car.pk)
+        Car.objects.bulk_update([car for car in cars if car.main_image], ["main_image"])
+        acquire_many(CarImage._meta.get_field("image").storage, refs)
+        rebuild_index(Car.objects.filter(pk__in=[car.pk for car in cars]))
+    return len(cars), len(images)
+
+def import_inventory(path, owner, image_dir=None, batch_size=500, workers=None, dry_run=False, log=None):
+    log = log or (lambda message: None)
+    result = {"rows": 0, "imported": 0, "invalid": 0, "images": 0, "image_errors": 0}
+    formats = derivative_formats()
+
+    pool = None
+    if workers != 0 and not dry_run:
+        # Forked workers must not share the parent's database sockets.
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    try:
+        valid = []
+        for line, data in read_rows(path):
+            result["rows"] += 1
+            car, images, errors = validate_row(data, owner, image_dir)
+            if errors:
+                result["invalid"] += 1
+                log(f"line {line}: " + "; ".join(f"{k}: {' '.join(v)}" for k, v in errors.items()))
+                continue
+            valid.append(ImportRow(car, images))
+
+        # Feeds often reuse a photo across units; each path is processed once per run.
+        processed = {}
+        for rows in _batches(valid, batch_size):
+            if dry_run:
+                result["imported"] += len(rows)
+                continue
+            paths = [p for p in dict.fromkeys(p for row in rows for p in row.images) if p not in processed]
+            if pool is not None:
+                outcomes = pool.map(process_image, paths, [formats] * len(paths), chunksize=4)
+            else:
+                outcomes = (process_image(p, formats) for p in paths)
+            for image_path, name, variants, error in outcomes:
+                if error:
+                    result["image_errors"] += 1
+                    log(f"{image_path}: {error}")
+                    processed[image_path] = (None, None)
+                else:
+                    processed[image_path] = (name, variants)
+            cars, images = _insert_batch(rows, processed)
+            result["imported"] += cars
+            result["images"] += images
+            log(f"imported {result['imported']}/{len(valid)} cars")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if result["imported"] and not dry_run:
+        rebuild_owner(owner.pk)
+        bump_inventory_version()
+    return result
@@ -0,0 +1,117 @@
+import logging
+import smtplib
+import statistics
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class ConnectError(Exception):
+    pass
+
+
+# Keeps one warm mail connection per process and pushes batches of messages
+# through it, so a burst of notifications pays for a single SMTP+TLS handshake.
+class MailDelivery:
+    def __init__(self, idle_timeout=None, sample_size=500):
+        self.idle_timeout = idle_timeout
+        self._connection = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.sent = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=sample_size)
+
+    def _idle_timeout(self):
+        if self.idle_timeout is not None:
+            return self.idle_timeout
+        return getattr(settings, "EMAIL_CONNECTION_IDLE_TIMEOUT", 60)
+
+    def _open(self):
+        if self._connection is not None and time.monotonic() - self._last_used > self._idle_timeout():
+            self._close()
+        if self._connection is None:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+            self._connection = connection
+            self._last_used = time.monotonic()
+            self.connects += 1
+        return self._connection
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _send_one(self, message):
+        for attempt in (1, 2):
+            try:
+                connection = self._open()
+            except Exception as exc:
+                raise ConnectError(exc) from exc
+            try:
+                sent = connection.send_messages([message])
+            except RECONNECT_ERRORS:
+                # The server dropped the idle connection; reconnect once and retry.
+                self._close()
+                if attempt == 2:
+                    raise
+                continue
+            self._last_used = time.monotonic()
+            return sent
+
+    # Returns one error (or None on success) per message, in order.
+    def send_messages(self, messages):
+        results = []
+        connect_error = None
+        with self._lock:
+            for message in messages:
+                if connect_error is not None:
+                    # The server is unreachable; don't pay the timeout again per message.
+                    self.failed += 1
+                    results.append(connect_error)
+                    continue
+                started = time.perf_counter()
+                try:
+                    self._send_one(message)
+                except ConnectError as exc:
+                    connect_error = exc.__cause__
+                    self.failed += 1
+                    results.append(connect_error)
+                except Exception as exc:
+                    self.failed += 1
+                    results.append(exc)
+                else:
+                    self.sent += 1
+                    results.append(None)
+                elapsed = time.perf_counter() - started
+                self.latencies.append(elapsed)
+                logger.debug("mail to %s in %.1fms", ", ".join(message.to), elapsed * 1000)
+        return results
+
+    def metrics(self):
+        samples = sorted(self.latencies)
+        if samples:
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            latency = {"p50_ms": statistics.median(samples) * 1000, "p95_ms": p95 * 1000, "max_ms": samples[-1] * 1000}
+        else:
+            latency = {"p50_ms": None, "p95_ms": None, "max_ms": None}
+        return {"connects": self.connects, "sent": self.sent, "failed": self.failed, **latency}
+
+
+mailer = MailDelivery()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.archive import archive_sold_cars
+
+
+class Command(BaseCommand):
+    help = "Move cars sold more than --days ago, with their photos and bookings, into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365, help="Archive cars sold more than this many days ago.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Cars moved per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many cars would be archived.")
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            raise CommandError("--days must not be negative.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        log = self.stdout.write if options["verbosity"] > 1 else None
+        count = archive_sold_cars(options["days"], options["batch_size"], options["dry_run"], log=log)
+        verb = "Would archive" if options["dry_run"] else "Archived"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {count} cars sold more than {options['days']} days ago."))
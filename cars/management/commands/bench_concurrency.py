@@ -0,0 +1,68 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cars import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn in each server mode (and worker count / pool setting) against the seeded "
+        "data and report requests/s, latency and database connections at increasing client "
+        "concurrency as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", action="append", dest="modes", choices=["wsgi", "asgi"],
+                            help="Server mode to test (repeatable; default both).")
+        parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated client concurrency levels.")
+        parser.add_argument("--workers", default="1", help="Comma-separated gunicorn worker counts.")
+        parser.add_argument("--pool", choices=["off", "on", "both"], default="off",
+                            help="Run with DB_POOL off, on, or once each (Postgres only).")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level.")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--warm", action="store_true", help="Keep the server's cache on (default uses the dummy cache).")
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+
+    def _levels(self, value, option):
+        try:
+            levels = [int(level) for level in value.split(",") if level.strip()]
+        except ValueError:
+            raise CommandError(f"{option} must be a comma-separated list of integers.")
+        if not levels or min(levels) < 1:
+            raise CommandError(f"{option} values must be at least 1.")
+        return levels
+
+    def handle(self, *args, **options):
+        levels = self._levels(options["concurrency"], "--concurrency")
+        worker_counts = self._levels(options["workers"], "--workers")
+        if options["requests"] < 1:
+            raise CommandError("--requests must be at least 1.")
+        pools = {"off": [False], "on": [True], "both": [False, True]}[options["pool"]]
+        if True in pools and settings.DATABASES["default"]["ENGINE"] != "django.db.backends.postgresql":
+            raise CommandError("--pool needs a Postgres DATABASE_URL.")
+        if settings.DEBUG:
+            self.stderr.write("DEBUG is on; numbers include debug query logging. Set DEBUG=False for comparable runs.")
+
+        log = self.stderr.write if options["verbosity"] > 1 else None
+        report = {}
+        for mode in options["modes"] or ["wsgi", "asgi"]:
+            for workers in worker_counts:
+                for pool in pools:
+                    label = f"{mode}/w{workers}" + ("/pool" if pool else "")
+                    try:
+                        report[label] = benchmark.load_test(
+                            mode, options["port"], levels, options["requests"], workers=workers,
+                            env={"DB_POOL": str(pool)}, warm=options["warm"], log=log,
+                        )
+                    except (LookupError, RuntimeError) as exc:
+                        raise CommandError(str(exc))
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(output + "\n")
+            self.stderr.write(f"Wrote {options['output']}.")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,60 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cars import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent reader and writer processes against a copy of the SQLite database, "
+        "with SQLITE_PERFORMANCE off and on, and report throughput, latency and lock errors as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=int, default=10)
+        parser.add_argument("--only", choices=["default", "tuned"], help="Run just one profile.")
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+        # Internal: one benchmark process, started by the parent run.
+        parser.add_argument("--worker", choices=["read", "write"], help="==SUPPRESS==")
+        parser.add_argument("--start", type=float, help="==SUPPRESS==")
+        parser.add_argument("--until", type=float, help="==SUPPRESS==")
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            result = benchmark.contention_worker(options["worker"], options["start"], options["until"])
+            self.stdout.write(json.dumps(result))
+            return
+
+        database = settings.DATABASES["default"]
+        if database["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("bench_sqlite needs an SQLite default database.")
+        if options["readers"] < 0 or options["writers"] < 0 or options["readers"] + options["writers"] < 1:
+            raise CommandError("Need at least one reader or writer.")
+        if options["seconds"] < 1:
+            raise CommandError("--seconds must be at least 1.")
+
+        profiles = {"default": False, "tuned": True}
+        if options["only"]:
+            profiles = {options["only"]: profiles[options["only"]]}
+        report = {}
+        for name, tuned in profiles.items():
+            try:
+                report[name] = benchmark.sqlite_contention(
+                    str(database["NAME"]), options["readers"], options["writers"], options["seconds"], tuned,
+                )
+            except (LookupError, RuntimeError) as exc:
+                raise CommandError(str(exc))
+            if options["verbosity"] > 1:
+                self.stderr.write(f"{name}: {report[name]}")
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(output + "\n")
+            self.stderr.write(f"Wrote {options['output']}.")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cars.cache import bump_inventory_version
+from cars.images import generate_derivatives
+from cars.models import CarImage
+from cars.storage import acquire, is_content_addressed
+
+
+class Command(BaseCommand):
+    help = "Move car images uploaded before content-addressed storage onto hashed names, sharing duplicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        moved = shared = missing = 0
+        targets = {}
+        for car_image in CarImage.objects.order_by("pk").iterator(chunk_size=options["batch_size"]):
+            field = car_image.image
+            if not field or is_content_addressed(field.name):
+                continue
+            if not field.storage.exists(field.name):
+                missing += 1
+                self.stderr.write(f"CarImage {car_image.pk}: {field.name} is missing.")
+                continue
+            if options["dry_run"]:
+                moved += 1
+                continue
+
+            old_name = field.name
+            with field.storage.open(old_name, "rb") as fh:
+                new_name = field.storage.save(old_name, fh)
+            shared += new_name in targets.values()
+            targets[old_name] = new_name
+            with transaction.atomic():
+                CarImage.objects.filter(pk=car_image.pk).update(image=new_name, variants={})
+                car_image.image.name = new_name
+                acquire(car_image.image)
+            car_image.variants = {}
+            try:
+                generate_derivatives(car_image)
+            except Exception as exc:
+                self.stderr.write(f"CarImage {car_image.pk}: derivatives failed ({exc}).")
+            moved += 1
+            self.stdout.write(f"{old_name} -> {new_name}")
+
+        if moved and not options["dry_run"]:
+            bump_inventory_version()
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {moved} images ({shared} duplicates of an earlier file, {missing} missing). "
+            "The old files are no longer referenced."
+        ))
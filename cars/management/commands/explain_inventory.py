@@ -0,0 +1,74 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from cars.models import Car, upper_exact
+
+# The filters cars.views._inventory_state builds for each query parameter.
+FILTERS = {
+    "none": [],
+    "brand": [upper_exact("brand", "Toyota")],
+    "trans": [upper_exact("transmission", "Automatic")],
+    "fuel": [upper_exact("fuel", "Diesel")],
+    "price": [Q(price__gte=300000, price__lte=1500000)],
+    "year": [Q(year__gte=2015, year__lte=2024)],
+    "brand+price": [upper_exact("brand", "Toyota"), Q(price__lte=1500000)],
+}
+ORDERINGS = {
+    "newest": ("-created_at", "-id"),
+    "price_asc": ("price", "id"),
+    "price_desc": ("-price", "-id"),
+    "year_desc": ("-year", "-id"),
+}
+SEQ_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on cars_car\b"),
+    "sqlite": re.compile(r"\bSCAN cars_car\b(?! USING)"),
+}
+
+
+class Command(BaseCommand):
+    help = "Print EXPLAIN plans for a matrix of public inventory queries and flag sequential scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--analyze", action="store_true", help="Use EXPLAIN ANALYZE (Postgres only).")
+        parser.add_argument(
+            "--no-seqscan", action="store_true",
+            help="SET enable_seqscan = off first, to prove indexes are usable on small tables (Postgres only).",
+        )
+        parser.add_argument("--fail-on-seq-scan", action="store_true")
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        is_postgres = connection.vendor == "postgresql"
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        explain_options = {"analyze": True} if options["analyze"] and is_postgres else {}
+
+        if options["no_seqscan"] and is_postgres:
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+        seq_scans = []
+        for filter_name, conditions in FILTERS.items():
+            for sort_name, ordering in ORDERINGS.items():
+                qs = (
+                    Car.objects.using(options["database"])
+                    .filter(*conditions, is_available=True)
+                    .order_by(*ordering)[:13]
+                )
+                plan = qs.explain(**explain_options)
+                label = f"{filter_name} / {sort_name}"
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(plan)
+                self.stdout.write("")
+                if pattern and pattern.search(plan):
+                    seq_scans.append(label)
+
+        if seq_scans:
+            self.stdout.write(self.style.WARNING(f"Sequential scans in {len(seq_scans)} plans: {', '.join(seq_scans)}"))
+            if options["fail_on_seq_scan"]:
+                raise CommandError("Inventory queries fall back to sequential scans.")
+        else:
+            self.stdout.write(self.style.SUCCESS("No sequential scans on cars_car."))
@@ -0,0 +1,48 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from cars.media_gc import collect_orphans
+from cars.models import CarImage
+
+
+def _mb(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class Command(BaseCommand):
+    help = "Delete car image files (originals, derivatives, stale temp files) that no row references."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted without deleting.")
+        parser.add_argument("--min-age", type=float, default=24, help="Hours a file must be untouched before it is collected.")
+        parser.add_argument("--prefix", default="cars", help="Storage directory to scan.")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--loop", action="store_true", help="Keep running, collecting every --interval seconds.")
+        parser.add_argument("--interval", type=float, default=3600)
+
+    def handle(self, *args, **options):
+        storage = CarImage._meta.get_field("image").storage
+        verbose = options["verbosity"] > 1 or options["dry_run"]
+
+        def report(name, size):
+            if verbose:
+                self.stdout.write(f"{'would delete' if options['dry_run'] else 'deleted'} {name} ({size} bytes)")
+
+        while True:
+            close_old_connections()
+            count, size = collect_orphans(
+                storage,
+                prefix=options["prefix"],
+                min_age=timedelta(hours=options["min_age"]),
+                batch_size=options["batch_size"],
+                dry_run=options["dry_run"],
+                on_file=report,
+            )
+            verb = "Would free" if options["dry_run"] else "Freed"
+            self.stdout.write(self.style.SUCCESS(f"{verb} {_mb(size)} in {count} orphaned files."))
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from cars.images import generate_derivatives
+from cars.models import CarImage
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG (and optional AVIF) derivatives for car images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate images that already have derivatives.")
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        qs = CarImage.objects.order_by("pk")
+        if not options["force"]:
+            qs = qs.filter(variants={})
+        done = failed = 0
+        for car_image in qs.iterator(chunk_size=options["batch_size"]):
+            try:
+                generate_derivatives(car_image, reuse=not options["force"])
+                done += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"CarImage {car_image.pk} ({car_image.image.name}): {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {done} images ({failed} failed)."))
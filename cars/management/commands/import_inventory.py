@@ -0,0 +1,46 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.importer import import_inventory
+
+
+class Command(BaseCommand):
+    help = "Bulk-import cars from a CSV/JSON/JSONL feed, processing their images in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Path to a .csv, .json or .jsonl file.")
+        parser.add_argument("--owner", required=True, help="Username the cars are listed under.")
+        parser.add_argument("--images", help="Directory that the feed's image file names are relative to.")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=None, help="Image worker processes (0 = in-process; default: one per CPU).")
+        parser.add_argument("--dry-run", action="store_true", help="Validate the feed without writing anything.")
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['owner']!r}.")
+
+        started = time.perf_counter()
+        try:
+            result = import_inventory(
+                options["source"],
+                owner,
+                image_dir=options["images"],
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+                dry_run=options["dry_run"],
+                log=self.stdout.write,
+            )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['imported']} of {result['rows']} rows ({result['invalid']} invalid), "
+            f"{result['images']} images ({result['image_errors']} failed) in {elapsed:.1f}s "
+            f"({result['imported'] / elapsed if elapsed else 0:.0f} cars/s)."
+        ))
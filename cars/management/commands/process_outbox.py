@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from cars.mail import mailer
+from cars.notifications import deliver_due
+
+
+def _ms(value):
+    return "-" if value is None else f"{value:.0f}ms"
+
+
+class Command(BaseCommand):
+    help = "Deliver queued booking emails and SMS, retrying failures with exponential backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain what is due now and exit.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep when the queue is idle.")
+        parser.add_argument("--batch-size", type=int, default=50)
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and settings.EMAIL_BACKEND == "django.core.mail.backends.console.EmailBackend":
+            # Messages would be marked sent after only being printed.
+            raise CommandError("EMAIL_HOST is not set; refusing to deliver the outbox to the console backend.")
+        while True:
+            close_old_connections()
+            sent, failed = deliver_due(options["batch_size"])
+            if sent or failed:
+                m = mailer.metrics()
+                self.stdout.write(
+                    f"Outbox: {sent} sent, {failed} failed "
+                    f"(smtp connects={m['connects']}, p50={_ms(m['p50_ms'])}, p95={_ms(m['p95_ms'])})."
+                )
+            if options["once"] and not (sent or failed):
+                mailer.close()
+                return
+            if not (sent or failed):
+                time.sleep(options["interval"])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.stats import check_stats
+
+
+class Command(BaseCommand):
+    help = "Compare owner dashboard stats with a fresh aggregate over live and archived cars and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report drift; exit non-zero if any is found.")
+
+    def handle(self, *args, **options):
+        drift = check_stats(fix=not options["check"])
+        for owner_id, columns in sorted(drift.items()):
+            self.stdout.write(f"Owner {owner_id}: {', '.join(columns)}")
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Owner stats are in sync."))
+        elif options["check"]:
+            raise CommandError(f"{len(drift)} owners have drifted stats.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {len(drift)} owners."))
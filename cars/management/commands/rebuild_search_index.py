@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.models import Car
+from cars.search import rebuild_index, search_backend
+
+
+class Command(BaseCommand):
+    help = "Re-index every car into the full-text search table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if search_backend(using) is None:
+            raise CommandError("No search index table exists on this database; run migrate first.")
+        count = rebuild_index(Car.objects.using(using), using=using, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} cars."))
@@ -0,0 +1,69 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from cars import benchmark
+
+
+class Command(BaseCommand):
+    help = "Time the public and owner pages against seeded data and report latency, queries and allocations as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--warm", action="store_true", help="Keep the cache between requests (default clears it).")
+        parser.add_argument("--scenario", action="append", dest="scenarios", help="Only run this scenario (repeatable).")
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+        parser.add_argument("--compare", help="Earlier JSON report to compare against.")
+        parser.add_argument(
+            "--fail-over", type=float,
+            help="With --compare, fail when any p95 grows by more than this percentage or queries increase.",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        if settings.DEBUG:
+            self.stderr.write("DEBUG is on; numbers include debug query logging. Set DEBUG=False for comparable runs.")
+        baseline = None
+        if options["compare"]:
+            try:
+                baseline = benchmark.load(options["compare"])
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Could not read {options['compare']}: {exc}")
+
+        log = self.stderr.write if options["verbosity"] > 1 else None
+        # The test client talks to "testserver".
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            try:
+                report = benchmark.run(
+                    iterations=options["iterations"],
+                    warmup=options["warmup"],
+                    warm=options["warm"],
+                    only=options["scenarios"],
+                    log=log,
+                )
+            except LookupError as exc:
+                raise CommandError(str(exc))
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(output + "\n")
+            self.stderr.write(f"Wrote {options['output']}.")
+        else:
+            self.stdout.write(output)
+
+        if baseline is None:
+            return
+        regressions = []
+        for name, metric, old, new, change in benchmark.compare(baseline, report):
+            self.stderr.write(f"{name:24} {metric:14} {old:>10} -> {new:>10}  {change:+.1f}%")
+            if options["fail_over"] is not None and (
+                (metric == "p95_ms" and change > options["fail_over"]) or (metric == "queries" and new > old)
+            ):
+                regressions.append(f"{name} {metric}")
+        if regressions:
+            raise CommandError("Regressed: " + ", ".join(regressions))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.benchmark import SCALES, clear, seed
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic cars, images and bookings for benchmarking (1k/10k/100k cars)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+        parser.add_argument("--cars", type=int, help="Exact number of cars; overrides --scale.")
+        parser.add_argument("--owners", type=int, default=1)
+        parser.add_argument("--bookings", type=int, default=3, help="Average bookings per car.")
+        parser.add_argument("--images", type=int, default=3, help="Maximum images per car (0 for none).")
+        parser.add_argument("--image-pool", type=int, default=24, help="Distinct image files shared by all cars.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, for repeatable data sets.")
+        parser.add_argument("--clear", action="store_true", help="Delete earlier benchmark data first.")
+
+    def handle(self, *args, **options):
+        if options["owners"] < 1:
+            raise CommandError("--owners must be at least 1.")
+        if options["clear"]:
+            self.stdout.write(f"Deleted {clear()} benchmark rows.")
+        cars = options["cars"] if options["cars"] is not None else SCALES[options["scale"]]
+        log = self.stdout.write if options["verbosity"] > 1 else None
+        created = seed(
+            cars,
+            owners=options["owners"],
+            bookings=options["bookings"],
+            images=options["images"],
+            image_pool=options["image_pool"],
+            batch_size=options["batch_size"],
+            random_seed=options["seed"],
+            log=log,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {created.get('cars', 0)} cars, {created.get('images', 0)} images "
+            f"and {created.get('bookings', 0)} bookings."
+        ))
@@ -0,0 +1,292 @@
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .storage import HASHED_NAME_RE, TEMP_PREFIX, is_content_addressed
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Precompressed siblings (photo.svg.br, photo.svg.gz) in preference order.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class MediaFile:
+    def __init__(self, path, stat, name):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = stat.st_mtime_ns
+        self.immutable = is_content_addressed(name)
+        if HASHED_NAME_RE.search(name):
+            # A content-addressed original already carries a SHA-256 of its bytes.
+            self.etag = f'"{os.path.basename(name).split(".", 1)[0][:32]}"'
+        else:
+            self.etag = f'"{self.size:x}-{self.mtime_ns:x}"'
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.encodings = {}
+        for encoding, suffix in ENCODINGS:
+            try:
+                self.encodings[encoding] = (path + suffix, os.stat(path + suffix).st_size)
+            except OSError:
+                pass
+
+
+# Bounded LRU of stat results keyed by media path. Every hit re-stat's the
+# file, so a collected file stops answering HEAD and 304s too; entries for
+# content-addressed files only need it to exist, anything else is reloaded
+# when its mtime moves so edits show up immediately.
+class MediaIndex:
+    def __init__(self, root, max_entries=10000):
+        self.root = str(root)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, name):
+        try:
+            path = safe_join(self.root, name)
+            stat = os.stat(path)
+        except (SuspiciousFileOperation, OSError, ValueError):
+            return None
+        if not os.path.isfile(path):
+            return None
+        return MediaFile(path, stat, name)
+
+    def get(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+        if entry is not None:
+            try:
+                stat = os.stat(entry.path)
+            except OSError:
+                entry = None
+            else:
+                if not entry.immutable and stat.st_mtime_ns != entry.mtime_ns:
+                    entry = None
+        if entry is None:
+            entry = self._load(name)
+            if entry is None:
+                self.discard(name)
+                return None
+            with self._lock:
+                self._entries[name] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def discard(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+
+
+# Hands the WSGI server a file positioned at the start of a byte range.
+# fileno() lets gunicorn's wsgi.file_wrapper sendfile() the range straight
+# from the page cache (it stops at Content-Length); read() bounds the
+# fallback iteration for servers without a file wrapper.
+class FileRange:
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self._fh = fh
+        self._remaining = length
+
+    def fileno(self):
+        return self._fh.fileno()
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b""
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._fh.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._fh.close()
+
+
+# None means "ignore the header and send the whole file": RFC 9110 treats a
+# malformed range, or one whose last byte precedes its first, as invalid
+# rather than unsatisfiable.
+def _parse_range(header, size):
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        if end and int(end) < start:
+            return None
+        if start >= size:
+            return "unsatisfiable"
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        suffix = int(end)
+        if suffix == 0 or size == 0:
+            return "unsatisfiable"
+        start, end = max(0, size - suffix), size - 1
+    return start, end
+
+
+# Serves MEDIA_URL straight from MEDIA_ROOT, the way WhiteNoise serves
+# STATIC_ROOT: before sessions and auth, with validators, Range support,
+# precompressed variants and immutable caching for content-addressed images.
+class MediaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.prefix = settings.MEDIA_URL
+        self.enabled = getattr(settings, "SERVE_MEDIA", False) and self.prefix.startswith("/")
+        self.max_age = getattr(settings, "MEDIA_MAX_AGE", 86400)
+        self.index = MediaIndex(settings.MEDIA_ROOT)
+
+    def _lookup(self, request):
+        if self.enabled and request.path_info.startswith(self.prefix) and request.method in ("GET", "HEAD"):
+            name = request.path_info[len(self.prefix):]
+            # Upload temp files are never public, even once complete.
+            if not posixpath.basename(name).startswith(TEMP_PREFIX):
+                return self.index.get(name)
+        return None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        entry = self._lookup(request)
+        if entry is not None:
+            response = self.serve(request, entry)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # stat() and open() of a cached index entry are cheap enough to run on
+        # the event loop, as WhiteNoise does for static files.
+        entry = self._lookup(request)
+        if entry is not None:
+            response = self.serve(request, entry)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def _headers(self, response, entry):
+        response["ETag"] = entry.etag
+        response["Last-Modified"] = http_date(entry.mtime)
+        response["Accept-Ranges"] = "bytes"
+        if entry.immutable:
+            response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response["Cache-Control"] = f"public, max-age={self.max_age}"
+        if entry.encodings:
+            response["Vary"] = "Accept-Encoding"
+        return response
+
+    def _not_modified(self, request, entry):
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            return "*" in etags or entry.etag in etags or f"W/{entry.etag}" in etags
+        since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+        return since is not None and int(entry.mtime) <= since
+
+    def _encoding(self, request, entry):
+        accepted = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        for encoding, _ in ENCODINGS:
+            if encoding in entry.encodings and encoding in accepted:
+                return encoding
+        return None
+
+    def serve(self, request, entry):
+        if self._not_modified(request, entry):
+            return self._headers(HttpResponseNotModified(), entry)
+
+        encoding = self._encoding(request, entry)
+        path, size = entry.encodings[encoding] if encoding else (entry.path, entry.size)
+        byte_range = None
+        if encoding is None and "HTTP_RANGE" in request.META:
+            if_range = request.META.get("HTTP_IF_RANGE")
+            if if_range is None or if_range == entry.etag:
+                byte_range = _parse_range(request.META["HTTP_RANGE"], size)
+        if byte_range == "unsatisfiable":
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return self._headers(response, entry)
+
+        if request.method == "HEAD":
+            response = HttpResponse(content_type=entry.content_type)
+            response["Content-Length"] = size
+            if encoding:
+                response["Content-Encoding"] = encoding
+            return self._headers(response, entry)
+
+        try:
+            fh = open(path, "rb")
+        except OSError:
+            # Collected since it was indexed; fall through to the URLconf.
+            self.index.discard(request.path_info[len(self.prefix):])
+            return None
+
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(FileRange(fh, start, end - start + 1), status=206, content_type=entry.content_type)
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = end - start + 1
+        else:
+            response = FileResponse(fh, content_type=entry.content_type)
+            response["Content-Length"] = size
+        if encoding:
+            response["Content-Encoding"] = encoding
+        return self._headers(response, entry)
+
+
+# WhiteNoiseMiddleware is sync-only, which under ASGI would push every request
+# through a thread. This adapter calls its public __call__ with a pass-through
+# in place of the chain, in a thread and only for paths under STATIC_URL (or
+# every path when WHITENOISE_ROOT serves files from /); everything else is
+# awaited on the event loop.
+PASS_THROUGH = object()
+
+
+class StaticFilesMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if not self.async_mode:
+            self.whitenoise = WhiteNoiseMiddleware(get_response)
+            return
+        markcoroutinefunction(self)
+        self.whitenoise = sync_to_async(WhiteNoiseMiddleware(lambda request: PASS_THROUGH), thread_sensitive=False)
+        self.prefix = "/" if getattr(settings, "WHITENOISE_ROOT", None) else urlparse(settings.STATIC_URL).path
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.whitenoise(request)
+
+    async def __acall__(self, request):
+        if request.path.startswith(self.prefix):
+            response = await self.whitenoise(request)
+            if response is not PASS_THROUGH:
+                return response
+        return await self.get_response(request)
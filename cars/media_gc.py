@@ -0,0 +1,68 @@
+import posixpath
+from datetime import timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+from .images import derivative_source
+from .models import ArchivedCarImage, CarImage, MediaBlob
+from .storage import TEMP_PREFIX
+
+
+def iter_files(storage, directory):
+    dirs, files = storage.listdir(directory)
+    for filename in files:
+        yield posixpath.join(directory, filename)
+    for subdir in dirs:
+        yield from iter_files(storage, posixpath.join(directory, subdir))
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+# Of the given original names, those still pointed at by a live or archived
+# image row or held by a MediaBlob reference.
+def referenced_names(names):
+    names = list(names)
+    live = set(CarImage.objects.filter(image__in=names).values_list("image", flat=True))
+    live.update(ArchivedCarImage.objects.filter(image__in=names).values_list("image", flat=True))
+    live.update(MediaBlob.objects.filter(name__in=names, refcount__gt=0).values_list("name", flat=True))
+    return live
+
+def _source(name):
+    if posixpath.basename(name).startswith(TEMP_PREFIX):
+        return None
+    return derivative_source(name)
+
+# Walks the storage listing in batches and yields (name, size) for files no
+# row references: originals, their derivatives and abandoned upload temp
+# files. Each batch costs one lookup per reference table, whatever its size.
+# Files modified within min_age are skipped so uploads in flight survive.
+def find_orphans(storage, prefix="cars", min_age=timedelta(hours=24), batch_size=500):
+    if not storage.exists(prefix):
+        return
+    cutoff = timezone.now() - min_age
+    for batch in _batches(iter_files(storage, prefix), batch_size):
+        sources = {name: _source(name) for name in batch}
+        live = referenced_names({s for s in sources.values() if s is not None})
+        for name in batch:
+            if sources[name] in live:
+                continue
+            if storage.get_modified_time(name) > cutoff:
+                continue
+            yield name, storage.size(name)
+
+def collect_orphans(storage, prefix="cars", min_age=timedelta(hours=24), batch_size=500, dry_run=False, on_file=None):
+    count = size = 0
+    for batch in _batches(find_orphans(storage, prefix, min_age, batch_size), batch_size):
+        for name, file_size in batch:
+            if on_file is not None:
+                on_file(name, file_size)
+            if not dry_run:
+                storage.delete(name)
+            count += 1
+            size += file_size
+        if not dry_run:
+            MediaBlob.objects.filter(name__in=[name for name, _ in batch], refcount__lte=0).delete()
+    return count, size
@@ -0,0 +1,67 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                # Server without the contrib modules: search falls back to icontains.
+                return
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            """
+            CREATE TABLE cars_car_search (
+                car_id bigint PRIMARY KEY REFERENCES cars_car (id) ON DELETE CASCADE,
+                document tsvector NOT NULL,
+                body text NOT NULL
+            )
+            """
+        )
+        schema_editor.execute("CREATE INDEX cars_car_search_document_gin ON cars_car_search USING gin (document)")
+        schema_editor.execute("CREATE INDEX cars_car_search_body_trgm ON cars_car_search USING gin (body gin_trgm_ops)")
+        schema_editor.execute(
+            """
+            INSERT INTO cars_car_search (car_id, document, body)
+            SELECT id,
+                   setweight(to_tsvector('simple', brand || ' ' || model), 'A')
+                   || setweight(to_tsvector('simple', location), 'B')
+                   || setweight(to_tsvector('simple', description), 'C'),
+                   lower(brand || ' ' || model || ' ' || location)
+            FROM cars_car
+            """
+        )
+    elif connection.vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE cars_car_fts USING fts5("
+                "brand, model, location, description, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to icontains.
+            return
+        schema_editor.execute(
+            "INSERT INTO cars_car_fts (rowid, brand, model, location, description) "
+            "SELECT id, brand, model, location, description FROM cars_car"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute("DROP TABLE IF EXISTS cars_car_search")
+    elif connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS cars_car_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cars", "0005_car_body_type_car_seating_capacity"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
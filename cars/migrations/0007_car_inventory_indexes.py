@@ -0,0 +1,60 @@
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cars", "0006_car_search_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="car",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["-created_at", "-id"],
+                name="car_avail_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="car",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["price", "id"],
+                name="car_avail_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="car",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["-year", "-id"],
+                name="car_avail_year_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="car",
+            index=models.Index(
+                Upper("brand"),
+                condition=models.Q(("is_available", True)),
+                name="car_avail_brand_ci_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="car",
+            index=models.Index(
+                Upper("transmission"),
+                condition=models.Q(("is_available", True)),
+                name="car_avail_trans_ci_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="car",
+            index=models.Index(
+                Upper("fuel"),
+                condition=models.Q(("is_available", True)),
+                name="car_avail_fuel_ci_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cars", "0007_car_inventory_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="carimage",
+            name="variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
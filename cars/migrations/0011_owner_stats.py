@@ -0,0 +1,41 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('cars', '0010_car_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerStats',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='car_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_cars', models.IntegerField(default=0)),
+                ('available_count', models.IntegerField(default=0)),
+                ('available_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sold_count', models.IntegerField(default=0)),
+                ('sold_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OwnerMonthlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('sold_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['owner', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'month'), name='owner_month_sales_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+import cars.storage
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0013_content_addressed_images'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCar',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('brand', models.CharField(max_length=60)),
+                ('model', models.CharField(max_length=60)),
+                ('body_type', models.CharField(choices=[('Sedan', 'Sedan'), ('SUV', 'SUV'), ('Van', 'Van')], default='Sedan', max_length=20)),
+                ('seating_capacity', models.PositiveSmallIntegerField(default=5)),
+                ('year', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('mileage', models.IntegerField(default=0)),
+                ('transmission', models.CharField(default='Automatic', max_length=20)),
+                ('fuel', models.CharField(default='Gasoline', max_length=20)),
+                ('location', models.CharField(max_length=120)),
+                ('description', models.TextField(blank=True)),
+                ('is_available', models.BooleanField(default=False)),
+                ('sold_at', models.DateTimeField(blank=True, null=True)),
+                ('main_image', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_cars', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('full_name', models.CharField(max_length=100)),
+                ('phone', models.CharField(max_length=30)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('preferred_date', models.DateField()),
+                ('preferred_time', models.TimeField()),
+                ('note', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Approved', 'Approved'), ('Rejected', 'Rejected'), ('Done', 'Done')], default='Pending', max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='cars.archivedcar')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedCarImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(storage=cars.storage.car_image_storage, upload_to='cars/')),
+                ('variants', models.JSONField(blank=True, default=dict)),
+                ('uploaded_at', models.DateTimeField()),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='cars.archivedcar')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedcar',
+            index=models.Index(fields=['owner', '-created_at', '-id'], name='archived_car_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['car', '-created_at', '-id'], name='archived_booking_car_idx'),
+        ),
+    ]
@@ -1,5 +1,18 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Upper
+from django.db.models.lookups import Exact
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .storage import car_image_storage
+
+# Case-insensitive match written as UPPER(field) = UPPER(value): the shape the
+# partial UPPER() indexes on Car serve on every backend. __iexact compiles to
+# LIKE on SQLite, which they cannot.
+def upper_exact(field, value):
+    return Exact(Upper(field), Upper(Value(value)))
+
 
 class Car(models.Model):
     BODY_TYPE_CHOICES = [
@@ -30,13 +43,67 @@ class Car(models.Model):
         related_name="main_for"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Public listings always filter on is_available=True, so every index is
+        # partial on it: one per inventory sort key (id is the keyset
+        # tiebreaker) and one per case-insensitive filter (see upper_exact).
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], condition=Q(is_available=True), name="car_avail_created_idx"),
+            models.Index(fields=["price", "id"], condition=Q(is_available=True), name="car_avail_price_idx"),
+            models.Index(fields=["-year", "-id"], condition=Q(is_available=True), name="car_avail_year_idx"),
+            models.Index(Upper("brand"), condition=Q(is_available=True), name="car_avail_brand_ci_idx"),
+            models.Index(Upper("transmission"), condition=Q(is_available=True), name="car_avail_trans_ci_idx"),
+            models.Index(Upper("fuel"), condition=Q(is_available=True), name="car_avail_fuel_ci_idx"),
+            # Owner dashboard "My Cars" keyset pages.
+            models.Index(fields=["owner", "-created_at", "-id"], name="car_owner_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.year} {self.brand} {self.model}"
 
+    # Fields that feed OwnerStats; see cars.stats.
+    STATS_FIELDS = ("owner_id", "is_available", "price", "sold_at")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stats_snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        # Partial refreshes include lazy loads of deferred fields; keep the
+        # snapshot taken (or fetched by pre_save) for those.
+        if fields is None:
+            self._stats_snapshot()
+
+    # Remembers the stats-relevant values as stored, so post_save can apply
+    # the difference instead of re-aggregating the owner's fleet.
+    def _stats_snapshot(self):
+        if set(self.STATS_FIELDS) & self.get_deferred_fields():
+            self._loaded_stats = None
+        else:
+            self._loaded_stats = tuple(getattr(self, f) for f in self.STATS_FIELDS)
+
+    def save(self, *args, **kwargs):
+        # Partial saves (mark sold, set main image, ...) still bump updated_at.
+        if kwargs.get("update_fields"):
+            kwargs["update_fields"] = {*kwargs["update_fields"], "updated_at"}
+        update_fields = kwargs.get("update_fields")
+        if update_fields and not {f.removesuffix("_id") for f in self.STATS_FIELDS} & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+        # The row and its OwnerStats delta (post_save) commit together.
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
 class CarImage(models.Model):
     car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name="images")
-    image = models.ImageField(upload_to="cars/")
+    image = models.ImageField(upload_to="cars/", storage=car_image_storage)
+    # Resized derivatives keyed by variant name, see cars.images.
+    variants = models.JSONField(default=dict, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -59,5 +126,157 @@ class Booking(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Pending")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Owner dashboard bookings panel: keyset pages, optionally per car.
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="booking_created_idx"),
+            models.Index(fields=["car", "-created_at", "-id"], name="booking_car_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.full_name} - {self.car} ({self.status})"
+
+
+# ---------- ARCHIVE ----------
+# Cold copies of cars sold long ago, moved out of Car (with their photos and
+# bookings) by `manage.py archive_sold_cars`, so the live tables and their
+# indexes only carry current stock. Ids are kept from the live rows. Owner
+# stats still count archived sales, and archived photos keep their MediaBlob
+# references; see cars.archive.
+class ArchivedCar(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_cars")
+    brand = models.CharField(max_length=60)
+    model = models.CharField(max_length=60)
+    body_type = models.CharField(max_length=20, choices=Car.BODY_TYPE_CHOICES, default="Sedan")
+    seating_capacity = models.PositiveSmallIntegerField(default=5)
+    year = models.IntegerField()
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    mileage = models.IntegerField(default=0)
+    transmission = models.CharField(max_length=20, default="Automatic")
+    fuel = models.CharField(max_length=20, default="Gasoline")
+    location = models.CharField(max_length=120)
+    description = models.TextField(blank=True)
+    is_available = models.BooleanField(default=False)
+    sold_at = models.DateTimeField(null=True, blank=True)
+    # File name of the main photo, which lives on among the archived images.
+    main_image = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "-created_at", "-id"], name="archived_car_owner_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.year} {self.brand} {self.model} (archived)"
+
+class ArchivedCarImage(models.Model):
+    car = models.ForeignKey(ArchivedCar, on_delete=models.CASCADE, related_name="images")
+    image = models.ImageField(upload_to="cars/", storage=car_image_storage)
+    variants = models.JSONField(default=dict, blank=True)
+    uploaded_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Image for {self.car}"
+
+class ArchivedBooking(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    car = models.ForeignKey(ArchivedCar, on_delete=models.CASCADE, related_name="bookings")
+    full_name = models.CharField(max_length=100)
+    phone = models.CharField(max_length=30)
+    email = models.EmailField(blank=True)
+    preferred_date = models.DateField()
+    preferred_time = models.TimeField()
+    note = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES, default="Pending")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["car", "-created_at", "-id"], name="archived_booking_car_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.full_name} - {self.car} ({self.status})"
+
+
+# One row per content-addressed image file, counting the CarImage rows that
+# point at it; see cars.storage.
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class OutboxMessage(models.Model):
+    CHANNEL_CHOICES = [
+        ("email", "Email"),
+        ("sms", "SMS"),
+    ]
+    STATUS_CHOICES = [
+        ("Pending", "Pending"),
+        ("Sent", "Sent"),
+        ("Failed", "Failed"),
+    ]
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="notifications"
+    )
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipients = models.JSONField(default=list)
+    subject = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {', '.join(self.recipients)} ({self.status})"
+
+
+# Running dashboard totals per owner, kept in step with Car by cars.stats and
+# repaired with `manage.py rebuild_owner_stats`.
+class OwnerStats(models.Model):
+    owner = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="car_stats")
+    total_cars = models.IntegerField(default=0)
+    available_count = models.IntegerField(default=0)
+    available_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sold_count = models.IntegerField(default=0)
+    sold_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.owner}"
+
+class OwnerMonthlySales(models.Model):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="monthly_sales")
+    month = models.DateField()
+    sold_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "month"], name="owner_month_sales_uniq"),
+        ]
+        ordering = ["owner", "month"]
+
+    def __str__(self):
+        return f"{self.owner} {self.month:%Y-%m}: {self.sold_count}"
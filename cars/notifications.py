@@ -0,0 +1,190 @@
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.utils import timezone
+
+from .mail import mailer
+from .models import Booking, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- MESSAGES ----------
+def _owner_booking_email(booking: Booking):
+    recipients = []
+    owner_email = booking.car.owner.email
+    if owner_email:
+        recipients.append(owner_email)
+    alert_email = getattr(settings, "BOOKING_ALERT_EMAIL", "")
+    if alert_email and alert_email not in recipients:
+        recipients.append(alert_email)
+    if not recipients:
+        return None
+    return OutboxMessage(
+        booking=booking,
+        channel="email",
+        recipients=recipients,
+        subject=f"New Test Drive Booking - #{booking.id}",
+        body=(
+            f"New booking received.\n\n"
+            f"Car: {booking.car}\n"
+            f"Name: {booking.full_name}\n"
+            f"Phone: {booking.phone}\n"
+            f"Email: {booking.email}\n"
+            f"Date/Time: {booking.preferred_date} {booking.preferred_time}\n"
+            f"Note: {booking.note}\n"
+            f"Status: {booking.status}\n"
+        ),
+    )
+
+def _customer_booking_email(booking: Booking):
+    if not booking.email:
+        return None
+    return OutboxMessage(
+        booking=booking,
+        channel="email",
+        recipients=[booking.email],
+        subject=f"Booking Received - {booking.car}",
+        body=(
+            f"Hi {booking.full_name},\n\n"
+            f"Your test drive request has been received.\n\n"
+            f"Car: {booking.car}\n"
+            f"Preferred schedule: {booking.preferred_date} {booking.preferred_time}\n"
+            f"Current status: {booking.status}\n\n"
+            f"We will contact you soon to confirm.\n\n"
+            f"Thank you,\n"
+            f"AutoMac Lucena"
+        ),
+    )
+
+def _customer_status_email(booking: Booking):
+    if not booking.email:
+        return None
+    return OutboxMessage(
+        booking=booking,
+        channel="email",
+        recipients=[booking.email],
+        subject=f"Booking Status Update - {booking.car}",
+        body=(
+            f"Hi {booking.full_name},\n\n"
+            f"Your booking status is now: {booking.status}\n\n"
+            f"Car: {booking.car}\n"
+            f"Preferred schedule: {booking.preferred_date} {booking.preferred_time}\n\n"
+            f"Thank you,\n"
+            f"AutoMac Lucena"
+        ),
+    )
+
+def _booking_sms(booking: Booking):
+    # OPTIONAL SMS (Twilio) - only queued if credentials are present
+    if not (getattr(settings, "TWILIO_ACCOUNT_SID", "") and getattr(settings, "TWILIO_AUTH_TOKEN", "") and getattr(settings, "TWILIO_FROM_NUMBER", "")):
+        return None
+    return OutboxMessage(
+        booking=booking,
+        channel="sms",
+        recipients=[booking.phone],
+        body=f"AutoHub booking: {booking.full_name} for {booking.car} on {booking.preferred_date} {booking.preferred_time}.",
+    )
+
+
+# ---------- ENQUEUE ----------
+def _enqueue(messages):
+    messages = [m for m in messages if m is not None]
+    if messages:
+        OutboxMessage.objects.bulk_create(messages)
+    return messages
+
+def enqueue_booking_notifications(booking: Booking):
+    return _enqueue([
+        _owner_booking_email(booking),
+        _customer_booking_email(booking),
+        _booking_sms(booking),
+    ])
+
+def enqueue_status_notification(booking: Booking):
+    return _enqueue([_customer_status_email(booking)])
+
+
+# ---------- DELIVERY ----------
+def _max_attempts():
+    return getattr(settings, "NOTIFICATION_MAX_ATTEMPTS", 6)
+
+def retry_delay(attempts):
+    base = getattr(settings, "NOTIFICATION_RETRY_BASE_SECONDS", 30)
+    cap = getattr(settings, "NOTIFICATION_RETRY_MAX_SECONDS", 3600)
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+# Claims due messages by pushing next_attempt_at out by a lease; a worker that
+# dies mid-send leaves the message to be retried once the lease expires.
+def claim_due(batch_size=50):
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, "NOTIFICATION_LEASE_SECONDS", 300))
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status="Pending", next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        for message in messages:
+            message.attempts += 1
+            message.next_attempt_at = now + lease
+        OutboxMessage.objects.bulk_update(messages, ["attempts", "next_attempt_at"])
+    return messages
+
+def _email(message: OutboxMessage):
+    return EmailMessage(message.subject, message.body, settings.DEFAULT_FROM_EMAIL, message.recipients)
+
+def _send_sms(message: OutboxMessage):
+    from twilio.rest import Client
+    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    for to in message.recipients:
+        client.messages.create(body=message.body, from_=settings.TWILIO_FROM_NUMBER, to=to)
+
+def mark_sent(message: OutboxMessage):
+    message.status = "Sent"
+    message.sent_at = timezone.now()
+    message.last_error = ""
+    message.save(update_fields=["status", "sent_at", "last_error"])
+
+def mark_failed(message: OutboxMessage, error):
+    message.last_error = str(error)[:2000]
+    if message.attempts >= _max_attempts():
+        message.status = "Failed"
+    else:
+        message.next_attempt_at = timezone.now() + retry_delay(message.attempts)
+    message.save(update_fields=["status", "next_attempt_at", "last_error"])
+    logger.warning("Outbox message %s failed (attempt %s): %s", message.pk, message.attempts, error)
+
+def _record(message: OutboxMessage, error):
+    if error is None:
+        mark_sent(message)
+        return True
+    mark_failed(message, error)
+    return False
+
+def deliver(messages):
+    emails = [m for m in messages if m.channel == "email"]
+    sent = 0
+    # All due emails share one pooled SMTP connection.
+    for message, error in zip(emails, mailer.send_messages([_email(m) for m in emails])):
+        sent += _record(message, error)
+    for message in messages:
+        if message.channel != "sms":
+            continue
+        try:
+            _send_sms(message)
+            error = None
+        except Exception as exc:
+            error = exc
+        sent += _record(message, error)
+    return sent
+
+def deliver_due(batch_size=50):
+    messages = claim_due(batch_size)
+    sent = deliver(messages)
+    return sent, len(messages) - sent
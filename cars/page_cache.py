@@ -0,0 +1,161 @@
+import hashlib
+import re
+from datetime import timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
+
+from .cache import aget_inventory_version, get_inventory_version, versioned_cache_enabled
+from .models import Car
+from .timing import record_cache
+
+# Cached pages are shared between visitors, so the per-visitor CSRF token is
+# swapped for a placeholder on store and re-minted for each hit. The ETag is
+# a hash of that placeholder body; Vary: Cookie keeps browsers and proxies
+# from revalidating one visitor's copy (and token) for another.
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = b"__page_cache_csrf_token__"
+
+
+def _cacheable(request):
+    if not versioned_cache_enabled() or request.method not in ("GET", "HEAD"):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # len() loads pending messages without marking them as used.
+    return not len(get_messages(request))
+
+def _page_digest(request):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    return hashlib.md5(f"{request.path}?{query}".encode()).hexdigest()
+
+def page_cache_key(request):
+    return f"cars:page:v{get_inventory_version()}:{_page_digest(request)}"
+
+def _validated(request, response, etag):
+    response["ETag"] = etag
+    patch_vary_headers(response, ("Cookie",))
+    return get_conditional_response(request, etag=etag, response=response)
+
+def _from_cache(request, cached):
+    content, content_type, etag = cached
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    response = HttpResponse(content, content_type=content_type)
+    response["X-Page-Cache"] = "hit"
+    return _validated(request, response, etag)
+
+async def apage_cache_key(request):
+    return f"cars:page:v{await aget_inventory_version()}:{_page_digest(request)}"
+
+def _store(response):
+    if response.status_code == 200 and not response.streaming and not response.cookies:
+        content = CSRF_INPUT_RE.sub(rb"\1" + CSRF_PLACEHOLDER + rb"\2", response.content)
+        response["X-Page-Cache"] = "miss"
+        return content, response["Content-Type"], quote_etag(hashlib.md5(content).hexdigest())
+    return None
+
+def cache_anonymous_page(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def awrapped(request, *args, **kwargs):
+            # The user and flash messages live in the session, which only the
+            # sync database API can load.
+            if not await sync_to_async(_cacheable)(request):
+                return await view(request, *args, **kwargs)
+
+            key = await apage_cache_key(request)
+            cached = await cache.aget(key)
+            record_cache(cached is not None)
+            if cached is not None:
+                return _from_cache(request, cached)
+
+            response = await view(request, *args, **kwargs)
+            entry = _store(response)
+            if entry is None:
+                return response
+            await cache.aset(key, entry, getattr(settings, "PAGE_CACHE_TIMEOUT", 600))
+            return _validated(request, response, entry[2])
+        return awrapped
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not _cacheable(request):
+            return view(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        record_cache(cached is not None)
+        if cached is not None:
+            return _from_cache(request, cached)
+
+        response = view(request, *args, **kwargs)
+        entry = _store(response)
+        if entry is None:
+            return response
+        cache.set(key, entry, getattr(settings, "PAGE_CACHE_TIMEOUT", 600))
+        return _validated(request, response, entry[2])
+    return wrapped
+
+
+# ---------- CONDITIONAL GET ----------
+# Last-Modified validator for django.views.decorators.http.condition (the
+# ETag comes from the page cache above). None for visitors who would not get
+# the shared page disables the 304 path. Cached under the inventory version
+# like the page itself, so a warm detail page answers (or 304s) without
+# touching the database. "" marks a car that is gone or sold.
+def car_last_modified(request, pk):
+    if not _cacheable(request):
+        return None
+    key = f"cars:lastmod:v{get_inventory_version()}:{pk}"
+    last_modified = cache.get(key)
+    record_cache(last_modified is not None)
+    if last_modified is None:
+        row = (
+            Car.objects.filter(pk=pk, is_available=True)
+            .annotate(last_image=Max("images__uploaded_at"))
+            .values_list("updated_at", "last_image")
+            .first()
+        )
+        last_modified = max(dt for dt in row if dt is not None) if row else ""
+        cache.set(key, last_modified, getattr(settings, "PAGE_CACHE_TIMEOUT", 600))
+    return last_modified or None
+
+
+# Async counterpart of django.views.decorators.http.condition, which calls its
+# validators inline; ours read the session and the database, so they run
+# through sync_to_async.
+def acondition(etag_func=None, last_modified_func=None):
+    def validators(request, *args, **kwargs):
+        last_modified = last_modified_func(request, *args, **kwargs) if last_modified_func else None
+        if last_modified is not None:
+            if not timezone.is_aware(last_modified):
+                last_modified = timezone.make_aware(last_modified, dt_timezone.utc)
+            last_modified = int(last_modified.timestamp())
+        etag = etag_func(request, *args, **kwargs) if etag_func else None
+        return (quote_etag(etag) if etag is not None else None), last_modified
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            etag, last_modified = await sync_to_async(validators)(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ("GET", "HEAD"):
+                if last_modified and not response.has_header("Last-Modified"):
+                    response.headers["Last-Modified"] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+            return response
+        return wrapped
+    return decorator
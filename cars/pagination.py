@@ -0,0 +1,109 @@
+import base64
+import json
+import math
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+# Keyset paginator over one ordering field with pk as tiebreaker. Pages are
+# addressed by opaque tokens, so page N is a seek on (field, pk) instead of an
+# OFFSET scan; count is lazy and may be supplied by a cached callable.
+class CursorPaginator:
+    def __init__(self, queryset, ordering, per_page, count=None):
+        self.queryset = queryset
+        self.descending = ordering.startswith("-")
+        self.field = ordering.lstrip("-")
+        self.model_field = queryset.model._meta.get_field(self.field)
+        self.per_page = per_page
+        self._count = count
+
+    @property
+    def count(self):
+        if callable(self._count):
+            self._count = self._count()
+        if self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def _ordering(self, descending):
+        prefix = "-" if descending else ""
+        return [f"{prefix}{self.field}", f"{prefix}pk"]
+
+    def _after(self, value, pk, descending):
+        op = "lt" if descending else "gt"
+        return Q(**{f"{self.field}__{op}": value}) | Q(**{self.field: value, f"pk__{op}": pk})
+
+    def encode_cursor(self, direction, obj):
+        value = self.model_field.value_to_string(obj)
+        raw = json.dumps([direction, value, obj.pk], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, token):
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            direction, value, pk = json.loads(raw)
+            if direction not in ("n", "p"):
+                return None
+            return direction, self.model_field.to_python(value), int(pk)
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    def get_page(self, token=None):
+        cursor = self.decode_cursor(token) if token else None
+        limit = self.per_page + 1
+
+        if cursor is None:
+            rows = list(self.queryset.order_by(*self._ordering(self.descending))[:limit])
+            has_next, has_previous = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        elif cursor[0] == "n":
+            _, value, pk = cursor
+            qs = self.queryset.filter(self._after(value, pk, self.descending))
+            rows = list(qs.order_by(*self._ordering(self.descending))[:limit])
+            has_next, has_previous = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        else:
+            _, value, pk = cursor
+            qs = self.queryset.filter(self._after(value, pk, not self.descending))
+            rows = list(qs.order_by(*self._ordering(not self.descending))[:limit])
+            has_next, has_previous = True, len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+
+        if not rows:
+            return CursorPage(rows, self)
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor("n", rows[-1]) if has_next else None,
+            previous_cursor=self.encode_cursor("p", rows[0]) if has_previous else None,
+        )
@@ -0,0 +1,109 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import INVENTORY_CHANGED_KEY, versioned_cache_enabled
+
+# Set on responses to requests that routed a write (model validation asks for
+# the write database too); while present the visitor reads from the primary,
+# so they see their own booking or edit.
+PRIMARY_PIN_COOKIE = "primary_pin"
+
+_current = ContextVar("replica_routing", default=None)
+
+
+class RoutingState:
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+def replica_aliases():
+    return getattr(settings, "REPLICA_DATABASES", [])
+
+
+# ---------- ROUTER ----------
+# Reads go to the replica chosen by ReplicaMiddleware for the current request,
+# everything else to "default". Outside a routed request (commands, the
+# derivative threads, tests) nothing changes.
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        return state.replica if state is not None else None
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema through replication.
+        return False if db in replica_aliases() else None
+
+
+# ---------- MIDDLEWARE ----------
+# Picks a replica for anonymous GET/HEAD requests outside /owner/. Visitors
+# with a session cookie (owners), a primary pin, or any request made within
+# REPLICA_LAG_SECONDS of an inventory change stay on the primary: pages built
+# from a lagging replica would otherwise be cached under the new version.
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # The lag guard below is a cache flag; if other processes cannot see
+        # it, every read stays on the primary.
+        self.aliases = replica_aliases() if versioned_cache_enabled() else []
+        self.sticky = getattr(settings, "REPLICA_STICKY_SECONDS", 15)
+
+    def _eligible(self, request):
+        return (
+            self.aliases
+            and request.method in ("GET", "HEAD")
+            and not request.path_info.startswith("/owner/")
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and PRIMARY_PIN_COOKIE not in request.COOKIES
+        )
+
+    def _finish(self, response, state):
+        if state.wrote and self.aliases:
+            response.set_cookie(PRIMARY_PIN_COOKIE, "1", max_age=self.sticky, httponly=True, samesite="Lax")
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState()
+        if self._eligible(request) and cache.get(INVENTORY_CHANGED_KEY) is None:
+            state.replica = random.choice(self.aliases)
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        if self._eligible(request) and await cache.aget(INVENTORY_CHANGED_KEY) is None:
+            state.replica = random.choice(self.aliases)
+        # sync_to_async copies the context, so queries in its threads see the
+        # same state object.
+        token = _current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(response, state)
@@ -0,0 +1,123 @@
+import re
+
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SQLITE_TABLE = "cars_car_fts"
+POSTGRES_TABLE = "cars_car_search"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_backends = {}
+
+
+# ---------- BACKEND ----------
+# "postgresql", "sqlite" or None when the database has no search index installed.
+def search_backend(using="default"):
+    if using not in _backends:
+        connection = connections[using]
+        table = {"postgresql": POSTGRES_TABLE, "sqlite": SQLITE_TABLE}.get(connection.vendor)
+        try:
+            installed = table is not None and table in connection.introspection.table_names()
+        except DatabaseError:
+            installed = False
+        _backends[using] = connection.vendor if installed else None
+    return _backends[using]
+
+def reset_search_backend():
+    _backends.clear()
+
+def _tokens(q):
+    return _TOKEN_RE.findall(q.lower())[:8]
+
+
+# ---------- INDEXING ----------
+def index_car(car, using="default"):
+    backend = search_backend(using)
+    if backend is None:
+        return
+    with connections[using].cursor() as cursor:
+        if backend == "postgresql":
+            cursor.execute(
+                f"""
+                INSERT INTO {POSTGRES_TABLE} (car_id, document, body)
+                VALUES (
+                    %s,
+                    setweight(to_tsvector('simple', %s), 'A')
+                    || setweight(to_tsvector('simple', %s), 'B')
+                    || setweight(to_tsvector('simple', %s), 'C'),
+                    %s
+                )
+                ON CONFLICT (car_id) DO UPDATE
+                SET document = EXCLUDED.document, body = EXCLUDED.body
+                """,
+                [
+                    car.pk,
+                    f"{car.brand} {car.model}",
+                    car.location,
+                    car.description,
+                    f"{car.brand} {car.model} {car.location}".lower(),
+                ],
+            )
+        else:
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [car.pk])
+            cursor.execute(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, brand, model, location, description) "
+                f"VALUES (%s, %s, %s, %s, %s)",
+                [car.pk, car.brand, car.model, car.location, car.description],
+            )
+
+def remove_car(car_id, using="default"):
+    backend = search_backend(using)
+    if backend is None:
+        return
+    table = POSTGRES_TABLE if backend == "postgresql" else SQLITE_TABLE
+    column = "car_id" if backend == "postgresql" else "rowid"
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {column} = %s", [car_id])
+
+def rebuild_index(queryset, using="default", batch_size=500):
+    count = 0
+    for car in queryset.only("id", "brand", "model", "location", "description").iterator(chunk_size=batch_size):
+        index_car(car, using=using)
+        count += 1
+    return count
+
+
+# ---------- QUERYING ----------
+# Returns (queryset, ranked); ranked querysets carry a search_rank annotation
+# (higher is more relevant). Falls back to icontains when no index is available.
+def search_cars(queryset, q):
+    tokens = _tokens(q)
+    backend = search_backend(queryset.db)
+    if backend is None or not tokens:
+        return queryset.filter(
+            Q(brand__icontains=q) |
+            Q(model__icontains=q) |
+            Q(location__icontains=q) |
+            Q(description__icontains=q)
+        ), False
+
+    table = queryset.model._meta.db_table
+    if backend == "postgresql":
+        tsquery = " & ".join(f"{token}:*" for token in tokens)
+        text = " ".join(tokens)
+        matches = RawSQL(
+            f"SELECT car_id FROM {POSTGRES_TABLE} "
+            f"WHERE document @@ to_tsquery('simple', %s) OR %s <%% body",
+            (tsquery, text),
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('simple', %s)) + word_similarity(%s, body) "
+            f"FROM {POSTGRES_TABLE} WHERE car_id = {table}.id",
+            (tsquery, text),
+        )
+    else:
+        match = " ".join(f'"{token}"*' for token in tokens)
+        matches = RawSQL(f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s", (match,))
+        rank = RawSQL(
+            f"SELECT -bm25({SQLITE_TABLE}, 10.0, 8.0, 3.0, 1.0) FROM {SQLITE_TABLE} "
+            f"WHERE {SQLITE_TABLE} MATCH %s AND rowid = {table}.id",
+            (match,),
+        )
+    return queryset.filter(id__in=matches).annotate(search_rank=rank), True
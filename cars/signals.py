@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .archive import is_archiving
+from .cache import bump_inventory_version
+from .models import ArchivedCar, ArchivedCarImage, Car, CarImage
+from .search import index_car, remove_car
+from .sqlite import configure_connection
+from .stats import apply_change, car_state
+from .storage import acquire, release
+from .uploads import schedule_derivatives
+
+SEARCH_FIELDS = {"brand", "model", "location", "description"}
+
+
+# Sold / re-listed toggles in car_mark_sold and car_mark_available go through
+# Car.save(update_fields=...), so post_save covers them as well as edits.
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def invalidate_inventory_on_change(sender, instance, **kwargs):
+    # archive_sold_cars bumps once per run instead of once per row.
+    if not is_archiving():
+        transaction.on_commit(bump_inventory_version)
+
+
+@receiver(post_save, sender=Car)
+def index_car_on_save(sender, instance, raw=False, using="default", update_fields=None, **kwargs):
+    if raw or (update_fields and not set(update_fields) & SEARCH_FIELDS):
+        return
+    index_car(instance, using=using)
+
+@receiver(post_delete, sender=Car)
+def unindex_car_on_delete(sender, instance, using="default", **kwargs):
+    remove_car(instance.pk, using=using)
+
+
+@receiver(post_save, sender=CarImage)
+def generate_derivatives_on_upload(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw and instance.image:
+        transaction.on_commit(lambda: schedule_derivatives([instance.pk]))
+
+
+# Owner stats move by the difference between the stored and the saved state.
+# Car.save() wraps these receivers in its transaction, and deletes run inside
+# the collector's, so the stats row commits or rolls back with the car.
+@receiver(pre_save, sender=Car)
+def load_stats_state(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or getattr(instance, "_loaded_stats", None) is not None:
+        return
+    # Deferred or hand-built instance: read what is actually stored.
+    row = Car.objects.filter(pk=instance.pk).values_list(*Car.STATS_FIELDS).first()
+    instance._loaded_stats = row
+
+@receiver(post_save, sender=Car)
+def update_owner_stats_on_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, "_loaded_stats", None)
+    new = car_state(instance)
+    if update_fields and old is not None:
+        # Fields left out of update_fields still hold their stored values.
+        new = tuple(
+            value if field in update_fields or field.removesuffix("_id") in update_fields else stored
+            for field, value, stored in zip(Car.STATS_FIELDS, new, old)
+        )
+    apply_change(old, new)
+    instance._loaded_stats = new
+
+@receiver(post_delete, sender=Car)
+def update_owner_stats_on_delete(sender, instance, **kwargs):
+    if is_archiving():
+        return
+    old = getattr(instance, "_loaded_stats", None) or car_state(instance)
+    apply_change(old, None, create=False)
+
+# Archived sales stay in the stats until the archived row itself goes.
+@receiver(post_delete, sender=ArchivedCar)
+def update_owner_stats_on_archive_delete(sender, instance, **kwargs):
+    apply_change(car_state(instance), None, create=False)
+
+
+# Content-addressed images are shared between CarImage (and archived image)
+# rows; the file goes once the last row pointing at it is deleted.
+@receiver(post_save, sender=CarImage)
+def acquire_image_file(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        acquire(instance.image)
+
+@receiver(post_delete, sender=CarImage)
+@receiver(post_delete, sender=ArchivedCarImage)
+def release_image_file(sender, instance, **kwargs):
+    if sender is CarImage and is_archiving():
+        return
+    release(instance.image)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    configure_connection(connection)
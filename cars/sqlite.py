@@ -0,0 +1,51 @@
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Process-wide; the first tuned connection runs the light "optimize on open"
+# variant, later ones a full PRAGMA optimize once per SQLITE_OPTIMIZE_INTERVAL.
+_last_optimize = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def pragmas():
+    return [
+        # Readers keep reading while a booking commits; commits only fsync
+        # at checkpoints, which is safe in WAL mode.
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={int(_setting('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA mmap_size={int(_setting('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+        f"PRAGMA cache_size={int(_setting('SQLITE_CACHE_SIZE', -65536))}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+def _optimize(raw):
+    global _last_optimize
+    now = time.monotonic()
+    if _last_optimize is None:
+        raw.execute("PRAGMA optimize=0x10002")
+    elif now - _last_optimize >= _setting("SQLITE_OPTIMIZE_INTERVAL", 3600):
+        raw.execute("PRAGMA optimize")
+    else:
+        return
+    _last_optimize = now
+
+# connection_created receiver (see cars.signals). Runs on the raw DB-API
+# connection so the pragmas stay out of query logs and budgets.
+def configure_connection(connection):
+    if connection.vendor != "sqlite" or not _setting("SQLITE_PERFORMANCE", False):
+        return
+    raw = connection.connection
+    for pragma in pragmas():
+        raw.execute(pragma)
+    try:
+        _optimize(raw)
+    except Exception:
+        # A busy database can refuse ANALYZE; the next interval retries.
+        logger.warning("PRAGMA optimize failed", exc_info=True)
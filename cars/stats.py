@@ -0,0 +1,208 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import ArchivedCar, Car, OwnerMonthlySales, OwnerStats
+
+STATS_COLUMNS = ("total_cars", "available_count", "available_value", "sold_count", "sold_revenue")
+
+
+def sales_month(sold_at):
+    # Same bucketing as sold_at__month / TruncMonth in the current timezone.
+    return timezone.localtime(sold_at).date().replace(day=1)
+
+def car_state(car):
+    return tuple(getattr(car, f) for f in Car.STATS_FIELDS)
+
+
+# ---------- INCREMENTAL ----------
+def _contribution(state, sign):
+    owner_id, is_available, price, sold_at = state
+    price = Decimal(str(price or 0)) * sign
+    totals = {
+        "total_cars": sign,
+        "available_count": sign if is_available else 0,
+        "available_value": price if is_available else 0,
+        "sold_count": sign if sold_at else 0,
+        "sold_revenue": price if sold_at else 0,
+    }
+    month = sales_month(sold_at) if sold_at else None
+    return owner_id, totals, month, price
+
+def _bump(queryset, deltas):
+    return queryset.update(**{k: F(k) + v for k, v in deltas.items()})
+
+def _apply_month(owner_id, month, count, revenue):
+    lookup = {"owner_id": owner_id, "month": month}
+    if _bump(OwnerMonthlySales.objects.filter(**lookup), {"sold_count": count, "revenue": revenue}):
+        return
+    try:
+        with transaction.atomic():
+            OwnerMonthlySales.objects.create(**lookup, sold_count=count, revenue=revenue)
+    except IntegrityError:
+        # A concurrent sale created the bucket first.
+        _bump(OwnerMonthlySales.objects.filter(**lookup), {"sold_count": count, "revenue": revenue})
+
+# Applies the difference between two car states (either may be None for a
+# create/delete) as F() increments, inside the caller's transaction. An owner
+# without a stats row yet is rebuilt from scratch instead, which also covers
+# data that predates the table. With create=False (deletes) missing rows are
+# left alone so a cascading user delete never re-creates them.
+def apply_change(old, new, create=True):
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    months = defaultdict(lambda: [0, Decimal(0)])
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None or state[0] is None:
+            continue
+        owner_id, contribution, month, price = _contribution(state, sign)
+        for key, value in contribution.items():
+            totals[owner_id][key] += value
+        if month is not None:
+            months[owner_id, month][0] += sign
+            months[owner_id, month][1] += price
+
+    for owner_id, deltas in totals.items():
+        deltas = {k: v for k, v in deltas.items() if v}
+        owner_months = {m: v for (o, m), v in months.items() if o == owner_id and any(v)}
+        if not deltas and not owner_months:
+            continue
+        if deltas and not _bump(OwnerStats.objects.filter(owner_id=owner_id), deltas):
+            if not create or rebuild_owner(owner_id):
+                continue
+            # A concurrent rebuild wrote the row first without seeing this
+            # transaction's change, so apply it as a delta after all.
+            _bump(OwnerStats.objects.filter(owner_id=owner_id), deltas)
+        for month, (count, revenue) in owner_months.items():
+            _apply_month(owner_id, month, count, revenue)
+
+
+# ---------- REBUILD ----------
+def _aggregate_table(cars):
+    stats = {
+        row.pop("owner"): row
+        for row in cars.values("owner").order_by().annotate(
+            total_cars=Count("id"),
+            available_count=Count("id", filter=Q(is_available=True)),
+            available_value=Sum("price", filter=Q(is_available=True), default=0),
+            sold_count=Count("id", filter=Q(sold_at__isnull=False)),
+            sold_revenue=Sum("price", filter=Q(sold_at__isnull=False), default=0),
+        )
+    }
+    monthly = {
+        (row["owner"], row["month"]): (row["sold_count"], row["revenue"])
+        for row in cars.filter(sold_at__isnull=False)
+        .annotate(month=TruncMonth("sold_at", output_field=DateField()))
+        .values("owner", "month").order_by()
+        .annotate(sold_count=Count("id"), revenue=Sum("price"))
+    }
+    return stats, monthly
+
+# Stats cover live and archived cars alike (archiving does not change them),
+# so both tables are aggregated and summed.
+def _aggregate(owner_filter):
+    live_stats, monthly = _aggregate_table(Car.objects.filter(**owner_filter))
+    archived_stats, archived_monthly = _aggregate_table(ArchivedCar.objects.filter(**owner_filter))
+    stats = live_stats
+    for owner_id, row in archived_stats.items():
+        if owner_id in stats:
+            stats[owner_id] = {k: stats[owner_id][k] + v for k, v in row.items()}
+        else:
+            stats[owner_id] = row
+    for key, (count, revenue) in archived_monthly.items():
+        live_count, live_revenue = monthly.get(key, (0, 0))
+        monthly[key] = (live_count + count, live_revenue + revenue)
+    return stats, monthly
+
+def _write(owner_ids, stats, monthly):
+    OwnerMonthlySales.objects.filter(owner_id__in=owner_ids).delete()
+    OwnerStats.objects.filter(owner_id__in=owner_ids).delete()
+    OwnerStats.objects.bulk_create(
+        OwnerStats(owner_id=owner_id, **stats.get(owner_id, {})) for owner_id in owner_ids
+    )
+    OwnerMonthlySales.objects.bulk_create(
+        OwnerMonthlySales(owner_id=owner_id, month=month, sold_count=count, revenue=revenue)
+        for (owner_id, month), (count, revenue) in monthly.items()
+    )
+
+# Returns False when a concurrent rebuild (two first dashboard loads, say)
+# inserted the owner's row first; that row stands.
+def rebuild_owner(owner_id):
+    stats, monthly = _aggregate({"owner_id": owner_id})
+    try:
+        with transaction.atomic():
+            _write([owner_id], stats, monthly)
+    except IntegrityError:
+        return False
+    return True
+
+# Returns {owner_id: [column, ...]} for owners whose stored stats differ from
+# a fresh aggregate; with fix=True the drifted owners are rewritten.
+def check_stats(fix=False):
+    stats, monthly = _aggregate({})
+    owner_ids = set(stats) | set(OwnerStats.objects.values_list("owner_id", flat=True))
+    stored = {row.pop("owner_id"): row for row in OwnerStats.objects.values("owner_id", *STATS_COLUMNS)}
+    stored_months = {
+        (row["owner_id"], row["month"]): (row["sold_count"], row["revenue"])
+        for row in OwnerMonthlySales.objects.exclude(sold_count=0).values("owner_id", "month", "sold_count", "revenue")
+    }
+    drift = {}
+    for owner_id in owner_ids:
+        expected = {k: stats.get(owner_id, {}).get(k, 0) for k in STATS_COLUMNS}
+        actual = stored.get(owner_id)
+        columns = [k for k in STATS_COLUMNS if actual is None or actual[k] != expected[k]]
+        expected_months = {m: v for (o, m), v in monthly.items() if o == owner_id}
+        actual_months = {m: v for (o, m), v in stored_months.items() if o == owner_id}
+        if expected_months != actual_months:
+            columns.append("monthly_sales")
+        if columns:
+            drift[owner_id] = columns
+
+    if fix and drift:
+        with transaction.atomic():
+            _write(list(drift), stats, {k: v for k, v in monthly.items() if k[0] in drift})
+    return drift
+
+
+# ---------- READ ----------
+# The whole dashboard summary is one primary-key read on OwnerStats.
+def owner_analytics(user):
+    month = sales_month(timezone.now())
+    this_month = OwnerMonthlySales.objects.filter(owner=OuterRef("owner"), month=month).values("sold_count")
+    row = (
+        OwnerStats.objects.filter(owner=user)
+        .annotate(sold_this_month=Subquery(this_month))
+        .values(*STATS_COLUMNS, "sold_this_month")
+        .first()
+    )
+    if row is None:
+        rebuild_owner(user.pk)
+        return owner_analytics(user)
+    row["sold_this_month"] = row["sold_this_month"] or 0
+    return row
+
+def _month_range(end, months):
+    year, month = end.year, end.month
+    out = []
+    for _ in range(months):
+        out.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return out[::-1]
+
+# Monthly sales for the last `months` months, oldest first, with empty months
+# filled in so the series can be charted directly.
+def monthly_sales(user, months=12):
+    series = _month_range(sales_month(timezone.now()), months)
+    rows = {
+        row["month"]: row
+        for row in OwnerMonthlySales.objects.filter(owner=user, month__gte=series[0])
+        .values("month", "sold_count", "revenue")
+    }
+    return [
+        rows.get(month, {"month": month, "sold_count": 0, "revenue": Decimal(0)})
+        for month in series
+    ]
@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .images import derivative_source, is_derivative
+
+logger = logging.getLogger(__name__)
+
+# cars/3f/3fa9…e1.jpg: directory from upload_to, a two-character shard, then
+# the SHA-256 of the bytes. Derivatives keep the hashed name as their prefix.
+HASHED_NAME_RE = re.compile(r"(?:^|/)([0-9a-f]{2})/\1[0-9a-f]{62}\.[a-z0-9]+$")
+EXTENSION_ALIASES = {".jpeg": ".jpg"}
+# Half-written uploads sit next to their final name until renamed into place.
+TEMP_PREFIX = ".upload-"
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+def hashed_name(name, digest):
+    ext = os.path.splitext(name)[1].lower()
+    ext = EXTENSION_ALIASES.get(ext, ext)
+    return posixpath.join(posixpath.dirname(name), digest[:2], f"{digest}{ext}")
+
+def is_content_addressed(name):
+    return bool(HASHED_NAME_RE.search(derivative_source(name)))
+
+
+# Stores each upload once under its content hash. Saving bytes that are
+# already present returns the existing name instead of writing a renamed
+# copy, so re-uploads cost no disk. Derivatives are named after their hashed
+# original and are therefore content-addressed as well.
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # An existing file under a content-addressed name holds the same bytes.
+        return name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        if not is_derivative(name):
+            # ImageUploadHandler hashes uploads while they stream in.
+            digest = getattr(content, "sha256", None) or file_digest(content)
+            name = hashed_name(self.generate_filename(name), digest)
+        if self.exists(name):
+            # Refresh the mtime so gc_media's age threshold protects a file
+            # that is about to gain a reference again.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def _save(self, name, content):
+        # Write to a temp file and rename it into place, so concurrent uploads
+        # of the same bytes never expose a half-written file.
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+        try:
+            if hasattr(content, "temporary_file_path"):
+                # Streamed uploads are renamed into place rather than copied.
+                os.close(fd)
+                file_move_safe(content.temporary_file_path(), tmp_path, allow_overwrite=True)
+            else:
+                with os.fdopen(fd, "wb") as fh:
+                    for chunk in content.chunks():
+                        fh.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
+
+
+def car_image_storage():
+    return storages["car_images"]
+
+
+# ---------- REFERENCE COUNTS ----------
+def _tracked(fieldfile):
+    return bool(fieldfile) and isinstance(fieldfile.storage, ContentAddressedStorage) and is_content_addressed(fieldfile.name)
+
+def acquire(fieldfile):
+    from .models import MediaBlob
+
+    if not _tracked(fieldfile):
+        return
+    name = fieldfile.name
+    if MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + 1):
+        return
+    try:
+        size = fieldfile.storage.size(name)
+    except OSError:
+        # The last reference was collected between the upload and this row.
+        logger.error("Content-addressed file %s is missing; re-upload the image.", name)
+        size = 0
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, size=size, refcount=1)
+    except IntegrityError:
+        MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + 1)
+
+# Bulk form of acquire() for importers: counts maps name -> new references.
+def acquire_many(storage, counts):
+    from .models import MediaBlob
+
+    counts = {name: n for name, n in counts.items() if is_content_addressed(name)}
+    existing = set(MediaBlob.objects.filter(name__in=counts).values_list("name", flat=True))
+    for name in existing:
+        MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + counts[name])
+    MediaBlob.objects.bulk_create(
+        MediaBlob(name=name, size=storage.size(name), refcount=n)
+        for name, n in counts.items() if name not in existing
+    )
+
+def release(fieldfile):
+    from .models import MediaBlob
+
+    if not _tracked(fieldfile):
+        return
+    storage, name = fieldfile.storage, fieldfile.name
+    if MediaBlob.objects.filter(name=name).update(refcount=F("refcount") - 1):
+        transaction.on_commit(lambda: collect(storage, name))
+
+def delete_with_derivatives(storage, name):
+    directory, basename = posixpath.split(name)
+    _, files = storage.listdir(directory)
+    for filename in files:
+        if filename == basename or (filename.startswith(f"{basename}.") and is_derivative(filename)):
+            storage.delete(posixpath.join(directory, filename))
+
+# Deletes a blob (and its derivatives) once nothing references it. The row is
+# locked while the files go, so a concurrent acquire() waits and then sees it
+# gone.
+def collect(storage, name):
+    from .models import MediaBlob
+
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name, refcount__lte=0).first()
+        if blob is None:
+            return False
+        blob.delete()
+        delete_with_derivatives(storage, name)
+    return True
@@ -0,0 +1,52 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+SIZES = {
+    "thumb": "92px",
+    "card": "(min-width: 992px) 416px, (min-width: 768px) 50vw, 100vw",
+    "detail": "(min-width: 992px) 58vw, 100vw",
+    "hero": "100vw",
+}
+
+
+def _srcset(storage, variants, fmt):
+    widths = {}
+    for entry in variants.values():
+        if fmt in entry:
+            widths.setdefault(entry["width"], storage.url(entry[fmt]))
+    return ", ".join(f"{url} {width}w" for width, url in sorted(widths.items()))
+
+
+# {% car_picture image "card" class="car-card-img" alt="car" %} renders a
+# <picture> with AVIF/WebP sources and a JPEG <img> fallback; images without
+# derivatives yet fall back to the original upload.
+@register.simple_tag
+def car_picture(car_image, variant="card", sizes=None, **attrs):
+    if not car_image or not car_image.image:
+        return ""
+    attrs.setdefault("loading", "lazy")
+    extra = format_html_join("", ' {}="{}"', sorted(attrs.items()))
+    variants = car_image.variants or {}
+    entry = variants.get(variant)
+    if not entry or "jpeg" not in entry:
+        return format_html('<img src="{}"{}>', car_image.image.url, extra)
+
+    storage = car_image.image.storage
+    sizes = sizes or SIZES.get(variant, "100vw")
+    sources = format_html_join(
+        "",
+        '<source type="image/{}" srcset="{}" sizes="{}">',
+        ((fmt, _srcset(storage, variants, fmt), sizes) for fmt in ("avif", "webp") if fmt in entry),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{} decoding="async"></picture>',
+        sources,
+        storage.url(entry["jpeg"]),
+        _srcset(storage, variants, "jpeg"),
+        sizes,
+        entry["width"],
+        entry["height"],
+        extra,
+    )
@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# Fails when the block runs more than `budget` queries, listing every query
+# so the N+1 culprit is visible straight from the CI log.
+@contextmanager
+def query_budget(budget, using="default"):
+    with CaptureQueriesContext(connections[using]) as ctx:
+        yield ctx
+    executed = len(ctx.captured_queries)
+    if executed > budget:
+        lines = "\n".join(f"{i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, start=1))
+        raise QueryBudgetExceeded(f"{executed} queries executed, budget is {budget}:\n{lines}")
+
+
+class QueryBudgetMixin:
+    def assertQueryBudget(self, budget, using="default"):
+        return query_budget(budget, using=using)
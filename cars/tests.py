@@ -1,3 +1,1582 @@
-from django.test import TestCase
+import base64
+import csv
+import importlib
+import io
+import os
+import re
+import shutil
+import smtplib
+import subprocess
+import sys
+import tempfile
+import time as clock
+import zipfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import SkipFile, StopFutureHandlers
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, router
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches
+from django.utils import timezone
+from PIL import Image
+
+from . import archive, benchmark, uploads
+from .archive import archive_sold_cars
+from .cache import bump_inventory_version, get_inventory_facets, get_inventory_version
+from .exports import _cell
+from .importer import import_inventory
+from .page_cache import CSRF_PLACEHOLDER
+from .mail import MailDelivery, mailer
+from .media import StaticFilesMiddleware
+from .media_gc import collect_orphans, referenced_names
+from .models import ArchivedCar, Booking, Car, CarImage, MediaBlob, OutboxMessage, OwnerMonthlySales, OwnerStats
+from .notifications import claim_due, deliver_due, retry_delay
+from .pagination import CursorPaginator
+from .replicas import PRIMARY_PIN_COOKIE, ReplicaMiddleware
+from .search import SQLITE_TABLE, reset_search_backend, search_backend, search_cars
+from .stats import check_stats, monthly_sales, owner_analytics, rebuild_owner
+from .storage import car_image_storage, is_content_addressed
+from .testing import QueryBudgetMixin
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix="automac-tests-")
+
+
+def _jpeg(name="car.jpg", color=(200, 30, 30)):
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 24), color).save(buf, "JPEG")
+    return SimpleUploadedFile(name, buf.getvalue(), content_type="image/jpeg")
+
+
+def make_car(owner, **kwargs):
+    data = {
+        "brand": "Toyota", "model": "Vios", "year": 2018, "price": 550000,
+        "location": "Lucena City, Quezon", "description": "Clean unit",
+    }
+    data.update(kwargs)
+    return Car.objects.create(owner=owner, **data)
+
+
+def make_listing(owner, count, images_per_car=2):
+    cars = []
+    for i in range(count):
+        car = make_car(owner, year=2010 + i % 10, price=300000 + i * 1000)
+        for _ in range(images_per_car):
+            img = CarImage.objects.create(car=car, image=_jpeg())
+            if car.main_image_id is None:
+                car.main_image = img
+                car.save(update_fields=["main_image"])
+        cars.append(car)
+    return cars
+
+
+# Evaluates `expr` against config.settings loaded fresh in a subprocess, with
+# the cache and server variables taken from `env` only.
+def settings_value(expr, **env):
+    unset = {"CACHE_URL", "CACHE_BACKEND", "VERSIONED_CACHE", "SERVER_MODE", "GUNICORN_WORKERS",
+             "SQLITE_PERFORMANCE", "DATABASE_URL", "DB_CONN_MAX_AGE", "DB_POOL", "DB_POOL_MAX_SIZE"}
+    base = {k: v for k, v in os.environ.items() if k not in unset}
+    code = f"import django; django.setup(); from django.conf import settings; print({expr})"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**base, "DJANGO_SETTINGS_MODULE": "config.settings", **env},
+        capture_output=True, text=True, check=True,
+    )
+    return result.stdout.strip()
+
+
+# Mail backend for the outbox and mailer tests: counts opens and closes,
+# records sends, and raises the queued exceptions on the next sends (or
+# refuse on every open).
+class FakeEmailBackend(BaseEmailBackend):
+    opened = closed = 0
+    sent = []
+    fail_with = []
+    refuse = None
+
+    @classmethod
+    def reset(cls):
+        cls.opened = cls.closed = 0
+        cls.sent = []
+        cls.fail_with = []
+        cls.refuse = None
+
+    def open(self):
+        FakeEmailBackend.opened += 1
+        if FakeEmailBackend.refuse is not None:
+            raise FakeEmailBackend.refuse
+        return True
+
+    def close(self):
+        FakeEmailBackend.closed += 1
+
+    def send_messages(self, messages):
+        if FakeEmailBackend.fail_with:
+            raise FakeEmailBackend.fail_with.pop(0)
+        FakeEmailBackend.sent.extend(messages)
+        return len(messages)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_DERIVATIVE_WORKERS=0)
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+
+    def login(self):
+        self.client.force_login(self.owner)
+
+    def assertFlatBudget(self, budget, url, small=2, large=8, **create):
+        # The same page must cost the same number of queries at two listing sizes.
+        make_listing(self.owner, small, **create)
+        cache.clear()
+        with self.assertQueryBudget(budget):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        make_listing(self.owner, large - small, **create)
+        cache.clear()
+        with self.assertQueryBudget(budget):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class PublicViewQueryTests(QueryBudgetTestCase):
+    def test_home(self):
+        self.assertFlatBudget(1, "/")
+
+    def test_inventory(self):
+        # count + page + facets (cold cache)
+        self.assertFlatBudget(3, "/inventory/")
+
+    def test_inventory_filtered_and_sorted(self):
+        self.assertFlatBudget(3, "/inventory/?brand=Toyota&trans=Automatic&min_price=100,000&sort=price_desc")
+
+    def test_inventory_search(self):
+        self.assertFlatBudget(3, "/inventory/?q=toyota&sort=relevance")
+
+    @override_settings(INVENTORY_PAGINATION="cursor")
+    def test_inventory_cursor(self):
+        # count + page + facets (cold cache)
+        self.assertFlatBudget(3, "/inventory/?sort=year_desc")
+
+    def test_inventory_warm_cache(self):
+        make_listing(self.owner, 4)
+        self.client.get("/inventory/")
+        self.client.logout()
+        with self.assertQueryBudget(0):
+            self.client.get("/inventory/")
+
+    def test_car_detail(self):
+        car = make_listing(self.owner, 1, images_per_car=6)[0]
+        cache.clear()
+        # Last-Modified validator + car + images
+        with self.assertQueryBudget(3):
+            response = self.client.get(f"/cars/{car.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["images"]), 6)
+
+    def test_car_detail_warm_cache(self):
+        car = make_car(self.owner)
+        self.client.get(f"/cars/{car.id}/")
+        with self.assertQueryBudget(0):
+            response = self.client.get(f"/cars/{car.id}/")
+        self.assertEqual(response["X-Page-Cache"], "hit")
+
+    def test_car_detail_if_modified_since(self):
+        car = make_car(self.owner)
+        response = self.client.get(f"/cars/{car.id}/")
+        with self.assertQueryBudget(0):
+            not_modified = self.client.get(
+                f"/cars/{car.id}/", headers={"if-modified-since": response["Last-Modified"]},
+            )
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Car.objects.filter(pk=car.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+            car.images.create(image=_jpeg("late.jpg"))
+        modified = self.client.get(f"/cars/{car.id}/", headers={"if-modified-since": response["Last-Modified"]})
+        self.assertEqual(modified.status_code, 200)
+
+    def test_if_none_match(self):
+        car = make_car(self.owner)
+        for path in ("/inventory/?sort=price_asc", f"/cars/{car.id}/"):
+            response = self.client.get(path)
+            with self.assertQueryBudget(0):
+                not_modified = self.client.get(path, headers={"if-none-match": response["ETag"]})
+            self.assertEqual(not_modified.status_code, 304)
+
+        # The ETag covers the page with the CSRF placeholder: the same for
+        # every visitor, but the page varies on their cookie.
+        first, second = Client().get(f"/cars/{car.id}/"), Client().get(f"/cars/{car.id}/")
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertNotEqual(first.content, second.content)
+        self.assertIn("Cookie", first["Vary"])
+        self.assertIn("Cookie", second["Vary"])
+
+        stale = first["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            car.price += 1000
+            car.save()
+        self.assertEqual(self.client.get(f"/cars/{car.id}/", headers={"if-none-match": stale}).status_code, 200)
+
+    def test_book_test_drive(self):
+        car = make_car(self.owner)
+        data = {
+            "full_name": "Juan", "phone": "0917", "email": "juan@example.com",
+            "preferred_date": "2030-01-01", "preferred_time": "10:00",
+        }
+        with self.assertQueryBudget(6):
+            response = self.client.post(f"/cars/{car.id}/book/", data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(car.bookings.count(), 1)
+        self.assertEqual(car.bookings.get().notifications.count(), 2)
+
+    def test_login_page(self):
+        with self.assertQueryBudget(0):
+            self.assertEqual(self.client.get("/login/").status_code, 200)
+
+    def test_logout(self):
+        self.login()
+        with self.assertQueryBudget(4):
+            self.assertEqual(self.client.get("/logout/").status_code, 302)
+
+
+class PageCacheTests(QueryBudgetTestCase):
+    BOOKING = {
+        "full_name": "Juan", "phone": "0917", "email": "juan@example.com",
+        "preferred_date": "2030-01-01", "preferred_time": "10:00",
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.car = make_car(self.owner)
+        self.url = f"/cars/{self.car.id}/"
+
+    def csrf_token(self, response):
+        return re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', response.content).group(1).decode()
+
+    def test_authenticated_pages_are_neither_served_nor_stored(self):
+        self.login()
+        response = self.client.get(self.url)
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertContains(response, "Logout")
+
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "miss")
+        self.login()
+        self.assertNotIn("X-Page-Cache", self.client.get(self.url))
+
+    def test_pending_messages_bypass_the_cache(self):
+        self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "miss")
+        self.client.post(f"{self.url}book/", self.BOOKING)
+
+        response = self.client.get(self.url)
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertContains(response, "Booking submitted successfully")
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotContains(response, "Booking submitted successfully")
+
+    @override_settings(VERSIONED_CACHE=False)
+    def test_unshared_cache_renders_every_request(self):
+        for _ in range(2):
+            response = self.client.get(self.url, headers={"if-none-match": "*"})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("X-Page-Cache", response)
+            self.assertNotIn("ETag", response)
+            self.assertNotIn("Last-Modified", response)
+
+    def test_versioned_cache_default(self):
+        # The settings decide from the environment gunicorn.conf.py leaves for its workers.
+        def setting(**env):
+            return settings_value("settings.VERSIONED_CACHE", **env)
+
+        self.assertEqual(setting(GUNICORN_WORKERS="1"), "True")
+        self.assertEqual(setting(GUNICORN_WORKERS="4"), "False")
+        self.assertEqual(setting(GUNICORN_WORKERS="4", CACHE_URL="redis://cache:6379/0"), "True")
+
+    def test_csrf_token_is_reminted_for_each_hit(self):
+        self.client.get(self.url)
+        first, second = Client(enforce_csrf_checks=True), Client(enforce_csrf_checks=True)
+        tokens = []
+        for visitor in (first, second):
+            response = visitor.get(self.url)
+            self.assertEqual(response["X-Page-Cache"], "hit")
+            self.assertNotIn(CSRF_PLACEHOLDER, response.content)
+            tokens.append(self.csrf_token(response))
+
+        self.assertNotEqual(first.cookies["csrftoken"].value, second.cookies["csrftoken"].value)
+        booking = {**self.BOOKING, "csrfmiddlewaretoken": tokens[1]}
+        self.assertEqual(first.post(f"{self.url}book/", booking).status_code, 403)
+        self.assertEqual(second.post(f"{self.url}book/", booking).status_code, 302)
+
+
+class CursorPaginationTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        # Seven cars share each price, so most page boundaries fall inside a tie.
+        self.cars = [make_car(self.owner, price=500000 + (i // 7) * 1000) for i in range(30)]
+
+    def walk(self, paginator):
+        pages, tokens, token = [], [None], None
+        while True:
+            page = paginator.get_page(token)
+            pages.append([car.pk for car in page])
+            if not page.has_next():
+                return pages, tokens, page
+            token = page.next_cursor
+            tokens.append(token)
+
+    def test_round_trip_with_ties(self):
+        for ordering in ("price", "-price"):
+            paginator = CursorPaginator(Car.objects.all(), ordering, 4)
+            pages, tokens, last = self.walk(paginator)
+            expected = list(Car.objects.order_by(ordering, ordering.replace("price", "pk")).values_list("pk", flat=True))
+            self.assertEqual([pk for page in pages for pk in page], expected)
+
+            # Walking back with the previous cursors revisits the same pages.
+            page, index = last, len(pages) - 1
+            while page.has_previous():
+                page = paginator.get_page(page.previous_cursor)
+                index -= 1
+                self.assertEqual([car.pk for car in page], pages[index])
+            self.assertEqual(index, 0)
+
+    def test_tampered_tokens_fall_back_to_the_first_page(self):
+        paginator = CursorPaginator(Car.objects.all(), "price", 4)
+        first = [car.pk for car in paginator.get_page()]
+        encode = lambda raw: base64.urlsafe_b64encode(raw).decode().rstrip("=")
+        for token in (
+            "garbage!", encode(b"not json"), encode(b'["x","500000",1]'),
+            encode(b'["n","cheap",1]'), encode(b'["n","500000","one"]'), encode(b'{"n":1}'),
+        ):
+            page = paginator.get_page(token)
+            self.assertEqual([car.pk for car in page], first, token)
+            self.assertFalse(page.has_previous())
+
+    @override_settings(INVENTORY_PAGINATION="cursor")
+    def test_inventory_pages_through_cursors(self):
+        seen, url = [], "/inventory/?sort=price_asc"
+        while url:
+            response = self.client.get(url)
+            page = response.context["page_obj"]
+            seen += [car.pk for car in page]
+            url = f"/inventory/?sort=price_asc&cursor={page.next_cursor}" if page.has_next() else None
+        self.assertEqual(seen, list(Car.objects.order_by("price", "pk").values_list("pk", flat=True)))
+        self.assertContains(response, "30 results")
+        self.assertEqual(self.client.get("/inventory/?sort=price_asc&cursor=tampered").status_code, 200)
+
+    @override_settings(INVENTORY_PAGINATION="cursor")
+    def test_next_page_reuses_the_cached_count(self):
+        page = self.client.get("/inventory/?sort=price_asc").context["page_obj"]
+        with self.assertQueryBudget(1) as ctx:
+            response = self.client.get(f"/inventory/?sort=price_asc&cursor={page.next_cursor}")
+        self.assertContains(response, "30 results")
+        self.assertFalse(any("COUNT" in query["sql"] for query in ctx.captured_queries))
+
+
+class SearchTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_search_backend()
+        self.addCleanup(reset_search_backend)
+        if search_backend() != "sqlite":
+            self.skipTest("SQLite FTS5 index not installed")
+
+    def search(self, q):
+        qs, ranked = search_cars(Car.objects.all(), q)
+        self.assertTrue(ranked)
+        return list(qs.order_by("-search_rank", "pk").values_list("pk", flat=True))
+
+    def indexed(self, car):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {SQLITE_TABLE} WHERE rowid = %s", [car.pk])
+            return cursor.fetchone()[0]
+
+    def test_index_follows_save_and_delete(self):
+        car = make_car(self.owner, model="Vios")
+        self.assertEqual(self.search("vios"), [car.pk])
+
+        car.model = "Corolla"
+        car.save()
+        self.assertEqual(self.search("vios"), [])
+        self.assertEqual(self.search("coro"), [car.pk])
+
+        # Price-only updates leave the index row alone.
+        car.price = 1
+        car.save(update_fields=["price"])
+        self.assertEqual(self.search("corolla"), [car.pk])
+
+        car.delete()
+        self.assertEqual(self.indexed(car), 0)
+
+    def test_prefix_tokens_must_all_match(self):
+        vios = make_car(self.owner, brand="Toyota", model="Vios", location="Lucena City")
+        make_car(self.owner, brand="Toyota", model="Fortuner", location="Manila")
+        make_car(self.owner, brand="Honda", model="City", location="Lucena City")
+        self.assertEqual(self.search("toy luc"), [vios.pk])
+        self.assertEqual(len(self.search("luc")), 2)
+
+    def test_brand_and_model_outrank_description(self):
+        mention = make_car(self.owner, brand="Honda", model="City", description="Traded in for a Toyota")
+        toyota = make_car(self.owner, brand="Toyota", model="Vios", description="Clean unit")
+        self.assertEqual(self.search("toyota"), [toyota.pk, mention.pk])
+
+        response = self.client.get("/inventory/?q=toyota&sort=relevance")
+        self.assertEqual([car.pk for car in response.context["cars"]], [toyota.pk, mention.pk])
+
+    def test_falls_back_to_icontains_without_an_index(self):
+        vios = make_car(self.owner, model="Vios", location="Lucena City")
+        make_car(self.owner, model="Fortuner", location="Manila")
+        reset_search_backend()
+        with mock.patch.object(connection.introspection, "table_names", return_value=[]):
+            self.assertIsNone(search_backend())
+        qs, ranked = search_cars(Car.objects.all(), "lucena")
+        self.assertFalse(ranked)
+        self.assertEqual(list(qs.values_list("pk", flat=True)), [vios.pk])
+
+        # Relevance is only offered for ranked results.
+        response = self.client.get("/inventory/?q=vios&sort=relevance")
+        self.assertFalse(response.context["relevance_available"])
+        self.assertEqual(response.context["selected_sort"], "newest")
+        self.assertEqual([car.pk for car in response.context["cars"]], [vios.pk])
+
+        # Without an index, saves and deletes skip indexing instead of failing.
+        make_car(self.owner, model="City").delete()
+
+
+class InventoryFacetTests(QueryBudgetTestCase):
+    def options(self, response, name):
+        return {option["value"]: option["count"] for option in response.context[f"{name}_options"]}
+
+    def test_static_choices_and_selected_value_stay_listed(self):
+        make_car(self.owner, transmission="Automatic", fuel="Diesel")
+        response = self.client.get("/inventory/?fuel=LPG")
+        self.assertEqual(self.options(response, "transmission"), {"Automatic": 1, "Manual": 0})
+        self.assertEqual(
+            self.options(response, "fuel"),
+            {"Gasoline": 0, "Diesel": 1, "Hybrid": 0, "Electric": 0, "LPG": 0},
+        )
+        self.assertContains(response, '<option value="LPG" selected>')
+
+    def test_body_type_filter(self):
+        sedan = make_car(self.owner, body_type="Sedan")
+        make_car(self.owner, body_type="Van")
+        make_car(self.owner, body_type="Van")
+        response = self.client.get("/inventory/?body_type=Sedan")
+        self.assertEqual(list(response.context["cars"]), [sedan])
+        self.assertEqual(self.options(response, "body_type"), {"Sedan": 1, "SUV": 0, "Van": 2})
+        self.assertContains(response, '<option value="Sedan" selected>')
+
+    def test_case_insensitive_filters(self):
+        car = make_car(self.owner, brand="Toyota", transmission="Manual", fuel="Diesel", body_type="SUV")
+        make_car(self.owner, brand="Honda")
+        response = self.client.get("/inventory/?brand=toyota&trans=MANUAL&fuel=diesel&body_type=suv")
+        self.assertEqual(list(response.context["cars"]), [car])
+
+    def test_save_and_delete_refresh_facets(self):
+        car = make_car(self.owner, brand="Toyota")
+        self.assertEqual(get_inventory_facets()["total"], 1)
+
+        version = get_inventory_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_car(self.owner, brand="Honda")
+        self.assertGreater(get_inventory_version(), version)
+        facets = get_inventory_facets()
+        self.assertEqual([option["brand"] for option in facets["brand_options"]], ["Honda", "Toyota"])
+
+        version = get_inventory_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            car.delete()
+        self.assertGreater(get_inventory_version(), version)
+        self.assertEqual(get_inventory_facets()["brand_options"], [{"brand": "Honda", "count": 1}])
+
+
+class OwnerViewQueryTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def test_owner_dashboard(self):
+        cars = make_listing(self.owner, 2)
+        for car in cars:
+            Booking.objects.create(
+                car=car, full_name="A", phone="1",
+                preferred_date=date(2030, 1, 1), preferred_time=time(10, 0),
+            )
+        with self.assertQueryBudget(6):
+            self.assertEqual(self.client.get("/owner/").status_code, 200)
+
+        more = make_listing(self.owner, 6)
+        for car in more:
+            Booking.objects.create(
+                car=car, full_name="B", phone="2",
+                preferred_date=date(2030, 1, 2), preferred_time=time(11, 0),
+            )
+        with self.assertQueryBudget(6):
+            self.assertEqual(self.client.get("/owner/").status_code, 200)
+
+    def test_car_create_form(self):
+        with self.assertQueryBudget(2):
+            self.assertEqual(self.client.get("/owner/cars/add/").status_code, 200)
+
+    def test_car_edit_form(self):
+        car = make_car(self.owner)
+        with self.assertQueryBudget(3):
+            self.assertEqual(self.client.get(f"/owner/cars/{car.id}/edit/").status_code, 200)
+
+    def test_car_manage_images(self):
+        car = make_listing(self.owner, 1, images_per_car=5)[0]
+        with self.assertQueryBudget(4):
+            response = self.client.get(f"/owner/cars/{car.id}/images/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_mark_sold_and_available(self):
+        car = make_car(self.owner)
+        # car + stats row + first sale of the month creates its bucket
+        with self.assertQueryBudget(11):
+            self.client.get(f"/owner/cars/{car.id}/sold/")
+        car.refresh_from_db()
+        self.assertFalse(car.is_available)
+        self.assertIsNotNone(car.sold_at)
+        with self.assertQueryBudget(9):
+            self.client.get(f"/owner/cars/{car.id}/available/")
+        car.refresh_from_db()
+        self.assertTrue(car.is_available)
+        self.assertIsNone(car.sold_at)
+
+    def test_set_and_delete_main_image(self):
+        car = make_listing(self.owner, 1, images_per_car=3)[0]
+        first, second, third = car.images.order_by("pk")
+        with self.assertQueryBudget(5):
+            self.client.get(f"/owner/cars/{car.id}/images/{second.id}/main/")
+        car.refresh_from_db()
+        self.assertEqual(car.main_image_id, second.id)
+        self.client.get(f"/owner/cars/{car.id}/images/{second.id}/delete/")
+        car.refresh_from_db()
+        self.assertEqual(car.main_image_id, first.id)
+
+    def test_booking_status_and_delete(self):
+        car = make_car(self.owner)
+        booking = Booking.objects.create(
+            car=car, full_name="A", phone="1", email="a@example.com",
+            preferred_date=date(2030, 1, 1), preferred_time=time(10, 0),
+        )
+        with self.assertQueryBudget(7):
+            self.client.get(f"/owner/bookings/{booking.id}/Approved/?booking_status=All")
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, "Approved")
+        self.assertEqual(booking.notifications.count(), 1)
+        with self.assertQueryBudget(6):
+            self.client.get(f"/owner/bookings/{booking.id}/delete/")
+        self.assertFalse(Booking.objects.filter(pk=booking.id).exists())
+
+
+class OwnerStatsTests(QueryBudgetTestCase):
+    def assertInSync(self):
+        self.assertEqual(check_stats(), {})
+
+    def test_lifecycle_keeps_stats_in_sync(self):
+        cars = [make_car(self.owner, price=100000 * (i + 1)) for i in range(3)]
+        self.assertInSync()
+
+        self.login()
+        self.client.get(f"/owner/cars/{cars[0].id}/sold/")
+        self.client.get(f"/owner/cars/{cars[1].id}/sold/")
+        self.assertInSync()
+        stats = owner_analytics(self.owner)
+        self.assertEqual(stats["sold_count"], 2)
+        self.assertEqual(stats["sold_this_month"], 2)
+        self.assertEqual(stats["sold_revenue"], Decimal("300000"))
+        self.assertEqual(stats["available_value"], Decimal("300000"))
+
+        self.client.get(f"/owner/cars/{cars[1].id}/available/")
+        car = Car.objects.get(pk=cars[0].pk)
+        car.price = 150000
+        car.save()
+        Car.objects.get(pk=cars[2].pk).delete()
+        self.assertInSync()
+        stats = owner_analytics(self.owner)
+        self.assertEqual(stats["total_cars"], 2)
+        self.assertEqual(stats["sold_revenue"], Decimal("150000"))
+
+    def test_rebuild_losing_a_race_leaves_the_transaction_usable(self):
+        make_car(self.owner)
+        with mock.patch.object(OwnerStats.objects, "bulk_create", side_effect=IntegrityError):
+            self.assertFalse(rebuild_owner(self.owner.pk))
+        self.assertTrue(rebuild_owner(self.owner.pk))
+        self.assertInSync()
+
+    def lose_first_rebuild(self, **stats):
+        # Another worker's first load writes the row before ours can.
+        def concurrent(owner_id):
+            OwnerStats.objects.create(owner_id=owner_id, **stats)
+            return False
+        return mock.patch("cars.stats.rebuild_owner", side_effect=concurrent)
+
+    def test_concurrent_first_load(self):
+        make_car(self.owner, price=200000)
+        OwnerStats.objects.all().delete()
+        with self.lose_first_rebuild(total_cars=1, available_count=1, available_value=200000):
+            self.assertEqual(owner_analytics(self.owner)["total_cars"], 1)
+        self.assertInSync()
+
+    def test_change_racing_a_first_rebuild_is_kept(self):
+        make_car(self.owner, price=200000)
+        OwnerStats.objects.all().delete()
+        # The winning rebuild could not see the car saved here.
+        with self.lose_first_rebuild(total_cars=1, available_count=1, available_value=200000):
+            make_car(self.owner, price=100000)
+        self.assertEqual(OwnerStats.objects.get(owner=self.owner).total_cars, 2)
+        self.assertInSync()
+
+    def test_deferred_and_partial_saves(self):
+        car = make_car(self.owner, price=200000)
+        deferred = Car.objects.only("id", "description").get(pk=car.pk)
+        deferred.description = "Updated"
+        deferred.save(update_fields=["description"])
+        partial = Car.objects.get(pk=car.pk)
+        partial.price = 999
+        partial.is_available = False
+        partial.sold_at = date(2030, 1, 1)
+        partial.save(update_fields=["is_available"])
+        self.assertInSync()
+
+    def test_rebuild_repairs_drift(self):
+        make_car(self.owner)
+        OwnerStats.objects.update(total_cars=42)
+        self.assertEqual(check_stats(), {self.owner.pk: ["total_cars"]})
+        self.assertEqual(check_stats(fix=True), {self.owner.pk: ["total_cars"]})
+        self.assertInSync()
+
+    def test_missing_row_is_rebuilt(self):
+        make_car(self.owner)
+        OwnerStats.objects.all().delete()
+        self.assertEqual(owner_analytics(self.owner)["total_cars"], 1)
+        make_car(self.owner)
+        self.assertInSync()
+
+    def test_deleting_owner(self):
+        make_car(self.owner)
+        self.owner.delete()
+        self.assertFalse(OwnerStats.objects.exists())
+        self.assertFalse(OwnerMonthlySales.objects.exists())
+
+    def test_dashboard_budget_is_flat(self):
+        self.login()
+        make_listing(self.owner, 2)
+        with self.assertQueryBudget(5):
+            self.client.get("/owner/")
+        make_listing(self.owner, 10)
+        with self.assertQueryBudget(5):
+            self.client.get("/owner/")
+
+    def test_monthly_sales_series(self):
+        car = make_car(self.owner)
+        self.login()
+        self.client.get(f"/owner/cars/{car.id}/sold/")
+        series = monthly_sales(self.owner, 6)
+        self.assertEqual(len(series), 6)
+        self.assertEqual(series[-1]["sold_count"], 1)
+        self.assertTrue(all(row["sold_count"] == 0 for row in series[:-1]))
+        response = self.client.get("/owner/sales/?months=3&format=json")
+        self.assertEqual([m["sold_count"] for m in response.json()["months"]], [0, 0, 1])
+        self.assertEqual(self.client.get("/owner/sales/").status_code, 200)
+
+
+class OwnerPanelTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def make_bookings(self, car, count, **kwargs):
+        data = {"full_name": "A", "phone": "1", "preferred_date": date(2030, 1, 1), "preferred_time": time(10, 0)}
+        data.update(kwargs)
+        return [Booking.objects.create(car=car, **data) for _ in range(count)]
+
+    def test_cars_panel_pages_through_everything(self):
+        make_listing(self.owner, 45, images_per_car=1)
+        seen, url = [], "/owner/panels/cars/?car_status=All"
+        while url:
+            with self.assertQueryBudget(3):
+                response = self.client.get(url)
+            page = response.context["cars"]
+            seen += [car.pk for car in page]
+            url = f"/owner/panels/cars/?{response.context['cars_query']}&cursor={page.next_cursor}" if page.has_next() else None
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(seen)), 45)
+
+    def test_bookings_filters(self):
+        car, other = make_car(self.owner), make_car(self.owner)
+        self.make_bookings(car, 3, preferred_date=date(2030, 1, 5))
+        self.make_bookings(car, 2, preferred_date=date(2030, 2, 5), status="Approved")
+        self.make_bookings(other, 4, preferred_date=date(2030, 1, 5))
+        stranger = make_car(User.objects.create_user("stranger"))
+        self.make_bookings(stranger, 2)
+
+        def count(query):
+            return len(self.client.get(f"/owner/panels/bookings/?{query}").context["bookings"])
+
+        self.assertEqual(count(""), 9)
+        self.assertEqual(count(f"car={car.id}"), 5)
+        self.assertEqual(count(f"car={stranger.id}"), 0)
+        self.assertEqual(count("booking_status=Approved"), 2)
+        self.assertEqual(count("date_from=2030-02-01"), 2)
+        self.assertEqual(count(f"car={other.id}&date_to=2030-01-31"), 4)
+        self.assertEqual(count("date_from=bogus"), 9)
+
+    def test_status_update_keeps_filters(self):
+        car = make_car(self.owner)
+        booking = self.make_bookings(car, 1)[0]
+        response = self.client.get(f"/owner/bookings/{booking.id}/Done/?booking_status=Pending&car={car.id}&cursor=x")
+        self.assertEqual(response["Location"], f"/owner/?booking_status=Pending&car={car.id}")
+
+    def test_dashboard_renders_first_page_only(self):
+        car = make_car(self.owner)
+        make_listing(self.owner, 25, images_per_car=0)
+        self.make_bookings(car, 30)
+        response = self.client.get("/owner/")
+        self.assertEqual(len(response.context["cars"]), 20)
+        self.assertEqual(len(response.context["bookings"]), 20)
+        self.assertContains(response, "/owner/panels/bookings/?cursor=")
+
+
+class OwnerExportTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+        self.car = make_car(self.owner)
+        for i in range(30):
+            Booking.objects.create(
+                car=self.car, full_name=f"Buyer {i}", phone="+639171234567",
+                preferred_date=date(2030, 1, 1) + timedelta(days=i), preferred_time=time(10, 0),
+                status="Approved" if i % 3 == 0 else "Pending", note="=HYPERLINK(1)" if i == 0 else "",
+            )
+        stranger = User.objects.create_user("other", "other@example.com", "pw")
+        Booking.objects.create(
+            car=make_car(stranger), full_name="Not mine", phone="1",
+            preferred_date=date(2030, 1, 1), preferred_time=time(10, 0),
+        )
+
+    def download(self, url, budget):
+        with self.assertQueryBudget(budget):
+            response = self.client.get(url)
+            content = b"".join(response.streaming_content)
+        return response, content
+
+    def test_bookings_csv_streams_filtered_rows(self):
+        response, content = self.download("/owner/export/bookings/?booking_status=Approved&date_to=2030-01-20", 4)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO(content.decode("utf-8-sig"))))
+        self.assertEqual(rows[0][:3], ["Booking #", "Received", "Status"])
+        self.assertEqual(len(rows) - 1, 7)
+        self.assertEqual({row[2] for row in rows[1:]}, {"Approved"})
+        self.assertEqual(rows[-1][12], "'=HYPERLINK(1)")
+        self.assertEqual(rows[-1][8], "+639171234567")
+
+    def test_formula_cells_are_escaped(self):
+        for value in ("=1+1", '=2*HYPERLINK("http://x")', "-2+3+cmd|' /C calc'!A0", "@SUM(A1)", "+1+cmd", "\t=1"):
+            self.assertEqual(_cell(value), "'" + value, value)
+        for value in ("+639171234567", "+63 (917) 123-4567", "-5", "Toyota"):
+            self.assertEqual(_cell(value), value, value)
+
+    def test_inventory_xlsx_includes_sold_history(self):
+        self.car.is_available = False
+        self.car.sold_at = timezone.now()
+        self.car.save()
+        response, content = self.download("/owner/export/inventory/?car_status=Sold&format=xlsx", 4)
+        self.assertTrue(response["Content-Disposition"].endswith('.xlsx"'))
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row>"), 2)
+        self.assertIn("<v>550000.00</v>", sheet)
+        self.assertIn(timezone.localtime(self.car.sold_at).strftime("%Y-%m-%d"), sheet)
+
+
+class ArchiveTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old, self.recent, self.live = make_listing(self.owner, 3)
+        for car, days in ((self.old, 400), (self.recent, 30)):
+            car.is_available = False
+            car.sold_at = timezone.now() - timedelta(days=days)
+            car.save()
+        self.booking = Booking.objects.create(
+            car=self.old, full_name="Old buyer", phone="1", preferred_date=date(2024, 1, 1), preferred_time=time(9, 0),
+        )
+
+    def stats(self):
+        return OwnerStats.objects.values("total_cars", "sold_count", "sold_revenue").get(owner=self.owner)
+
+    def test_moves_old_sales_with_photos_and_bookings(self):
+        names = list(self.old.images.values_list("image", flat=True))
+        stats = self.stats()
+        refcounts = dict(MediaBlob.objects.values_list("name", "refcount"))
+
+        self.assertEqual(archive_sold_cars(days=365), 1)
+        self.assertFalse(Car.objects.filter(pk=self.old.pk).exists())
+        self.assertFalse(Booking.objects.filter(pk=self.booking.pk).exists())
+        archived = ArchivedCar.objects.get(pk=self.old.pk)
+        self.assertCountEqual(archived.images.values_list("image", flat=True), names)
+        self.assertIn(archived.main_image, names)
+        self.assertEqual(archived.bookings.get().full_name, "Old buyer")
+        self.assertEqual(set(Car.objects.values_list("pk", flat=True)), {self.recent.pk, self.live.pk})
+
+        # History is unchanged: stats, file references and a fresh aggregate agree.
+        self.assertEqual(self.stats(), stats)
+        self.assertEqual(check_stats(), {})
+        self.assertEqual(dict(MediaBlob.objects.values_list("name", "refcount")), refcounts)
+        self.assertEqual(referenced_names(names), set(names))
+
+    def test_exports_span_live_and_archive(self):
+        archive_sold_cars(days=365)
+        self.login()
+        response = self.client.get("/owner/export/inventory/?car_status=Sold")
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode("utf-8-sig"))))
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.recent.pk, self.old.pk])
+        response = self.client.get(f"/owner/export/bookings/?car={self.old.pk}")
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode("utf-8-sig"))))
+        self.assertEqual([row[7] for row in rows[1:]], ["Old buyer"])
+
+    def test_deleting_archive_releases_files(self):
+        archive_sold_cars(days=365)
+        name = ArchivedCar.objects.get().main_image
+        before = MediaBlob.objects.get(name=name).refcount
+        ArchivedCar.objects.all().delete()
+        self.assertLess(MediaBlob.objects.get(name=name).refcount, before)
+
+    def test_deleting_archived_car_adjusts_stats(self):
+        archive_sold_cars(days=365)
+        stats = self.stats()
+        ArchivedCar.objects.get(pk=self.old.pk).delete()
+        self.assertEqual(self.stats(), {
+            "total_cars": stats["total_cars"] - 1,
+            "sold_count": stats["sold_count"] - 1,
+            "sold_revenue": stats["sold_revenue"] - self.old.price,
+        })
+        self.assertEqual(check_stats(), {})
+
+    def test_relisted_batch_does_not_end_the_run(self):
+        self.recent.sold_at = timezone.now() - timedelta(days=400)
+        self.recent.save()
+        archive_cars = archive.archive_cars
+
+        def relist_first(queryset):
+            # Another request relists the car between the pick and the lock.
+            if relist_first.calls == 0:
+                Car.objects.filter(pk=self.old.pk).update(is_available=True)
+            relist_first.calls += 1
+            return archive_cars(queryset)
+        relist_first.calls = 0
+
+        with mock.patch.object(archive, "archive_cars", relist_first):
+            self.assertEqual(archive_sold_cars(days=365, batch_size=1), 1)
+        self.assertEqual(relist_first.calls, 2)
+        self.assertEqual(list(ArchivedCar.objects.values_list("pk", flat=True)), [self.recent.pk])
+        self.assertTrue(Car.objects.filter(pk=self.old.pk).exists())
+
+
+@override_settings(
+    EMAIL_BACKEND="cars.tests.FakeEmailBackend", NOTIFICATION_MAX_ATTEMPTS=3, NOTIFICATION_LEASE_SECONDS=300,
+    NOTIFICATION_RETRY_BASE_SECONDS=30, NOTIFICATION_RETRY_MAX_SECONDS=600,
+)
+class OutboxTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        FakeEmailBackend.reset()
+        # The process-wide mailer may hold a connection from another backend.
+        mailer.close()
+        self.addCleanup(mailer.close)
+
+    def queue(self, **kwargs):
+        return OutboxMessage.objects.create(
+            channel="email", recipients=["buyer@example.com"], subject="Hi", body="Body", **kwargs,
+        )
+
+    def test_claim_due_leases_until_expiry(self):
+        due = self.queue()
+        self.queue(next_attempt_at=timezone.now() + timedelta(hours=1))
+        self.queue(status="Sent")
+        self.assertEqual([m.pk for m in claim_due()], [due.pk])
+        due.refresh_from_db()
+        self.assertEqual(due.attempts, 1)
+        self.assertGreater(due.next_attempt_at, timezone.now() + timedelta(seconds=290))
+        # A second worker gets nothing while the lease holds...
+        self.assertEqual(claim_due(), [])
+        # ...and picks the message up again once a dead worker's lease expires.
+        OutboxMessage.objects.filter(pk=due.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual([m.attempts for m in claim_due()], [2])
+
+    @skipUnlessDBFeature("has_select_for_update_skip_locked")
+    def test_claim_due_skips_locked_rows(self):
+        self.queue()
+        with CaptureQueriesContext(connection) as ctx:
+            claim_due()
+        self.assertTrue(any("SKIP LOCKED" in q["sql"] for q in ctx.captured_queries))
+
+    def test_retry_delay_backs_off_with_cap(self):
+        for attempts, expected in ((1, 30), (2, 60), (3, 120), (10, 600)):
+            delay = retry_delay(attempts).total_seconds()
+            self.assertTrue(expected * 0.8 <= delay <= expected * 1.2, (attempts, delay))
+
+    def test_delivers_and_marks_sent(self):
+        message = self.queue()
+        self.assertEqual(deliver_due(), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual(message.status, "Sent")
+        self.assertEqual(FakeEmailBackend.sent[0].to, ["buyer@example.com"])
+
+    def test_fails_after_max_attempts(self):
+        message = self.queue()
+        FakeEmailBackend.fail_with = [ValueError("rejected")] * 3
+        for attempt in (1, 2, 3):
+            with self.assertLogs("cars.notifications", "WARNING") as logs:
+                self.assertEqual(deliver_due(), (0, 1))
+            self.assertIn(f"failed (attempt {attempt}): rejected", logs.output[0])
+            message.refresh_from_db()
+            self.assertEqual(message.attempts, attempt)
+            if attempt < 3:
+                self.assertEqual(message.status, "Pending")
+                self.assertGreater(message.next_attempt_at, timezone.now() + timedelta(seconds=20))
+            OutboxMessage.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+        message.refresh_from_db()
+        self.assertEqual(message.status, "Failed")
+        self.assertIn("rejected", message.last_error)
+        self.assertEqual(deliver_due(), (0, 0))
+
+    @override_settings(DEBUG=False, EMAIL_BACKEND="django.core.mail.backends.console.EmailBackend")
+    def test_worker_refuses_console_backend_in_production(self):
+        self.queue()
+        with self.assertRaises(CommandError):
+            call_command("process_outbox", "--once")
+        self.assertEqual(OutboxMessage.objects.get().status, "Pending")
+
+
+@override_settings(EMAIL_BACKEND="cars.tests.FakeEmailBackend", EMAIL_CONNECTION_IDLE_TIMEOUT=60)
+class MailDeliveryTests(TestCase):
+    def setUp(self):
+        FakeEmailBackend.reset()
+        self.delivery = MailDelivery()
+        self.addCleanup(self.delivery.close)
+
+    def messages(self, count):
+        return [EmailMessage("Hi", "Body", to=[f"buyer{i}@example.com"]) for i in range(count)]
+
+    def test_batch_shares_one_connection(self):
+        self.assertEqual(self.delivery.send_messages(self.messages(3)), [None, None, None])
+        self.delivery.send_messages(self.messages(1))
+        self.assertEqual(FakeEmailBackend.opened, 1)
+        self.assertEqual(len(FakeEmailBackend.sent), 4)
+
+    def test_reconnects_once_after_a_dropped_connection(self):
+        FakeEmailBackend.fail_with = [smtplib.SMTPServerDisconnected("gone")]
+        self.assertEqual(self.delivery.send_messages(self.messages(1)), [None])
+        self.assertEqual((FakeEmailBackend.opened, FakeEmailBackend.closed), (2, 1))
+
+        FakeEmailBackend.fail_with = [smtplib.SMTPServerDisconnected("gone")] * 2
+        results = self.delivery.send_messages(self.messages(2))
+        self.assertIsInstance(results[0], smtplib.SMTPServerDisconnected)
+        self.assertIsNone(results[1])
+        self.assertEqual(FakeEmailBackend.opened, 4)
+
+    def test_other_errors_do_not_reconnect(self):
+        FakeEmailBackend.fail_with = [smtplib.SMTPRecipientsRefused({})]
+        results = self.delivery.send_messages(self.messages(2))
+        self.assertIsInstance(results[0], smtplib.SMTPRecipientsRefused)
+        self.assertIsNone(results[1])
+        self.assertEqual(FakeEmailBackend.opened, 1)
+
+    def test_idle_connection_is_replaced(self):
+        self.delivery.send_messages(self.messages(1))
+        self.delivery._last_used -= 61
+        self.delivery.send_messages(self.messages(1))
+        self.assertEqual((FakeEmailBackend.opened, FakeEmailBackend.closed), (2, 1))
+
+        self.delivery.send_messages(self.messages(1))
+        self.assertEqual(FakeEmailBackend.opened, 2)
+
+    def test_unreachable_server_fails_the_batch_with_one_attempt(self):
+        FakeEmailBackend.refuse = ConnectionRefusedError("down")
+        results = self.delivery.send_messages(self.messages(3))
+        self.assertEqual(results, [FakeEmailBackend.refuse] * 3)
+        self.assertEqual(FakeEmailBackend.opened, 1)
+
+    def test_metrics(self):
+        self.assertEqual(
+            self.delivery.metrics(),
+            {"connects": 0, "sent": 0, "failed": 0, "p50_ms": None, "p95_ms": None, "max_ms": None},
+        )
+        FakeEmailBackend.fail_with = [smtplib.SMTPRecipientsRefused({})]
+        self.delivery.send_messages(self.messages(4))
+        metrics = self.delivery.metrics()
+        self.assertEqual((metrics["connects"], metrics["sent"], metrics["failed"]), (1, 3, 1))
+        self.assertLessEqual(metrics["p50_ms"], metrics["p95_ms"])
+        self.assertLessEqual(metrics["p95_ms"], metrics["max_ms"])
+
+
+class ServerTimingTests(QueryBudgetTestCase):
+    def timing(self, response):
+        return dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1, SERVER_TIMING_HEADER=True)
+    def test_sampled_request_reports_db_template_and_cache(self):
+        make_listing(self.owner, 3)
+        with self.assertLogs("cars.timing", "INFO") as logs, self.assertQueryBudget(3) as queries:
+            response = self.client.get("/inventory/")
+        timing = self.timing(response)
+        self.assertIn(f'desc="{len(queries)} queries"', timing["db"])
+        self.assertNotIn('desc="0 templates"', timing["tpl"])
+        self.assertNotIn(" 0 misses", timing["cache"])
+        record = logs.records[0]
+        self.assertEqual(record.timing["view"], "inventory")
+        self.assertEqual(record.timing["queries"], len(queries))
+        self.assertRegex(
+            record.getMessage(),
+            rf"^method=GET path=/inventory/ view=inventory status=200 total_ms=[\d.]+ db_ms=[\d.]+ "
+            rf"queries={len(queries)} template_ms=[\d.]+ cache_hits=\d+ cache_misses=[1-9]\d*$",
+        )
+
+        with self.assertLogs("cars.timing", "INFO") as logs:
+            response = self.client.get("/inventory/")
+        self.assertTrue(self.timing(response)["cache"].endswith(' 0 misses"'))
+        self.assertIn('desc="0 queries"', self.timing(response)["db"])
+        self.assertIn(" queries=0 ", logs.records[0].getMessage())
+        self.assertTrue(logs.records[0].getMessage().endswith(" cache_misses=0"))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0, SERVER_TIMING_HEADER=True)
+    def test_unsampled_request_is_untouched(self):
+        response = self.client.get("/")
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+@override_settings(REPLICA_DATABASES=["replica"], REPLICA_STICKY_SECONDS=15)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False):
+        seen = {}
+
+        def view(request):
+            seen["read"] = router.db_for_read(Car)
+            if write:
+                seen["write"] = router.db_for_write(Car)
+            return HttpResponse()
+
+        response = ReplicaMiddleware(view)(request)
+        return seen, response
+
+    def test_anonymous_reads_use_replica(self):
+        seen, response = self.route(self.factory.get("/inventory/"))
+        self.assertEqual(seen["read"], "replica")
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+        # Outside a routed request nothing changes.
+        self.assertEqual(router.db_for_read(Car), "default")
+
+    def test_owners_sessions_and_writes_use_primary(self):
+        self.assertEqual(self.route(self.factory.get("/owner/"))[0]["read"], "default")
+        self.assertEqual(self.route(self.factory.post("/cars/1/book/"))[0]["read"], "default")
+        request = self.factory.get("/")
+        request.COOKIES["sessionid"] = "abc"
+        self.assertEqual(self.route(request)[0]["read"], "default")
+
+    def test_write_pins_visitor_to_primary(self):
+        seen, response = self.route(self.factory.post("/cars/1/book/"), write=True)
+        self.assertEqual(seen["write"], "default")
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]["max-age"], 15)
+        request = self.factory.get("/cars/1/")
+        request.COOKIES[PRIMARY_PIN_COOKIE] = "1"
+        self.assertEqual(self.route(request)[0]["read"], "default")
+
+    @override_settings(VERSIONED_CACHE=False)
+    def test_unshared_cache_keeps_reads_on_primary(self):
+        seen, response = self.route(self.factory.get("/inventory/"), write=True)
+        self.assertEqual(seen["read"], "default")
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    @override_settings(REPLICA_LAG_SECONDS=5)
+    def test_inventory_change_holds_reads_on_primary(self):
+        bump_inventory_version()
+        self.assertEqual(self.route(self.factory.get("/inventory/"))[0]["read"], "default")
+        cache.clear()
+        self.assertEqual(self.route(self.factory.get("/inventory/"))[0]["read"], "replica")
+
+
+@skipUnless(connection.vendor == "sqlite", "checks SQLite query plans")
+class ExplainInventoryTests(QueryBudgetTestCase):
+    def test_filters_use_the_functional_indexes(self):
+        for brand, fuel in (("Toyota", "Diesel"), ("Honda", "Gasoline"), ("Ford", "Hybrid")):
+            make_car(self.owner, brand=brand, fuel=fuel)
+        out = io.StringIO()
+        call_command("explain_inventory", "--fail-on-seq-scan", stdout=out)
+        plans = dict(block.split("\n", 1) for block in out.getvalue().split("\n\n") if "\n" in block)
+        self.assertIn("car_avail_brand_ci_idx", plans["brand / newest"])
+        self.assertIn("car_avail_trans_ci_idx", plans["trans / price_asc"])
+        self.assertIn("car_avail_fuel_ci_idx", plans["fuel / year_desc"])
+        self.assertIn("No sequential scans", out.getvalue())
+
+
+class DatabasePoolSettingsTests(TestCase):
+    def test_pool_size_follows_server_mode(self):
+        expr = "settings.DATABASES['default']['OPTIONS']['pool']['max_size']"
+        env = {"DATABASE_URL": "postgres://automac@db.example.com/automac", "DB_POOL": "1"}
+        self.assertEqual(settings_value(expr, SERVER_MODE="wsgi", **env), "1")
+        self.assertEqual(settings_value(expr, SERVER_MODE="asgi", **env), "4")
+        self.assertEqual(settings_value(expr, SERVER_MODE="wsgi", DB_POOL_MAX_SIZE="3", **env), "3")
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite-only pragmas")
+class SQLiteTuningTests(TestCase):
+    def pragmas(self, *names):
+        # A fresh connection, so connection_created fires outside the test
+        # transaction, whose lock would make PRAGMA optimize fail noisily.
+        self.enterContext(mock.patch("cars.sqlite._last_optimize", clock.monotonic()))
+        fresh = connection.copy()
+        self.addCleanup(fresh.close)
+        with fresh.cursor() as cursor:
+            values = []
+            for name in names:
+                cursor.execute(f"PRAGMA {name}")
+                values.append(cursor.fetchone()[0])
+        return values
+
+    @override_settings(SQLITE_PERFORMANCE=True, SQLITE_BUSY_TIMEOUT_MS=4321, SQLITE_CACHE_SIZE=-8192)
+    def test_pragmas_applied_when_enabled(self):
+        self.assertEqual(self.pragmas("busy_timeout", "cache_size", "temp_store"), [4321, -8192, 2])
+
+    @override_settings(SQLITE_PERFORMANCE=False, SQLITE_BUSY_TIMEOUT_MS=4321)
+    def test_untouched_when_disabled(self):
+        self.assertNotEqual(self.pragmas("busy_timeout"), [4321])
+
+    def test_connection_lifetime_follows_server_mode(self):
+        expr = "settings.DATABASES['default']['CONN_MAX_AGE']"
+        self.assertEqual(settings_value(expr, SQLITE_PERFORMANCE="1", SERVER_MODE="wsgi"), "600")
+        self.assertEqual(settings_value(expr, SQLITE_PERFORMANCE="1", SERVER_MODE="asgi"), "0")
+
+
+class AsyncViewTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_async_views(True)
+        self.addCleanup(self.use_async_views, False)
+
+    def use_async_views(self, enabled):
+        from config import urls as root_urls
+        from . import urls
+
+        with override_settings(ASYNC_VIEWS=enabled):
+            importlib.reload(urls)
+            importlib.reload(root_urls)
+        clear_url_caches()
+
+    async def test_public_pages(self):
+        cars = await sync_to_async(make_listing)(self.owner, 14)
+        car = cars[-1]
+        response = await self.async_client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["latest"]), 6)
+
+        response = await self.async_client.get("/inventory/?sort=price_asc&page=2")
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertEqual([c.pk for c in response.context["cars"]], [c.pk for c in cars[12:]])
+        self.assertEqual(response.context["page_obj"].paginator.num_pages, 2)
+        cached = await self.async_client.get("/inventory/?sort=price_asc&page=2")
+        self.assertEqual(cached["X-Page-Cache"], "hit")
+        not_modified = await self.async_client.get(
+            "/inventory/?sort=price_asc&page=2", headers={"if-none-match": cached["ETag"]},
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+        response = await self.async_client.get(f"/cars/{car.pk}/")
+        self.assertEqual(len(response.context["images"]), 2)
+        self.assertTrue(response.has_header("Last-Modified"))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1, SERVER_TIMING_HEADER=True)
+    async def test_server_timing_counts_async_queries(self):
+        await sync_to_async(make_listing)(self.owner, 3)
+        with self.assertLogs("cars.timing", "INFO") as logs:
+            response = await self.async_client.get("/inventory/")
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        db = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))["db"]
+        self.assertNotIn('desc="0 queries"', db)
+        self.assertEqual(logs.records[0].timing["view"], "inventory")
+        self.assertNotIn(" queries=0 ", logs.records[0].getMessage())
+
+    async def test_booking(self):
+        car = await sync_to_async(make_car)(self.owner)
+        data = {
+            "full_name": "Ana", "phone": "0917", "email": "ana@example.com",
+            "preferred_date": "2030-01-01", "preferred_time": "10:00",
+        }
+        response = await self.async_client.post(f"/cars/{car.pk}/book/", data)
+        self.assertRedirects(response, f"/cars/{car.pk}/", fetch_redirect_response=False)
+        booking = await Booking.objects.aget(car=car)
+        self.assertEqual(await booking.notifications.acount(), 2)
+        response = await self.async_client.post(f"/cars/{car.pk}/book/", {"full_name": "Ana"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors)
+
+
+class ContentAddressedStorageTests(QueryBudgetTestCase):
+    def test_duplicate_uploads_share_one_file(self):
+        car = make_car(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = CarImage.objects.create(car=car, image=_jpeg("photo.JPEG"))
+            second = CarImage.objects.create(car=car, image=_jpeg("copy_of_photo.jpg"))
+            other = CarImage.objects.create(car=car, image=_jpeg("other.jpg", color=(0, 0, 200)))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertTrue(is_content_addressed(first.image.name))
+        self.assertTrue(first.image.name.endswith(".jpg"))
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).refcount, 2)
+        second.refresh_from_db()
+        self.assertEqual(second.variants, CarImage.objects.get(pk=first.pk).variants)
+
+    def test_last_reference_deletes_file_and_derivatives(self):
+        car = make_car(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = CarImage.objects.create(car=car, image=_jpeg())
+            second = CarImage.objects.create(car=car, image=_jpeg())
+        first.refresh_from_db()
+        storage, name = car_image_storage(), first.image.name
+        derivative = first.variants["thumb"]["jpeg"]
+        self.assertTrue(storage.exists(derivative))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            car.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(storage.exists(derivative))
+        self.assertFalse(MediaBlob.objects.exists())
+
+
+@override_settings(DERIVATIVE_SWEEP_GRACE=300)
+class DerivativeSweepTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(uploads._sweep_failed.clear)
+        self.car = make_car(self.owner)
+
+    def lost_job(self, image, minutes=10):
+        # As if the worker holding its derivative job had restarted.
+        CarImage.objects.filter(pk=image.pk).update(
+            variants={}, uploaded_at=timezone.now() - timedelta(minutes=minutes),
+        )
+
+    def test_renders_images_left_behind(self):
+        stale, fresh = (CarImage.objects.create(car=self.car, image=_jpeg(f"{i}.jpg", color=(i, 0, 0))) for i in range(2))
+        self.lost_job(stale)
+        self.lost_job(fresh, minutes=1)
+        self.assertEqual(uploads.sweep_missing_derivatives(), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertTrue(stale.variants)
+        self.assertEqual(fresh.variants, {})
+        self.assertEqual(uploads.sweep_missing_derivatives(), 0)
+
+    def test_broken_uploads_are_tried_once_per_process(self):
+        broken = CarImage.objects.create(
+            car=self.car, image=SimpleUploadedFile("broken.jpg", b"not an image", content_type="image/jpeg"),
+        )
+        self.lost_job(broken)
+        with self.assertLogs("cars.uploads", "ERROR"):
+            self.assertEqual(uploads.sweep_missing_derivatives(), 1)
+        self.assertEqual(uploads.sweep_missing_derivatives(), 0)
+
+
+class ImageUploadTests(QueryBudgetTestCase):
+    CAR = {
+        "brand": "Toyota", "model": "Vios", "body_type": "Sedan", "seating_capacity": "5",
+        "year": "2020", "price": "1,250,000", "mileage": "12000",
+        "transmission": "Automatic", "fuel": "Gasoline", "description": "", "is_available": "on",
+    }
+
+    def test_car_create_stores_photos_in_one_batch(self):
+        self.login()
+        photos = [_jpeg(f"photo{i}.jpg", color=(i * 40, 0, 0)) for i in range(5)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/owner/cars/add/", {**self.CAR, "images": photos})
+        self.assertRedirects(response, "/owner/", fetch_redirect_response=False)
+        car = Car.objects.get()
+        images = list(car.images.order_by("pk"))
+        self.assertEqual(len(images), 5)
+        self.assertEqual(car.main_image_id, images[0].pk)
+        self.assertTrue(all(image.variants for image in CarImage.objects.all()))
+        self.assertEqual(MediaBlob.objects.count(), 5)
+        self.assertEqual(check_stats(), {})
+
+    def test_same_query_count_for_one_or_many_photos(self):
+        self.login()
+        counts = []
+        for n in (1, 6):
+            car = make_car(self.owner)
+            photos = [_jpeg(f"p{n}{i}.jpg", color=(n, i * 30, 0)) for i in range(n)]
+            with self.assertQueryBudget(20) as queries:
+                self.client.post(f"/owner/cars/{car.id}/edit/", {**self.CAR, "images": photos})
+            counts.append(len(queries))
+            self.assertEqual(car.images.count(), n)
+        self.assertEqual(counts[0], counts[1])
+
+    @override_settings(MAX_IMAGE_UPLOAD_BYTES=4096, MAX_IMAGE_DIMENSION=2000)
+    def test_rejects_bad_uploads_while_streaming(self):
+        self.login()
+        car = make_car(self.owner)
+        big = io.BytesIO()
+        Image.effect_noise((200, 200), 80).convert("RGB").save(big, "JPEG", quality=95)
+        wide = io.BytesIO()
+        Image.new("RGB", (2400, 10)).save(wide, "PNG")
+        response = self.client.post(f"/owner/cars/{car.id}/edit/", {**self.CAR, "images": [
+            _jpeg("ok.jpg"),
+            SimpleUploadedFile("big.jpg", big.getvalue(), content_type="image/jpeg"),
+            SimpleUploadedFile("wide.png", wide.getvalue(), content_type="image/png"),
+            SimpleUploadedFile("notes.jpg", b"plain text, not a photo", content_type="image/jpeg"),
+        ]}, follow=True)
+        self.assertEqual(car.images.count(), 1)
+        warnings = [str(m) for m in response.context["messages"]]
+        self.assertEqual(len(warnings), 3)
+        self.assertIn("big.jpg is larger than the upload limit", warnings[0])
+        self.assertIn("wide.png is larger than 2000px", warnings[1])
+        self.assertIn("notes.jpg is not a supported image", warnings[2])
+        leftovers = [n for n in os.listdir(os.path.join(MEDIA_ROOT, "cars")) if n.startswith(".upload-")]
+        self.assertEqual(leftovers, [])
+
+    @override_settings(MAX_IMAGE_UPLOAD_BYTES=4096)
+    def test_rejected_upload_removes_its_temporary_file(self):
+        handler = uploads.ImageUploadHandler()
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file("images", "big.jpg", "image/jpeg", None)
+        path = handler.file.temporary_file_path()
+        self.assertTrue(os.path.exists(path))
+        with self.assertRaises(SkipFile):
+            handler.receive_data_chunk(b"\0" * 5000, 0)
+        self.assertTrue(handler.file.closed)
+        self.assertFalse(os.path.exists(path))
+
+
+class MediaGarbageCollectorTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp(prefix="automac-gc-")
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = car_image_storage()
+
+    def put(self, name, age_hours=48):
+        path = self.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(b"x" * 10)
+        stamp = clock.time() - age_hours * 3600
+        os.utime(path, (stamp, stamp))
+        return name
+
+    def test_collects_only_unreferenced_old_files(self):
+        car = make_car(self.owner)
+        kept = CarImage.objects.create(car=car, image=_jpeg())
+        kept_name = kept.image.name
+        legacy = self.put("cars/legacy.jpg")
+        CarImage.objects.bulk_create([CarImage(car=car, image=legacy)])
+        orphan = self.put("cars/orphan.jpg")
+        orphan_derivative = self.put("cars/orphan.jpg.card.webp")
+        kept_derivative = self.put(f"{kept_name}.card.webp")
+        young = self.put("cars/young.jpg", age_hours=0)
+        stale_temp = self.put("cars/ab/.upload-abc123")
+        os.utime(self.storage.path(kept_name), (0, 0))
+
+        deleted = []
+        # 7 files in batches of 3: three reference lookups (live, archived,
+        # blobs) per batch holding originals; the last holds only a temp file.
+        with self.assertQueryBudget(6):
+            count, size = collect_orphans(self.storage, min_age=timedelta(hours=1), batch_size=3, dry_run=True)
+        self.assertEqual(count, 3)
+        self.assertTrue(self.storage.exists(orphan))
+
+        collect_orphans(self.storage, min_age=timedelta(hours=1), on_file=lambda n, s: deleted.append(n))
+        self.assertCountEqual(deleted, [orphan, orphan_derivative, stale_temp])
+        for name in (kept_name, kept_derivative, legacy, young):
+            self.assertTrue(self.storage.exists(name), name)
+
+
+class ImportInventoryTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.feed = tempfile.mkdtemp(prefix="automac-feed-")
+        self.addCleanup(shutil.rmtree, self.feed, ignore_errors=True)
+        for name, color in (("red.jpg", (200, 0, 0)), ("blue.jpg", (0, 0, 200))):
+            with open(os.path.join(self.feed, name), "wb") as fh:
+                fh.write(_jpeg(name, color).read())
+        with open(os.path.join(self.feed, "broken.jpg"), "wb") as fh:
+            fh.write(b"not an image")
+
+    def write_csv(self, rows):
+        path = os.path.join(self.feed, "inventory.csv")
+        with open(path, "w", newline="") as fh:
+            fh.write("brand,model,body_type,seating_capacity,year,price,mileage,transmission,fuel,images\n")
+            fh.writelines(f"{row}\n" for row in rows)
+        return path
+
+    def test_imports_valid_rows_with_shared_images(self):
+        path = self.write_csv([
+            'Toyota,Vios,Sedan,5,2020,"1,250,000",12000,Automatic,Gasoline,red.jpg;blue.jpg',
+            "Toyota,Vios,Sedan,5,2021,980000,5000,Manual,Gasoline,red.jpg",
+            "Toyota,Vios,Sedan,5,1899,980000,5000,Manual,Gasoline,red.jpg",
+            "Honda,City,Sedan,5,2019,780000,30000,Automatic,Gasoline,broken.jpg",
+        ])
+        messages = []
+        result = import_inventory(path, self.owner, image_dir=self.feed, batch_size=2, workers=0, log=messages.append)
+
+        self.assertEqual((result["rows"], result["imported"], result["invalid"]), (4, 3, 1))
+        self.assertEqual((result["images"], result["image_errors"]), (3, 1))
+        self.assertTrue(any(m.startswith("line 4: year") for m in messages), messages)
+        self.assertEqual(Car.objects.get(year=2020).price, Decimal("1250000"))
+        self.assertEqual(Car.objects.filter(main_image__isnull=False).count(), 2)
+        self.assertEqual(sorted(MediaBlob.objects.values_list("refcount", flat=True)), [1, 2])
+        self.assertTrue(all(image.variants for image in CarImage.objects.all()))
+        self.assertEqual(check_stats(), {})
+        self.assertEqual(len(self.client.get("/inventory/?q=vios").context["cars"]), 2)
+
+
+class BenchmarkTests(QueryBudgetTestCase):
+    def test_seed_and_run_report(self):
+        created = benchmark.seed(12, owners=2, bookings=2, images=2, image_pool=3, batch_size=5)
+        self.assertEqual(created["cars"], 12)
+        self.assertEqual(Car.objects.filter(main_image__isnull=True).count(), 0)
+        self.assertEqual(check_stats(), {})
+        self.assertEqual(sum(MediaBlob.objects.values_list("refcount", flat=True)), created["images"])
+
+        report = benchmark.run(iterations=2, warmup=0)
+        self.assertEqual(report["meta"]["cars"], 12)
+        for name, result in report["scenarios"].items():
+            self.assertIn(result["status"], (200, 302), name)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertEqual(Booking.objects.count(), created["bookings"])
+        changes = list(benchmark.compare(report, report))
+        self.assertTrue(changes)
+        self.assertEqual({change for *_, change in changes}, {0.0})
+
+
+class StaticFilesMiddlewareTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp(prefix="automac-static-")
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        with open(os.path.join(root, "site.css"), "wb") as fh:
+            fh.write(b"body{}")
+        self.enterContext(override_settings(STATIC_ROOT=root))
+        self.factory = RequestFactory()
+
+    def test_sync_chain(self):
+        middleware = StaticFilesMiddleware(lambda request: HttpResponse("view"))
+        self.assertEqual(b"".join(middleware(self.factory.get("/static/site.css")).streaming_content), b"body{}")
+        self.assertEqual(middleware(self.factory.get("/inventory/")).content, b"view")
+
+    async def test_async_chain(self):
+        seen = []
+
+        async def view(request):
+            seen.append(request.path)
+            return HttpResponse("view")
+
+        middleware = StaticFilesMiddleware(view)
+        response = await middleware(self.factory.get("/static/site.css"))
+        self.assertEqual(b"".join(response.streaming_content), b"body{}")
+        self.assertEqual((await middleware(self.factory.get("/static/missing.css"))).content, b"view")
+        self.assertEqual((await middleware(self.factory.get("/inventory/"))).content, b"view")
+        self.assertEqual(seen, ["/static/missing.css", "/inventory/"])
+
+
+class MediaMiddlewareTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        car = make_car(self.owner)
+        self.image = CarImage.objects.create(car=car, image=_jpeg())
+        self.url = f"/media/{self.image.image.name}"
+        self.body = self.image.image.read()
+        self.image.image.close()
+
+    def get(self, url=None, **headers):
+        return self.client.get(url or self.url, headers=headers)
+
+    def test_full_response_is_immutable_and_costs_no_queries(self):
+        with self.assertQueryBudget(0):
+            response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.body)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(int(response["Content-Length"]), len(self.body))
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["ETag"].strip('"'), self.image.image.name.split("/")[-1][:32])
+
+    def test_conditional_requests(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 304)
+        self.assertEqual(self.get(If_None_Match='"other"').status_code, 200)
+
+    def test_ranges(self):
+        response = self.get(Range="bytes=0-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.body[:10])
+        self.assertEqual(response["Content-Range"], f"bytes 0-9/{len(self.body)}")
+
+        response = self.get(Range="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.body[-5:])
+        self.assertEqual(self.get(Range=f"bytes={len(self.body)}-").status_code, 416)
+        self.assertEqual(self.get(Range="bytes=0-9", If_Range='"stale"').status_code, 200)
+
+    def test_invalid_ranges_are_ignored(self):
+        for header in ("bytes=5-3", "bytes=abc", "items=0-9"):
+            response = self.get(Range=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(b"".join(response.streaming_content), self.body)
+        self.assertEqual(self.get(Range="bytes=-0").status_code, 416)
+
+    def test_deleted_file_stops_answering(self):
+        etag = self.get()["ETag"]
+        os.remove(car_image_storage().path(self.image.image.name))
+        self.assertEqual(self.client.head(self.url).status_code, 404)
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 404)
+        self.assertEqual(self.get().status_code, 404)
+
+    def test_upload_temp_files_are_not_served(self):
+        path = car_image_storage().path("cars/ab/.upload-abc123")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(self.body)
+        self.assertEqual(self.get("/media/cars/ab/.upload-abc123").status_code, 404)
+
+    def test_mutable_and_precompressed_files(self):
+        storage = car_image_storage()
+        path = storage.path("cars/legacy.svg")
+        with open(path, "wb") as fh:
+            fh.write(b"<svg/>")
+        with open(path + ".gz", "wb") as fh:
+            fh.write(b"gzipped")
+        response = self.get("/media/cars/legacy.svg", Accept_Encoding="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(b"".join(response.streaming_content), b"gzipped")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertNotIn("immutable", response["Cache-Control"])
+        response = self.get("/media/cars/legacy.svg")
+        self.assertEqual(b"".join(response.streaming_content), b"<svg/>")
+
+    def test_missing_and_traversal_fall_through(self):
+        self.assertEqual(self.get("/media/cars/nope.jpg").status_code, 404)
+        self.assertEqual(self.get("/media/../config/settings.py").status_code, 404)
@@ -0,0 +1,161 @@
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template import base as template_base
+
+logger = logging.getLogger("cars.timing")
+
+_current = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.templates = 0
+        self.template_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - start) * 1000
+            self.queries += 1
+
+
+# ---------- HOOKS ----------
+# Cheap no-ops outside a sampled request, so callers can record unconditionally.
+def record_cache(hit):
+    timings = _current.get()
+    if timings is not None:
+        if hit:
+            timings.cache_hits += 1
+        else:
+            timings.cache_misses += 1
+
+_original_render = template_base.Template.render
+
+# Template.render is wrapped once, process-wide (the approach debug toolbars
+# take). Included templates render inside their parent, so only the outermost
+# render adds to the time.
+def _instrumented_render(self, context):
+    timings = _current.get()
+    if timings is None:
+        return _original_render(self, context)
+    timings.templates += 1
+    timings._template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        timings._template_depth -= 1
+        if not timings._template_depth:
+            timings.template_ms += (time.perf_counter() - start) * 1000
+
+@contextmanager
+def _wrap_connections(timings):
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings))
+        yield
+
+def install_template_hook():
+    if template_base.Template.render is not _instrumented_render:
+        template_base.Template.render = _instrumented_render
+
+
+# ---------- MIDDLEWARE ----------
+# For a SERVER_TIMING_SAMPLE_RATE share of requests, records database,
+# template and cache work and reports it as a Server-Timing header (when
+# SERVER_TIMING_HEADER is on) and a "cars.timing" log line. Requests slower
+# than SERVER_TIMING_SLOW_MS are logged at WARNING. Unsampled requests pay
+# one random() call. Works in both WSGI and ASGI middleware chains.
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, "SERVER_TIMING_SAMPLE_RATE", 0.0)
+        self.header = getattr(settings, "SERVER_TIMING_HEADER", False)
+        self.slow_ms = getattr(settings, "SERVER_TIMING_SLOW_MS", 1000)
+        install_template_hook()
+
+    def _sampled(self):
+        return self.sample_rate and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with _wrap_connections(timings):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, timings, start)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        # Connections are per thread, and an async request's queries run in
+        # its thread-sensitive sync_to_async thread, so the wrappers are
+        # installed and removed there rather than on the event loop.
+        wrappers = ExitStack()
+        await sync_to_async(wrappers.enter_context)(_wrap_connections(timings))
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+            _current.reset(token)
+        return self.report(request, response, timings, start)
+
+    def report(self, request, response, timings, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        if self.header:
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={timings.db_ms:.1f};desc="{timings.queries} queries"',
+                f'tpl;dur={timings.template_ms:.1f};desc="{timings.templates} templates"',
+                f'cache;desc="{timings.cache_hits} hits {timings.cache_misses} misses"',
+                f"total;dur={total_ms:.1f}",
+            ])
+        match = request.resolver_match
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 1),
+            "db_ms": round(timings.db_ms, 1),
+            "queries": timings.queries,
+            "template_ms": round(timings.template_ms, 1),
+            "cache_hits": timings.cache_hits,
+            "cache_misses": timings.cache_misses,
+        }
+        logger.log(
+            logging.WARNING if total_ms >= self.slow_ms else logging.INFO,
+            " ".join(f"{key}={value}" for key, value in fields.items()),
+            extra={"timing": fields},
+        )
+        return response
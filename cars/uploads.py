@@ -0,0 +1,215 @@
+import hashlib
+import io
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .cache import bump_inventory_version
+from .images import generate_derivatives
+from .models import CarImage
+from .storage import acquire_many
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = {"images"}
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP"}
+# JPEG headers can sit behind a large EXIF block; give up after this much.
+HEADER_LIMIT = 512 * 1024
+
+
+def _limit(name, default):
+    return getattr(settings, name, default)
+
+
+# ---------- UPLOAD HANDLER ----------
+# First in FILE_UPLOAD_HANDLERS. Car photos on the "images" field stream to a
+# temp file while being hashed, so ContentAddressedStorage neither re-reads
+# nor copies them. Oversized files, non-images and huge dimensions are cut off
+# as soon as the bytes (or the header) give them away; the reason ends up in
+# request.upload_errors. Every other field falls through to Django's handlers.
+class ImageUploadHandler(FileUploadHandler):
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.active = field_name in IMAGE_FIELDS
+        if not self.active:
+            return
+        if self.request is not None and not hasattr(self.request, "upload_errors"):
+            self.request.upload_errors = []
+        self.max_bytes = _limit("MAX_IMAGE_UPLOAD_BYTES", 15 * 1024 * 1024)
+        self.file = TemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+        self.digest = hashlib.sha256()
+        self.head = b""
+        self.dimensions = None
+        raise StopFutureHandlers()
+
+    def reject(self, reason):
+        if self.request is not None:
+            self.request.upload_errors.append(f"{self.file_name} {reason}.")
+        # Closing the named temporary file deletes the partial upload.
+        self.file.close()
+        raise SkipFile()
+
+    def _check_header(self):
+        try:
+            with Image.open(io.BytesIO(self.head)) as img:
+                fmt, (width, height) = img.format, img.size
+        except Image.DecompressionBombError:
+            self.reject("has too many pixels")
+        except Exception:
+            if len(self.head) >= HEADER_LIMIT:
+                self.reject("is not a supported image")
+            return
+        if fmt not in ALLOWED_FORMATS:
+            self.reject("is not a JPEG, PNG or WebP image")
+        max_side = _limit("MAX_IMAGE_DIMENSION", 10000)
+        if max(width, height) > max_side:
+            self.reject(f"is larger than {max_side}px on a side")
+        self.dimensions = (width, height)
+        self.head = b""
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if start + len(raw_data) > self.max_bytes:
+            self.reject("is larger than the upload limit")
+        if self.dimensions is None:
+            self.head += raw_data
+            self._check_header()
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        if self.dimensions is None:
+            # Shorter than a readable header. Returning None would hand the
+            # file to handlers that never saw it, so it is flagged instead.
+            self.file.rejected = True
+            if self.request is not None:
+                self.request.upload_errors.append(f"{self.file_name} is not a supported image.")
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        self.file.image_size = self.dimensions
+        return self.file
+
+    def upload_interrupted(self):
+        if getattr(self, "active", False) and hasattr(self, "file"):
+            self.file.close()
+
+
+# ---------- BACKGROUND DERIVATIVES ----------
+_executor = None
+
+# Returns the ids that failed.
+def _run_derivatives(image_ids):
+    failed = []
+    for car_image in CarImage.objects.filter(pk__in=image_ids).only("pk", "image"):
+        try:
+            generate_derivatives(car_image)
+        except Exception:
+            # A broken upload keeps serving its original; never fail the request over it.
+            logger.exception("Could not generate derivatives for CarImage %s", car_image.pk)
+            failed.append(car_image.pk)
+    # Variants are written with update(), so cached pages need an explicit bump.
+    bump_inventory_version()
+    return failed
+
+def _run_in_background(image_ids):
+    try:
+        _run_derivatives(image_ids)
+    except Exception:
+        logger.exception("Derivative job for CarImages %s failed", image_ids)
+    finally:
+        # Pool threads otherwise keep their database connections forever.
+        connections.close_all()
+
+# Renders derivatives off the request thread. IMAGE_DERIVATIVE_WORKERS=0 runs
+# them inline instead; jobs lost to a restart are picked up by the catch-up
+# sweep below.
+def schedule_derivatives(image_ids):
+    global _executor
+    image_ids = list(image_ids)
+    if not image_ids:
+        return
+    workers = _limit("IMAGE_DERIVATIVE_WORKERS", 2)
+    if workers <= 0:
+        _run_derivatives(image_ids)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="derivatives")
+    _executor.submit(_run_in_background, image_ids)
+
+
+# ---------- CATCH-UP ----------
+# Queued jobs die with their worker (deploys, restarts, crashes). Every web
+# worker runs a sweeper thread (started from config/gunicorn.conf.py) that
+# renders images still without variants DERIVATIVE_SWEEP_GRACE seconds after
+# upload. Images that fail are left alone for the rest of the process, so one
+# broken upload is not retried on every pass.
+_sweeper = None
+_sweep_failed = set()
+
+def missing_derivatives():
+    cutoff = timezone.now() - timedelta(seconds=_limit("DERIVATIVE_SWEEP_GRACE", 300))
+    return CarImage.objects.filter(variants={}, uploaded_at__lt=cutoff).exclude(pk__in=_sweep_failed)
+
+# Returns how many images were picked up.
+def sweep_missing_derivatives(limit=100):
+    image_ids = list(missing_derivatives().order_by("pk").values_list("pk", flat=True)[:limit])
+    if image_ids:
+        logger.info("Rendering derivatives for %d images left behind by earlier workers", len(image_ids))
+        _sweep_failed.update(_run_derivatives(image_ids))
+    return len(image_ids)
+
+def _sweep_forever(interval):
+    while True:
+        # Jitter keeps the workers from sweeping in lockstep.
+        time.sleep(interval * random.uniform(0.5, 1.5))
+        try:
+            sweep_missing_derivatives()
+        except Exception:
+            logger.exception("Derivative sweep failed")
+        finally:
+            connections.close_all()
+
+def start_derivative_sweeper():
+    global _sweeper
+    interval = _limit("DERIVATIVE_SWEEP_INTERVAL", 600)
+    if _sweeper is not None or interval <= 0:
+        return
+    _sweeper = threading.Thread(target=_sweep_forever, args=(interval,), name="derivative-sweeper", daemon=True)
+    _sweeper.start()
+
+
+# ---------- SAVING ----------
+# Stores a batch of uploads for one car: one transaction, one INSERT for the
+# rows, one main-image update, and derivatives after commit. bulk_create skips
+# the CarImage signals, so their work is done here.
+def add_car_images(car, files):
+    files = [f for f in files if not getattr(f, "rejected", False)]
+    if not files:
+        return []
+    storage = CarImage._meta.get_field("image").storage
+    with transaction.atomic():
+        images = CarImage.objects.bulk_create([CarImage(car=car, image=f) for f in files])
+        acquire_many(storage, Counter(image.image.name for image in images))
+        if car.main_image_id is None:
+            car.main_image = images[0]
+            car.save(update_fields=["main_image"])
+        ids = [image.pk for image in images]
+        transaction.on_commit(bump_inventory_version)
+        transaction.on_commit(lambda: schedule_derivatives(ids))
+    return images
@@ -1,12 +1,16 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# The ASGI deployment serves the public pages from their async versions.
+public = async_views if getattr(settings, "ASYNC_VIEWS", False) else views
 
 urlpatterns = [
     # customer
-    path("", views.home, name="home"),
-    path("inventory/", views.inventory, name="inventory"),
-    path("cars/<int:pk>/", views.car_detail, name="car_detail"),
-    path("cars/<int:pk>/book/", views.book_test_drive, name="book_test_drive"),
+    path("", public.home, name="home"),
+    path("inventory/", public.inventory, name="inventory"),
+    path("cars/<int:pk>/", public.car_detail, name="car_detail"),
+    path("cars/<int:pk>/book/", public.book_test_drive, name="book_test_drive"),
 
     # auth
     path("login/", views.login_view, name="login"),
@@ -14,6 +18,11 @@ urlpatterns = [
 
     # owner
     path("owner/", views.owner_dashboard, name="owner_dashboard"),
+    path("owner/sales/", views.owner_sales, name="owner_sales"),
+    path("owner/panels/cars/", views.owner_cars_panel, name="owner_cars_panel"),
+    path("owner/panels/bookings/", views.owner_bookings_panel, name="owner_bookings_panel"),
+    path("owner/export/bookings/", views.owner_export_bookings, name="owner_export_bookings"),
+    path("owner/export/inventory/", views.owner_export_inventory, name="owner_export_inventory"),
     path("owner/cars/add/", views.car_create, name="car_create"),
     path("owner/cars/<int:pk>/edit/", views.car_edit, name="car_edit"),
     path("owner/cars/<int:pk>/sold/", views.car_mark_sold, name="car_mark_sold"),
@@ -25,6 +34,6 @@ urlpatterns = [
     path("owner/cars/<int:pk>/images/<int:img_id>/delete/", views.car_delete_image, name="car_delete_image"),
 
     # booking status
-    path("owner/bookings/<int:booking_id>/<str:status>/", views.booking_update_status, name="booking_update_status"),
     path("owner/bookings/<int:booking_id>/delete/", views.booking_delete, name="booking_delete"),
+    path("owner/bookings/<int:booking_id>/<str:status>/", views.booking_update_status, name="booking_update_status"),
 ]
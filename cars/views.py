@@ -1,17 +1,28 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import condition
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
-from django.db.models import Q, Min, Max, Count, Sum
+from django.db import transaction
 from django.core.paginator import Paginator
-from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib import messages
 from datetime import date
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import urlencode
 
-from .models import Car, CarImage, Booking
+from .models import ArchivedBooking, ArchivedCar, Car, CarImage, Booking, upper_exact
 from .forms import CarForm, MultiImageForm, BookingForm
+from .cache import get_inventory_facets, get_cached_count
+from .pagination import CursorPaginator
+from .search import search_cars
+from .page_cache import cache_anonymous_page, car_last_modified
+from .notifications import enqueue_booking_notifications, enqueue_status_notification
+from .stats import owner_analytics, monthly_sales
+from .uploads import add_car_images
+from .exports import BOOKING_COLUMNS, INVENTORY_COLUMNS, export_response
 
 # ---------- AUTH ----------
 def login_view(request):
@@ -28,17 +39,34 @@ def logout_view(request):
     return redirect("home")
 
 # ---------- CUSTOMER ----------
+@cache_anonymous_page
 def home(request):
-    latest = Car.objects.filter(is_available=True).order_by("-created_at")[:6]
+    latest = Car.objects.filter(is_available=True).select_related("main_image").order_by("-created_at")[:6]
     return render(request, "cars/home.html", {"latest": latest})
 
-def inventory(request):
-    qs = Car.objects.filter(is_available=True)
+# The filter selects always offer these, in stock or not, so a bookmarked
+# filter on a sold-out value still shows as selected.
+TRANSMISSION_CHOICES = ["Automatic", "Manual"]
+FUEL_CHOICES = ["Gasoline", "Diesel", "Hybrid", "Electric"]
+BODY_TYPE_CHOICES = [value for value, _ in Car.BODY_TYPE_CHOICES]
+
+def _choice_options(choices, counts, selected):
+    in_stock = {option["value"]: option["count"] for option in counts}
+    values = list(choices)
+    values += sorted(value for value in in_stock if value not in values)
+    if selected and selected not in values:
+        values.append(selected)
+    return [{"value": value, "count": in_stock.get(value, 0)} for value in values]
+
+# Filters, sort and pagination inputs shared by the sync and async inventory views.
+def _inventory_state(request):
+    qs = Car.objects.filter(is_available=True).select_related("main_image")
 
     q = request.GET.get("q","").strip()
     brand = request.GET.get("brand","").strip()
     trans = request.GET.get("trans","").strip()
     fuel = request.GET.get("fuel","").strip()
+    body_type = request.GET.get("body_type","").strip()
     min_price_raw = request.GET.get("min_price","").strip()
     max_price_raw = request.GET.get("max_price","").strip()
     min_price = min_price_raw.replace(",", "")
@@ -47,19 +75,17 @@ def inventory(request):
     max_year = request.GET.get("max_year","").strip()
     sort = request.GET.get("sort", "newest").strip()
 
+    ranked = False
     if q:
-        qs = qs.filter(
-            Q(brand__icontains=q) |
-            Q(model__icontains=q) |
-            Q(location__icontains=q) |
-            Q(description__icontains=q)
-        )
+        qs, ranked = search_cars(qs, q)
     if brand:
-        qs = qs.filter(brand__iexact=brand)
+        qs = qs.filter(upper_exact("brand", brand))
     if trans:
-        qs = qs.filter(transmission__iexact=trans)
+        qs = qs.filter(upper_exact("transmission", trans))
     if fuel:
-        qs = qs.filter(fuel__iexact=fuel)
+        qs = qs.filter(upper_exact("fuel", fuel))
+    if body_type:
+        qs = qs.filter(upper_exact("body_type", body_type))
 
     if min_price.isdigit():
         qs = qs.filter(price__gte=min_price)
@@ -77,140 +103,95 @@ def inventory(request):
         "price_desc": "-price",
         "year_desc": "-year",
     }
+    if ranked:
+        sort_map["relevance"] = "-search_rank"
     if sort not in sort_map:
         sort = "newest"
-    qs = qs.order_by(sort_map[sort])
-
-    paginator = Paginator(qs, 12)
-    page_obj = paginator.get_page(request.GET.get("page"))
 
     query_params = request.GET.copy()
     query_params.pop("page", None)
-    query_string = query_params.urlencode()
+    query_params.pop("cursor", None)
+
+    cursor = request.GET.get("cursor", "").strip()
+    if sort == "relevance":
+        paginator = Paginator(qs.order_by("-search_rank", "-created_at"), 12)
+    elif cursor or getattr(settings, "INVENTORY_PAGINATION", "page") == "cursor":
+        # The "N results" line reads paginator.count; cache it per inventory
+        # version so paging through cursors doesn't repeat the COUNT.
+        paginator = CursorPaginator(
+            qs, sort_map[sort], 12,
+            count=lambda: get_cached_count(qs, f"inventory:{sorted(query_params.lists())}"),
+        )
+    else:
+        paginator = Paginator(qs.order_by(sort_map[sort]), 12)
+
+    return {
+        "paginator": paginator,
+        "page": cursor if isinstance(paginator, CursorPaginator) else request.GET.get("page"),
+        "sort": sort,
+        "ranked": ranked,
+        "query_string": query_params.urlencode(),
+        "min_price": min_price,
+        "max_price": max_price,
+        "min_price_raw": min_price_raw,
+        "max_price_raw": max_price_raw,
+        "trans": trans,
+        "fuel": fuel,
+        "body_type": body_type,
+    }
 
-    brand_options = (
-        Car.objects.filter(is_available=True)
-        .values("brand")
-        .annotate(count=Count("id"))
-        .order_by("brand")
-    )
-    stats = Car.objects.filter(is_available=True).aggregate(
-        min_price=Min("price"), max_price=Max("price"),
-        min_year=Min("year"), max_year=Max("year")
-    )
+def _inventory_context(state, page_obj, facets):
     current_year = date.today().year
     year_options = list(range(current_year, 1899, -1))
 
-    display_min_price = f"{int(min_price):,}" if min_price.isdigit() else min_price_raw
-    display_max_price = f"{int(max_price):,}" if max_price.isdigit() else max_price_raw
+    min_price, max_price = state["min_price"], state["max_price"]
+    display_min_price = f"{int(min_price):,}" if min_price.isdigit() else state["min_price_raw"]
+    display_max_price = f"{int(max_price):,}" if max_price.isdigit() else state["max_price_raw"]
 
-    return render(request, "cars/inventory.html", {
+    return {
         "cars": page_obj.object_list,
         "page_obj": page_obj,
-        "brand_options": brand_options,
-        "stats": stats,
+        "brand_options": facets["brand_options"],
+        "fuel_options": _choice_options(FUEL_CHOICES, facets["fuel_options"], state["fuel"]),
+        "transmission_options": _choice_options(TRANSMISSION_CHOICES, facets["transmission_options"], state["trans"]),
+        "body_type_options": _choice_options(BODY_TYPE_CHOICES, facets["body_type_options"], state["body_type"]),
+        "stats": facets["stats"],
         "year_options": year_options,
-        "selected_sort": sort,
-        "query_string": query_string,
+        "selected_sort": state["sort"],
+        "relevance_available": state["ranked"],
+        "query_string": state["query_string"],
         "display_min_price": display_min_price,
         "display_max_price": display_max_price,
-    })
-
-def car_detail(request, pk):
-    car = get_object_or_404(Car, pk=pk, is_available=True)
-    form = BookingForm()
-    return render(request, "cars/detail.html", {"car": car, "form": form})
-
-def _send_owner_booking_email(booking: Booking):
-    subject = f"New Test Drive Booking - #{booking.id}"
-    msg = (
-        f"New booking received.\n\n"
-        f"Car: {booking.car}\n"
-        f"Name: {booking.full_name}\n"
-        f"Phone: {booking.phone}\n"
-        f"Email: {booking.email}\n"
-        f"Date/Time: {booking.preferred_date} {booking.preferred_time}\n"
-        f"Note: {booking.note}\n"
-        f"Status: {booking.status}\n"
-    )
-    recipients = []
-    owner_email = booking.car.owner.email
-    if owner_email:
-        recipients.append(owner_email)
-    alert_email = getattr(settings, "BOOKING_ALERT_EMAIL", "")
-    if alert_email and alert_email not in recipients:
-        recipients.append(alert_email)
-    if recipients:
-        send_mail(
-            subject,
-            msg,
-            settings.DEFAULT_FROM_EMAIL,
-            recipients,
-            fail_silently=getattr(settings, "EMAIL_FAIL_SILENTLY", False),
-        )
+    }
 
-def _send_customer_booking_email(booking: Booking):
-    if not booking.email:
-        return
-    subject = f"Booking Received - {booking.car}"
-    msg = (
-        f"Hi {booking.full_name},\n\n"
-        f"Your test drive request has been received.\n\n"
-        f"Car: {booking.car}\n"
-        f"Preferred schedule: {booking.preferred_date} {booking.preferred_time}\n"
-        f"Current status: {booking.status}\n\n"
-        f"We will contact you soon to confirm.\n\n"
-        f"Thank you,\n"
-        f"AutoMac Lucena"
-    )
-    send_mail(
-        subject,
-        msg,
-        settings.DEFAULT_FROM_EMAIL,
-        [booking.email],
-        fail_silently=getattr(settings, "EMAIL_FAIL_SILENTLY", False),
-    )
+@cache_anonymous_page
+def inventory(request):
+    state = _inventory_state(request)
+    page_obj = state["paginator"].get_page(state["page"])
+    facets = get_inventory_facets()
+    return render(request, "cars/inventory.html", _inventory_context(state, page_obj, facets))
+
+def _detail_context(car, form):
+    images = list(car.images.all())
+    return {
+        "car": car,
+        "form": form,
+        "images": images,
+        "main_photo": car.main_image or (images[0] if images else None),
+    }
 
-def _send_customer_status_email(booking: Booking):
-    if not booking.email:
-        return
-    subject = f"Booking Status Update - {booking.car}"
-    msg = (
-        f"Hi {booking.full_name},\n\n"
-        f"Your booking status is now: {booking.status}\n\n"
-        f"Car: {booking.car}\n"
-        f"Preferred schedule: {booking.preferred_date} {booking.preferred_time}\n\n"
-        f"Thank you,\n"
-        f"AutoMac Lucena"
-    )
-    send_mail(
-        subject,
-        msg,
-        settings.DEFAULT_FROM_EMAIL,
-        [booking.email],
-        fail_silently=getattr(settings, "EMAIL_FAIL_SILENTLY", False),
+@condition(last_modified_func=car_last_modified)
+@cache_anonymous_page
+def car_detail(request, pk):
+    car = get_object_or_404(
+        Car.objects.select_related("main_image").prefetch_related("images"),
+        pk=pk, is_available=True,
     )
-
-def _send_booking_notifications(booking: Booking):
-    _send_owner_booking_email(booking)
-    _send_customer_booking_email(booking)
-
-    # OPTIONAL SMS (Twilio) - only runs if credentials are present
-    if getattr(settings, "TWILIO_ACCOUNT_SID", "") and getattr(settings, "TWILIO_AUTH_TOKEN", "") and getattr(settings, "TWILIO_FROM_NUMBER", ""):
-        try:
-            from twilio.rest import Client
-            client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-            client.messages.create(
-                body=f"AutoHub booking: {booking.full_name} for {booking.car} on {booking.preferred_date} {booking.preferred_time}.",
-                from_=settings.TWILIO_FROM_NUMBER,
-                to=booking.phone
-            )
-        except Exception:
-            # Don't crash the site if SMS fails
-            pass
+    form = BookingForm()
+    return render(request, "cars/detail.html", _detail_context(car, form))
 
 def book_test_drive(request, pk):
-    car = get_object_or_404(Car, pk=pk, is_available=True)
+    car = get_object_or_404(Car.objects.select_related("owner"), pk=pk, is_available=True)
     if request.method != "POST":
         return redirect("car_detail", pk=pk)
 
@@ -218,50 +199,150 @@ def book_test_drive(request, pk):
     if form.is_valid():
         booking = form.save(commit=False)
         booking.car = car
-        booking.save()
-        _send_booking_notifications(booking)
+        with transaction.atomic():
+            booking.save()
+            enqueue_booking_notifications(booking)
         messages.success(request, "Booking submitted successfully. We will contact you soon.")
         return redirect("car_detail", pk=pk)
 
-    return render(request, "cars/detail.html", {"car": car, "form": form})
+    return render(request, "cars/detail.html", _detail_context(car, form))
 
 # ---------- OWNER ----------
-@login_required
-def owner_dashboard(request):
-    cars = Car.objects.filter(owner=request.user).order_by("-created_at")
+OWNER_PANEL_PAGE_SIZE = 20
+BOOKING_STATUSES = ["Pending", "Approved", "Rejected", "Done"]
+BOOKING_FILTER_PARAMS = ("booking_status", "car", "date_from", "date_to")
+CAR_STATUSES = ["All", "Available", "Sold"]
+
+def _parse_date(value):
+    try:
+        return parse_date((value or "").strip())
+    except ValueError:
+        return None
+
+def _booking_filter_query(params):
+    return urlencode({k: params[k] for k in BOOKING_FILTER_PARAMS if params.get(k, "").strip()})
+
+# "My Cars" and bookings are served a page at a time (first page inline on the
+# dashboard, the rest through the panel endpoints), so neither grows with the
+# size of the owner's history.
+def _owner_cars(request, archived=False):
+    car_status = request.GET.get("car_status", "All").strip()
+    qs = (ArchivedCar if archived else Car).objects.filter(owner=request.user)
+    if car_status == "Available":
+        qs = qs.filter(is_available=True)
+    elif car_status == "Sold":
+        qs = qs.filter(sold_at__isnull=False)
+    else:
+        car_status = "All"
+    return qs, car_status
+
+def _owner_cars_page(request):
+    qs, car_status = _owner_cars(request)
+    qs = qs.select_related("main_image")
+    page = CursorPaginator(qs, "-created_at", OWNER_PANEL_PAGE_SIZE).get_page(request.GET.get("cursor"))
+    return {
+        "cars": page,
+        "car_tabs": CAR_STATUSES,
+        "selected_car_status": car_status,
+        "cars_query": urlencode({"car_status": car_status}),
+    }
+
+def _owner_bookings(request, archived=False):
+    car_model = ArchivedCar if archived else Car
     booking_status = request.GET.get("booking_status", "All").strip()
-    bookings_qs = Booking.objects.filter(car__owner=request.user).order_by("-created_at")
-    if booking_status in ["Pending", "Approved", "Rejected", "Done"]:
-        bookings_qs = bookings_qs.filter(status=booking_status)
+    qs = (ArchivedBooking if archived else Booking).objects.filter(car__owner=request.user)
+    if booking_status in BOOKING_STATUSES:
+        qs = qs.filter(status=booking_status)
     else:
         booking_status = "All"
-    bookings = bookings_qs[:50]
-    booking_tabs = ["All", "Pending", "Approved", "Rejected", "Done"]
-    now = timezone.now()
-    analytics = cars.aggregate(
-        total_cars=Count("id"),
-        available_count=Count("id", filter=Q(is_available=True)),
-        sold_count=Count("id", filter=Q(sold_at__isnull=False)),
-        sold_revenue=Sum("price", filter=Q(sold_at__isnull=False)),
-        available_value=Sum("price", filter=Q(is_available=True)),
-    )
-    analytics["sold_this_month"] = cars.filter(
-        sold_at__isnull=False,
-        sold_at__year=now.year,
-        sold_at__month=now.month,
-    ).count()
+
+    booking_car = None
+    car_id = request.GET.get("car", "").strip()
+    if car_id.isdigit():
+        booking_car = car_model.objects.filter(pk=car_id, owner=request.user).first()
+        qs = qs.filter(car=booking_car) if booking_car else qs.none()
+    date_from = _parse_date(request.GET.get("date_from"))
+    date_to = _parse_date(request.GET.get("date_to"))
+    if date_from:
+        qs = qs.filter(preferred_date__gte=date_from)
+    if date_to:
+        qs = qs.filter(preferred_date__lte=date_to)
+    return qs, {
+        "selected_booking_status": booking_status,
+        "booking_car": booking_car,
+        "booking_date_from": date_from,
+        "booking_date_to": date_to,
+    }
+
+def _owner_bookings_page(request):
+    qs, filters = _owner_bookings(request)
+    qs = qs.select_related("car")
+    page = CursorPaginator(qs, "-created_at", OWNER_PANEL_PAGE_SIZE).get_page(request.GET.get("cursor"))
+    return {
+        "bookings": page,
+        "booking_tabs": ["All"] + BOOKING_STATUSES,
+        **filters,
+        "booking_query": _booking_filter_query(request.GET),
+    }
+
+@login_required
+def owner_dashboard(request):
+    analytics = owner_analytics(request.user)
     return render(
         request,
         "cars/owner_dashboard.html",
         {
-            "cars": cars,
-            "bookings": bookings,
             "analytics": analytics,
-            "booking_tabs": booking_tabs,
-            "selected_booking_status": booking_status,
+            **_owner_cars_page(request),
+            **_owner_bookings_page(request),
         },
     )
 
+@login_required
+def owner_cars_panel(request):
+    return render(request, "cars/partials/owner_car_rows.html", _owner_cars_page(request))
+
+@login_required
+def owner_bookings_panel(request):
+    return render(request, "cars/partials/owner_booking_rows.html", _owner_bookings_page(request))
+
+# Full history as CSV or XLSX, with the same filters as the dashboard panels;
+# archived cars and their bookings follow the live ones.
+@login_required
+def owner_export_bookings(request):
+    querysets = [_owner_bookings(request, archived)[0].order_by("-created_at", "-id") for archived in (False, True)]
+    return export_response(querysets, BOOKING_COLUMNS, "bookings", request.GET.get("format"))
+
+@login_required
+def owner_export_inventory(request):
+    querysets = [_owner_cars(request, archived)[0].order_by("-created_at", "-id") for archived in (False, True)]
+    return export_response(querysets, INVENTORY_COLUMNS, "inventory", request.GET.get("format"))
+
+@login_required
+def owner_sales(request):
+    try:
+        months = min(max(int(request.GET.get("months", 12)), 1), 60)
+    except ValueError:
+        months = 12
+    series = monthly_sales(request.user, months)
+    if request.GET.get("format") == "json":
+        return JsonResponse({"months": [
+            {"month": row["month"].strftime("%Y-%m"), "sold_count": row["sold_count"], "revenue": str(row["revenue"])}
+            for row in series
+        ]})
+    peak = max((row["sold_count"] for row in series), default=0) or 1
+    for row in series:
+        row["bar"] = round(row["sold_count"] * 100 / peak)
+    return render(request, "cars/owner_sales.html", {
+        "series": series,
+        "months": months,
+        "month_choices": [6, 12, 24],
+    })
+
+def _report_upload_errors(request):
+    for error in getattr(request, "upload_errors", ()):
+        messages.warning(request, f"Photo skipped: {error}")
+
 @login_required
 def car_create(request):
     car_form = CarForm(request.POST or None)
@@ -274,13 +355,8 @@ def car_create(request):
             car.location = "Lucena City, Quezon"
         car.save()
 
-        images = request.FILES.getlist("images")
-        for f in images:
-            img = CarImage.objects.create(car=car, image=f)
-            if car.main_image is None:
-                car.main_image = img
-                car.save(update_fields=["main_image"])
-
+        add_car_images(car, request.FILES.getlist("images"))
+        _report_upload_errors(request)
         return redirect("owner_dashboard")
 
     return render(request, "cars/car_form.html", {
@@ -306,13 +382,8 @@ def car_edit(request, pk):
             car.sold_at = None
             car.save(update_fields=["sold_at"])
 
-        images = request.FILES.getlist("images")
-        for f in images:
-            img = CarImage.objects.create(car=car, image=f)
-            if car.main_image is None:
-                car.main_image = img
-                car.save(update_fields=["main_image"])
-
+        add_car_images(car, request.FILES.getlist("images"))
+        _report_upload_errors(request)
         return redirect("car_manage_images", pk=car.id)
 
     return render(request, "cars/car_form.html", {
@@ -343,7 +414,8 @@ def car_mark_available(request, pk):
 @login_required
 def car_manage_images(request, pk):
     car = get_object_or_404(Car, pk=pk, owner=request.user)
-    return render(request, "cars/car_images.html", {"car": car})
+    images = car.images.order_by("pk")
+    return render(request, "cars/car_images.html", {"car": car, "images": images})
 
 @login_required
 def car_set_main_image(request, pk, img_id):
@@ -369,18 +441,17 @@ def car_delete_image(request, pk, img_id):
 
 @login_required
 def booking_update_status(request, booking_id, status):
-    booking = get_object_or_404(Booking, pk=booking_id, car__owner=request.user)
+    booking = get_object_or_404(Booking.objects.select_related("car"), pk=booking_id, car__owner=request.user)
     if status not in ["Approved", "Rejected", "Done", "Pending"]:
         return redirect("owner_dashboard")
     booking.status = status
-    booking.save(update_fields=["status"])
-    _send_customer_status_email(booking)
-    selected_status = request.GET.get("booking_status", "All")
-    return redirect(f"/owner/?booking_status={selected_status}")
+    with transaction.atomic():
+        booking.save(update_fields=["status"])
+        enqueue_status_notification(booking)
+    return redirect(f"/owner/?{_booking_filter_query(request.GET)}")
 
 @login_required
 def booking_delete(request, booking_id):
     booking = get_object_or_404(Booking, pk=booking_id, car__owner=request.user)
-    selected_status = request.GET.get("booking_status", "All")
     booking.delete()
-    return redirect(f"/owner/?booking_status={selected_status}")
+    return redirect(f"/owner/?{_booking_filter_query(request.GET)}")
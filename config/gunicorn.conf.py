@@ -0,0 +1,30 @@
+# gunicorn -c config/gunicorn.conf.py
+#
+# SERVER_MODE=wsgi (default): sync workers on config.wsgi, one request per
+# worker at a time.
+# SERVER_MODE=asgi: uvicorn workers on config.asgi; each worker process runs
+# an event loop and the public pages use the async views (ASYNC_VIEWS).
+import multiprocessing
+import os
+
+mode = os.getenv("SERVER_MODE", "wsgi").lower()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count() * 2 + 1))))
+# Read by config/settings.py (VERSIONED_CACHE); workers inherit the environment.
+os.environ["GUNICORN_WORKERS"] = str(workers)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+accesslog = "-"
+
+if mode == "asgi":
+    wsgi_app = "config.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "config.wsgi:application"
+
+
+def post_worker_init(worker):
+    # Derivative jobs queued in a previous worker died with it; see cars.uploads.
+    from cars.uploads import start_derivative_sweeper
+
+    start_derivative_sweeper()
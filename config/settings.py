@@ -73,9 +73,18 @@ INSTALLED_APPS = [
     'cars',
 ]
 
+# "wsgi" (gunicorn sync workers) or "asgi" (gunicorn with uvicorn workers, see
+# config/gunicorn.conf.py). The ASGI mode routes the public pages to their
+# async versions in cars.async_views; ASYNC_VIEWS can override that.
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi").lower()
+ASYNC_VIEWS = _get_bool("ASYNC_VIEWS", SERVER_MODE == "asgi")
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'cars.media.StaticFilesMiddleware',
+    'cars.media.MediaMiddleware',
+    'cars.timing.ServerTimingMiddleware',
+    'cars.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -114,12 +123,122 @@ DATABASES = {
     }
 }
 
-if os.getenv("DATABASE_URL") and dj_database_url:
-    DATABASES["default"] = dj_database_url.parse(
-        os.getenv("DATABASE_URL"),
-        conn_max_age=600,
+# DB_POOL=true (Postgres only) swaps each worker's persistent connection for
+# a psycopg 3 pool of DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE connections. With
+# CONN_HEALTH_CHECKS on, both kinds are checked before reuse, so connections
+# killed by a database restart are replaced quietly. Budget
+# WEB_CONCURRENCY * DB_POOL_MAX_SIZE (plus cron jobs) against the server's
+# connection limit. A sync (wsgi) worker serves one request at a time, so it
+# never needs more than one connection; asgi workers default to four.
+# Measurements: docs/benchmarks.md.
+DB_POOL = _get_bool("DB_POOL", False)
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "1" if SERVER_MODE == "wsgi" else "4"))
+# Under ASGI each request's ORM calls run on a thread that does not outlive
+# the request, so a persistent connection is orphaned rather than reused and
+# they pile up to the server limit. Without DB_POOL, asgi mode closes
+# connections after each request instead.
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "0" if SERVER_MODE == "asgi" else "600"))
+
+
+def _database(url):
+    config = dj_database_url.parse(
+        url,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=True,
         ssl_require=not DEBUG,
     )
+    if DB_POOL and config["ENGINE"] == "django.db.backends.postgresql":
+        # Pooled connections are returned after every request instead of
+        # being held open per worker.
+        config["CONN_MAX_AGE"] = 0
+        config.setdefault("OPTIONS", {})["pool"] = {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+        }
+    return config
+
+
+# Read replicas: DATABASE_REPLICA_URL holds one or more comma-separated URLs.
+# Anonymous GET/HEAD requests outside /owner/ read from one of them (see
+# cars.replicas); visitors stay on the primary for REPLICA_STICKY_SECONDS
+# after a write, and everyone does for REPLICA_LAG_SECONDS after an inventory
+# change. To try it locally, copy the SQLite file and point
+# DATABASE_REPLICA_URL at the copy (sqlite:////path/to/replica.sqlite3).
+REPLICA_DATABASES = []
+
+if os.getenv("DATABASE_URL") and dj_database_url:
+    DATABASES["default"] = _database(os.getenv("DATABASE_URL"))
+
+if dj_database_url:
+    for index, url in enumerate(_get_list("DATABASE_REPLICA_URL")):
+        alias = "replica" if index == 0 else f"replica_{index + 1}"
+        DATABASES[alias] = {**_database(url), "TEST": {"MIRROR": "default"}}
+        REPLICA_DATABASES.append(alias)
+
+# SQLITE_PERFORMANCE tunes SQLite for several gunicorn workers sharing one
+# file: WAL, synchronous=NORMAL, mmap, a larger page cache, in-memory temp
+# tables and a busy timeout (applied per connection by cars.sqlite), plus
+# IMMEDIATE write transactions, which wait for the lock up front instead of
+# failing with "database is locked" when a read turns into a write.
+SQLITE_PERFORMANCE = _get_bool("SQLITE_PERFORMANCE", False)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negative = KiB
+SQLITE_OPTIMIZE_INTERVAL = int(os.getenv("SQLITE_OPTIMIZE_INTERVAL", "3600"))
+
+if SQLITE_PERFORMANCE:
+    for config in DATABASES.values():
+        if config["ENGINE"] == "django.db.backends.sqlite3":
+            config.setdefault("OPTIONS", {})["transaction_mode"] = "IMMEDIATE"
+            # Keep the file open between requests, unless asgi mode (see
+            # DB_CONN_MAX_AGE) needs it closed after each one.
+            config.setdefault("CONN_MAX_AGE", DB_CONN_MAX_AGE)
+
+DATABASE_ROUTERS = ["cars.replicas.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "15"))
+REPLICA_LAG_SECONDS = int(os.getenv("REPLICA_LAG_SECONDS", "5"))
+
+# Cache
+# The inventory version, the page cache, facets and the replica-lag flag must
+# be shared by every process that serves or changes the inventory (gunicorn
+# workers, management commands, derivative threads). CACHE_URL (a redis://
+# URL; render.yaml provisions one) selects Redis; otherwise CACHE_BACKEND /
+# CACHE_LOCATION, defaulting to per-process local memory.
+CACHE_URL = os.getenv("CACHE_URL", "").strip()
+
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": os.getenv("CACHE_BACKEND") or "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": os.getenv("CACHE_LOCATION") or "automac",
+        }
+    }
+# config/gunicorn.conf.py exports its worker count; anything else (runserver,
+# commands, tests) is one process.
+SERVER_WORKERS = int(os.getenv("GUNICORN_WORKERS", "1"))
+# Caching keyed by the inventory version (page cache, ETag/Last-Modified,
+# facets, counts) and replica routing. A bump in one worker never reaches
+# another worker's local memory, so with several workers and a per-process
+# cache it is off: every page is rendered from the database and reads stay
+# on the primary.
+VERSIONED_CACHE = _get_bool(
+    "VERSIONED_CACHE",
+    CACHES["default"]["BACKEND"] != "django.core.cache.backends.locmem.LocMemCache" or SERVER_WORKERS == 1,
+)
+INVENTORY_FACETS_TIMEOUT = int(os.getenv("INVENTORY_FACETS_TIMEOUT", "300"))
+# Anonymous GETs of home/inventory/detail are cached under the inventory version.
+PAGE_CACHE_TIMEOUT = int(os.getenv("PAGE_CACHE_TIMEOUT", "600"))
+# "page" keeps numbered pages; "cursor" switches inventory to keyset pagination.
+INVENTORY_PAGINATION = os.getenv("INVENTORY_PAGINATION", "page").strip().lower()
 
 
 # Password validation
@@ -160,6 +279,44 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# cars.media.MediaMiddleware serves MEDIA_URL from MEDIA_ROOT; turn it off
+# when a CDN or the web server fronts the media directory instead.
+SERVE_MEDIA = _get_bool("SERVE_MEDIA", True)
+# Cache lifetime for media that is not content-addressed (those are immutable).
+MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", "86400"))
+# Derivative encodings for CarImage uploads; JPEG is always produced as the fallback.
+IMAGE_DERIVATIVE_FORMATS = _get_list("IMAGE_DERIVATIVE_FORMATS", "webp,jpeg")
+# Background threads rendering derivatives after an upload commits; 0 renders inline.
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", "2"))
+# Each web worker re-renders images whose background job died with a restart:
+# every DERIVATIVE_SWEEP_INTERVAL seconds (0 turns it off), images still
+# without derivatives DERIVATIVE_SWEEP_GRACE seconds after upload.
+DERIVATIVE_SWEEP_INTERVAL = int(os.getenv("DERIVATIVE_SWEEP_INTERVAL", "600"))
+DERIVATIVE_SWEEP_GRACE = int(os.getenv("DERIVATIVE_SWEEP_GRACE", "300"))
+# Car photo uploads are streamed through cars.uploads.ImageUploadHandler, which
+# enforces these limits while the bytes arrive.
+FILE_UPLOAD_HANDLERS = [
+    "cars.uploads.ImageUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+MAX_IMAGE_DIMENSION = int(os.getenv("MAX_IMAGE_DIMENSION", "10000"))
+# cars.timing.ServerTimingMiddleware: share of requests to instrument (0-1),
+# whether sampled responses carry a Server-Timing header (it reveals query
+# counts, so keep it off for public traffic unless wanted), and the total
+# time above which a sampled request is logged as a warning.
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv("SERVER_TIMING_SAMPLE_RATE", "0"))
+SERVER_TIMING_HEADER = _get_bool("SERVER_TIMING_HEADER", DEBUG)
+SERVER_TIMING_SLOW_MS = float(os.getenv("SERVER_TIMING_SLOW_MS", "1000"))
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "cars.timing": {"handlers": ["console"], "level": os.getenv("SERVER_TIMING_LOG_LEVEL", "INFO"), "propagate": False},
+    },
+}
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "owner_dashboard"
 LOGOUT_REDIRECT_URL = "home"
@@ -175,14 +332,28 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "").replace(" ", "").stri
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "true").lower() == "true"
 EMAIL_USE_SSL = os.getenv("EMAIL_USE_SSL", "false").lower() == "true"
 EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "30"))
+# Seconds a pooled SMTP connection may sit unused before it is reopened.
+EMAIL_CONNECTION_IDLE_TIMEOUT = int(os.getenv("EMAIL_CONNECTION_IDLE_TIMEOUT", "60"))
 EMAIL_FAIL_SILENTLY = _get_bool("EMAIL_FAIL_SILENTLY", False)
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "AutoMac Lucena <no-reply@automac.local>")
 BOOKING_ALERT_EMAIL = os.getenv("BOOKING_ALERT_EMAIL", "")
+# Optional booking SMS; queued only when all three are set.
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "")
+TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "")
+# Booking emails/SMS are queued in OutboxMessage and sent by `manage.py process_outbox`.
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "6"))
+NOTIFICATION_RETRY_BASE_SECONDS = int(os.getenv("NOTIFICATION_RETRY_BASE_SECONDS", "30"))
+NOTIFICATION_RETRY_MAX_SECONDS = int(os.getenv("NOTIFICATION_RETRY_MAX_SECONDS", "3600"))
 
 STORAGES = {
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",
     },
+    # CarImage uploads: stored once per content hash, see cars.storage.
+    "car_images": {
+        "BACKEND": "cars.storage.ContentAddressedStorage",
+    },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },